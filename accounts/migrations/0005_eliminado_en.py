@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_usuario_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='eliminado_en',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Marcado para eliminación; la purga corre en segundo plano', null=True),
+        ),
+    ]
@@ -59,6 +59,12 @@ class Usuario(AbstractUser):
 
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    eliminado_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Marcado para eliminación; la purga corre en segundo plano"
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS: list[str] = []  # no pedimos username, solo email + password
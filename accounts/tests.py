@@ -1,3 +1,168 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from config.limites import _semaforo
+from tickets.tests import PresupuestoQueriesMixin, HASHERS_RAPIDOS
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class VistasAdminQueriesTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def test_dashboard_admin(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("dashboard_admin")))
+
+    def test_usuarios_listar(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("usuarios_listar")))
+
+    def test_tickets_listar(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("tickets_listar")))
+
+    def test_tickets_listar_filtrado(self):
+        url = reverse("tickets_listar")
+        filtros = {"estado": self.estado_abierto.id, "tecnico": self.tecnico.id, "q": "Ticket"}
+        self.assertQueriesConstantes(lambda: self.client.get(url, filtros))
+
+    def test_tickets_detalle(self):
+        url = reverse("tickets_detalle", args=[self.ticket.id])
+        self.assertQueriesConstantes(lambda: self.client.get(url))
+
+    def test_reportes_dashboard(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("reportes_dashboard")))
+
+    def test_reportes_tickets_excel(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("reportes_tickets_excel")))
+
+    def test_reportes_tickets_pdf(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("reportes_tickets_pdf")))
+
+    def test_notificaciones_listar(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("notificaciones_listar")))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class VistasTecnicoQueriesTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario_tecnico)
+
+    def test_dashboard_tecnico(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("dashboard_tecnico")))
+
+    def test_tickets_tecnico_listar(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("tickets_tecnico_listar")))
+
+    def test_tickets_tecnico_listar_todos(self):
+        url = reverse("tickets_tecnico_listar")
+        self.assertQueriesConstantes(lambda: self.client.get(url, {"scope": "todos"}))
+
+    def test_ticket_tecnico_detalle(self):
+        url = reverse("ticket_tecnico_detalle", args=[self.ticket.id])
+        self.assertQueriesConstantes(lambda: self.client.get(url))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class VistasUsuarioQueriesTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_dashboard_usuario(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("dashboard_usuario")))
+
+    def test_tickets_usuario_listar(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("tickets_usuario_listar")))
+
+    def test_ticket_usuario_detalle(self):
+        url = reverse("ticket_usuario_detalle", args=[self.ticket.id])
+        self.assertQueriesConstantes(lambda: self.client.get(url))
+
+    def test_ticket_usuario_crear_form(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("ticket_usuario_crear")))
+
+
+@override_settings(
+    PASSWORD_HASHERS=HASHERS_RAPIDOS,
+    LIMITES_TASA={
+        "api": {"usuario": (2, 1)},
+        "login": {"usuario": (1, 1), "ip": (3, 1)},
+    },
+    LIMITES_CONCURRENCIA={"reportes_tickets_excel": (1, ("GET",))},
+)
+class LimitesTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_api_por_usuario(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        self.assertEqual(api.get("/api/tickets/").status_code, 200)
+        self.assertEqual(api.get("/api/tickets/").status_code, 200)
+        response = api.get("/api/tickets/")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+        # El balde es de cada usuario
+        api.force_authenticate(self.usuario)
+        self.assertEqual(api.get("/api/tickets/").status_code, 200)
+
+    def test_login_jwt_por_cuenta_e_ip(self):
+        api = APIClient()
+        url = reverse("token_obtain_pair")
+        self.assertEqual(api.post(url, {"email": "a@coyahue.cl", "password": "x"}).status_code, 401)
+        self.assertEqual(api.post(url, {"email": "A@coyahue.cl", "password": "x"}).status_code, 429)
+        self.assertEqual(api.post(url, {"email": "b@coyahue.cl", "password": "x"}).status_code, 401)
+        self.assertEqual(api.post(url, {"email": "c@coyahue.cl", "password": "x"}).status_code, 401)
+        # Cuarto intento desde la misma IP
+        self.assertEqual(api.post(url, {"email": "d@coyahue.cl", "password": "x"}).status_code, 429)
+
+    def test_repetir_el_email_de_otro_no_lo_bloquea(self):
+        url = reverse("token_obtain_pair")
+        atacante, victima = APIClient(REMOTE_ADDR="203.0.113.9"), APIClient(REMOTE_ADDR="198.51.100.7")
+        self.assertEqual(atacante.post(url, {"email": self.usuario.email, "password": "x"}).status_code, 401)
+        self.assertEqual(atacante.post(url, {"email": self.usuario.email, "password": "x"}).status_code, 429)
+        self.assertEqual(victima.post(url, {"email": self.usuario.email, "password": "x"}).status_code, 401)
+
+    @override_settings(LIMITES_TASA={"api": {"ip": (1, 1)}}, LIMITES_PROXIES=["10.0.0.0/8"])
+    def test_ip_del_cliente_detras_del_proxy(self):
+        def get(remota, reenviada):
+            api = APIClient(REMOTE_ADDR=remota, HTTP_X_FORWARDED_FOR=reenviada)
+            api.force_authenticate(self.admin)
+            return api.get("/api/tickets/").status_code
+
+        # Detrás de nginx: cada cliente tiene su balde
+        self.assertEqual(get("10.0.0.2", "203.0.113.9"), 200)
+        self.assertEqual(get("10.0.0.2", "198.51.100.7, 10.0.0.3"), 200)
+        self.assertEqual(get("10.0.0.2", "203.0.113.9"), 429)
+        # Sin pasar por el proxy, X-Forwarded-For no se cree
+        self.assertEqual(get("192.0.2.1", "192.0.2.50"), 200)
+        self.assertEqual(get("192.0.2.1", "192.0.2.51"), 429)
+
+    def test_login_html(self):
+        url = reverse("login")
+        self.assertEqual(self.client.post(url, {"email": "a@coyahue.cl", "password": "x"}).status_code, 200)
+        response = self.client.post(url, {"email": "a@coyahue.cl", "password": "x"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        # Mostrar el formulario no consume fichas
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url, {"email": "b@coyahue.cl", "password": "x"}).status_code, 200)
+
+    def test_corte_de_carga(self):
+        self.client.force_login(self.admin)
+        url = reverse("reportes_tickets_excel")
+        semaforo = _semaforo("reportes_tickets_excel", 1)
+        semaforo.acquire()
+        try:
+            response = self.client.get(url)
+        finally:
+            semaforo.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(self.client.get(url).status_code, 200)
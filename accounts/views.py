@@ -9,15 +9,16 @@ from openpyxl.utils import get_column_letter
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, HttpResponse
+from django.http import HttpResponseForbidden, HttpResponse, QueryDict
 from django.contrib import messages
 from django.urls import reverse
 from datetime import timedelta
+from django.db import transaction
 from django.db.models import Count, Avg, Q
 from django.db.models.functions import TruncDate, TruncMonth
 from django.utils import timezone
 
-from django.db.models import Count, Avg, DurationField, ExpressionWrapper, F, Q
+from django.db.models import Count, Avg, DurationField, ExpressionWrapper, F, Q, Prefetch
 from django.db.models.functions import TruncDay
 from django.utils import timezone
 from django.template.loader import get_template
@@ -41,10 +42,20 @@ from tickets.models import (
     HistorialTicket,
     ComentarioTicket,
     CalificacionTicket,
+    SLA_ESTADOS,
 )
 
 from notifications.models import Notificacion
 
+from config.db_router import lectura_reporting
+from tickets.subidas import tomar_subida
+from tickets.eliminacion import eliminar_ticket, eliminar_usuario
+from tickets.transiciones import ErrorTransicion, estados_disponibles, transicionar
+from tickets.concurrencia import ConflictoVersion, guardar_cambios, version_esperada
+from tickets.asignacion import asignar
+from tickets.calendario import horas_entre
+from tickets.masivo import ACCIONES as ACCIONES_MASIVAS, ErrorMasivo, aplicar as aplicar_masivo
+
 
 # -------------------------------------------------------------------
 # Helper de rol
@@ -163,6 +174,7 @@ def login_view(request):
 # -------------------------------------------------------------------
 
 @login_required
+@lectura_reporting
 def dashboard_admin(request):
     if not require_role(request.user, "ADMIN"):
         return HttpResponseForbidden("No tienes permiso para ver este panel.")
@@ -291,7 +303,7 @@ def usuarios_listar(request):
     if not require_role(request.user, "ADMIN"):
         return HttpResponseForbidden("No tienes permiso para ver esta sección.")
 
-    usuarios = Usuario.objects.select_related("rol").all()
+    usuarios = Usuario.objects.select_related("rol").filter(eliminado_en__isnull=True)
     return render(request, "admin/usuarios_listar.html", {"usuarios": usuarios})
 
 
@@ -366,7 +378,9 @@ def usuarios_eliminar(request, usuario_id):
     usuario = get_object_or_404(Usuario, id=usuario_id)
 
     if request.method == "POST":
-        usuario.delete()
+        # Se marca y se purga en segundo plano (tickets, comentarios, adjuntos...)
+        eliminar_usuario(usuario)
+        messages.success(request, f"Usuario {usuario.email} eliminado correctamente.")
         return redirect("usuarios_listar")
 
     return render(request, "admin/usuarios_eliminar.html", {
@@ -462,6 +476,7 @@ from django.db.models.functions import TruncDate, TruncMonth
 from django.utils import timezone
 
 @login_required
+@lectura_reporting
 def reportes_dashboard(request):
     if not require_role(request.user, "ADMIN"):
         return HttpResponseForbidden("No tienes permiso para ver esta sección.")
@@ -521,19 +536,13 @@ def reportes_dashboard(request):
     # ----------------------------
     # SLA cumplimiento
     # ----------------------------
-    tickets_con_sla = Ticket.objects.filter(
-        sla_horas_objetivo__isnull=False, fecha_cierre__isnull=False
+    sla = Ticket.objects.filter(sla_deadline__isnull=False, fecha_cierre__isnull=False).aggregate(
+        total=Count("id"),
+        dentro=Count("id", filter=Q(fecha_cierre__lte=F("sla_deadline"))),
     )
-    dentro_sla = 0
-    for t in tickets_con_sla:
-        if t.fecha_creacion and t.fecha_cierre:
-            diff_horas = (t.fecha_cierre - t.fecha_creacion).total_seconds() / 3600.0
-            if diff_horas <= t.sla_horas_objetivo:
-                dentro_sla += 1
-
     sla_porcentaje = (
-        round(dentro_sla / tickets_con_sla.count() * 100, 1)
-        if tickets_con_sla.exists()
+        round(sla["dentro"] / sla["total"] * 100, 1)
+        if sla["total"]
         else None
     )
 
@@ -718,6 +727,7 @@ def reportes_dashboard(request):
     })
 
 @login_required
+@lectura_reporting
 def reportes_tickets_excel(request):
     if not require_role(request.user, "ADMIN"):
         return HttpResponseForbidden("No tienes permiso para exportar.")
@@ -839,6 +849,7 @@ def reportes_tickets_excel(request):
 
 
 @login_required
+@lectura_reporting
 def reportes_tickets_pdf(request):
     if not require_role(request.user, "ADMIN"):
         return HttpResponseForbidden("No tienes permiso para exportar.")
@@ -875,6 +886,7 @@ def tickets_listar(request):
 
     tickets = (
         Ticket.objects
+        .con_sla()
         .select_related("solicitante", "estado", "prioridad", "area_afectada", "categoria")
         .prefetch_related("asignaciones__tecnico_asignado__usuario")
         .all()
@@ -884,6 +896,8 @@ def tickets_listar(request):
     prioridad_id = request.GET.get("prioridad")
     tecnico_id = request.GET.get("tecnico")
     area_id = request.GET.get("area")
+    sla = request.GET.get("sla")
+    orden = request.GET.get("orden")
     q = request.GET.get("q")
 
     if estado_id:
@@ -906,7 +920,14 @@ def tickets_listar(request):
             Q(titulo__icontains=q) | Q(descripcion__icontains=q)
         )
 
-    tickets = tickets.order_by("-fecha_creacion").distinct()
+    if sla:
+        tickets = tickets.por_sla(sla)
+
+    if orden == "sla":
+        # Lo más urgente primero: vencidos, en advertencia y luego por plazo
+        tickets = tickets.order_by("sla_riesgo", "sla_deadline", "-fecha_creacion").distinct()
+    else:
+        tickets = tickets.order_by("-fecha_creacion").distinct()
 
     estados = EstadoTicket.objects.all()
     prioridades = Prioridad.objects.all()
@@ -919,9 +940,45 @@ def tickets_listar(request):
         "prioridades": prioridades,
         "tecnicos": tecnicos,
         "areas": areas,
+        "categorias": Categoria.objects.all(),
+        "sla_estados": SLA_ESTADOS.items(),
+        "acciones_masivas": ACCIONES_MASIVAS.items(),
     })
 
 
+@login_required
+def tickets_masivo(request):
+    if not require_role(request.user, "ADMIN"):
+        return HttpResponseForbidden("No tienes permiso para modificar tickets.")
+
+    volver = reverse("tickets_listar")
+    if request.POST.get("filtros"):
+        volver += "?" + QueryDict(request.POST["filtros"]).urlencode()
+    if request.method != "POST":
+        return redirect(volver)
+
+    accion = request.POST.get("accion")
+    try:
+        resultado = aplicar_masivo(
+            request.POST.getlist("tickets"),
+            accion,
+            request.POST.get(f"valor_{accion}"),
+            request.user,
+            request.POST.get("comentario", "").strip(),
+        )
+    except ErrorMasivo as error:
+        messages.error(request, str(error))
+        return redirect(volver)
+
+    if resultado["actualizados"]:
+        messages.success(request, f"{ACCIONES_MASIVAS[accion]}: {len(resultado['actualizados'])} tickets actualizados.")
+    if resultado["sin_cambios"]:
+        messages.info(request, f"{len(resultado['sin_cambios'])} tickets ya estaban así.")
+    for error in resultado["errores"]:
+        messages.warning(request, f"Ticket #{error['id']}: {error['detalle']}")
+    return redirect(volver)
+
+
 @login_required
 def tickets_detalle(request, ticket_id):
     if not require_role(request.user, "ADMIN"):
@@ -930,13 +987,21 @@ def tickets_detalle(request, ticket_id):
     ticket = get_object_or_404(
         Ticket.objects.select_related(
             "solicitante", "estado", "categoria", "prioridad", "area_afectada"
+        ).prefetch_related(
+            "asignaciones",
+            Prefetch(
+                "historial",
+                queryset=HistorialTicket.objects.select_related(
+                    "usuario", "estado_anterior", "estado_nuevo"
+                ),
+            ),
         ),
         id=ticket_id,
     )
 
     categorias = Categoria.objects.all()
     prioridades = Prioridad.objects.all()
-    estados = EstadoTicket.objects.all()
+    estados = estados_disponibles(ticket.estado)
     areas = AreaAfectada.objects.all()
     tecnicos = Tecnico.objects.select_related("usuario")
 
@@ -947,12 +1012,14 @@ def tickets_detalle(request, ticket_id):
             archivo = request.FILES.get("comentario_archivo")
 
             if texto:
-                ComentarioTicket.objects.create(
-                    ticket=ticket,
-                    usuario=request.user,
-                    texto=texto,
-                    archivo=archivo
-                )
+                with transaction.atomic():
+                    ComentarioTicket.objects.create(
+                        ticket=ticket,
+                        usuario=request.user,
+                        texto=texto,
+                        archivo=archivo or tomar_subida(request.user, request.POST.get("subida_id")),
+                        conservar_original=request.POST.get("conservar_original") == "on",
+                    )
 
                 # Notificar al solicitante
                 Notificacion.objects.create(
@@ -973,8 +1040,6 @@ def tickets_detalle(request, ticket_id):
         nuevo_tecnico_id = request.POST.get("tecnico_asignado")
         comentario = request.POST.get("comentario")
 
-        estado_anterior = ticket.estado
-
         # --- Actualización de datos básicos ---
         if nueva_categoria_id:
             ticket.categoria_id = int(nueva_categoria_id)
@@ -985,64 +1050,69 @@ def tickets_detalle(request, ticket_id):
         if nueva_area_id:
             ticket.area_afectada_id = int(nueva_area_id)
 
-        if nuevo_estado_id:
-            ticket.estado_id = int(nuevo_estado_id)
-
-        # --- SLA: si el estado actual es final, marcamos fecha_cierre ---
-        if ticket.estado and ticket.estado.es_final:
-            if ticket.fecha_cierre is None:
-                ticket.fecha_cierre = timezone.now()
-        else:
-            # Si se reabre el ticket (estado no final), quitamos fecha_cierre
-            ticket.fecha_cierre = None
-
-        ticket.save()
+        # --- Guardado con control de versión (y cambio de estado) ---
+        version = version_esperada(ticket, request.POST.get("version"))
+        cambio_estado = False
+        try:
+            with transaction.atomic():
+                if guardar_cambios(ticket, version):
+                    version += 1
+                if nuevo_estado_id:
+                    cambio_estado = transicionar(
+                        ticket,
+                        get_object_or_404(EstadoTicket, id=int(nuevo_estado_id)),
+                        request.user,
+                        comentario or "Actualización realizada por el administrador.",
+                        version=version,
+                    )
+        except (ErrorTransicion, ConflictoVersion) as error:
+            messages.error(request, str(error))
+            return redirect("tickets_detalle", ticket_id=ticket.id)
 
         # --- Asignación de técnico ---
         tecnico_asignado = None
         if nuevo_tecnico_id:
             tecnico_asignado = get_object_or_404(Tecnico, id=int(nuevo_tecnico_id))
-            AsignacionTicket.objects.update_or_create(
+            if not asignar(ticket, tecnico_asignado.id):
+                tecnico_asignado = None  # Ya era el asignado: no se vuelve a notificar
+
+        # --- Historial (el cambio de estado ya dejó el suyo) ---
+        if not cambio_estado:
+            HistorialTicket.objects.create(
                 ticket=ticket,
-                defaults={
-                    "tecnico_asignado": tecnico_asignado,
-                    "activo": True,
-                },
+                usuario=request.user,
+                estado_anterior=ticket.estado,
+                estado_nuevo=ticket.estado,
+                comentario=comentario or "Actualización realizada por el administrador.",
             )
 
-        # --- Historial ---
-        HistorialTicket.objects.create(
-            ticket=ticket,
-            usuario=request.user,
-            estado_anterior=estado_anterior,
-            estado_nuevo=ticket.estado,
-            comentario=comentario or "Actualización realizada por el administrador.",
-        )
-
         # --- Notificaciones ---
+        notificaciones = []
         if tecnico_asignado:
-            Notificacion.objects.create(
+            notificaciones.append(Notificacion(
                 ticket=ticket,
                 usuario_destino=tecnico_asignado.usuario,
                 tipo_notificacion="asignacion",
                 titulo=f"Ticket #{ticket.id} asignado",
                 mensaje=f"Se te asignó el ticket: {ticket.titulo}",
                 canal_notificacion="portal",
-            )
+            ))
 
-        Notificacion.objects.create(
-            ticket=ticket,
-            usuario_destino=ticket.solicitante,
-            tipo_notificacion="cambio_estado",
-            titulo=f"Ticket #{ticket.id} actualizado",
-            mensaje=f"El estado actual es: {ticket.estado.nombre_estado}",
-            canal_notificacion="portal",
-        )
+        if not cambio_estado:
+            notificaciones.append(Notificacion(
+                ticket=ticket,
+                usuario_destino=ticket.solicitante,
+                tipo_notificacion="cambio_estado",
+                titulo=f"Ticket #{ticket.id} actualizado",
+                mensaje=f"El estado actual es: {ticket.estado.nombre_estado}",
+                canal_notificacion="portal",
+            ))
+        Notificacion.objects.bulk_create(notificaciones)
 
         # --- Mensaje con información de SLA (si aplica) ---
         sla_msg_extra = ""
         if ticket.fecha_cierre and ticket.sla_horas_objetivo:
-            duracion_horas = (ticket.fecha_cierre - ticket.fecha_creacion).total_seconds() / 3600
+            duracion_horas = horas_entre(ticket.fecha_creacion, ticket.fecha_cierre)
             duracion_horas_redondeado = round(duracion_horas, 1)
 
             if duracion_horas <= ticket.sla_horas_objetivo:
@@ -1060,12 +1130,11 @@ def tickets_detalle(request, ticket_id):
     cumplio_sla = None
     horas_totales = None
     if ticket.fecha_cierre and ticket.sla_horas_objetivo:
-        segundos = (ticket.fecha_cierre - ticket.fecha_creacion).total_seconds()
-        horas_totales = round(segundos / 3600, 1)
+        horas_totales = round(horas_entre(ticket.fecha_creacion, ticket.fecha_cierre), 1)
         cumplio_sla = horas_totales <= ticket.sla_horas_objetivo
 
     # --- Obtener comentarios ---
-    comentarios = ticket.comentarios.select_related("usuario").order_by("fecha_creacion")
+    comentarios = ticket.comentarios.select_related("usuario__rol").order_by("fecha_creacion")
 
     return render(request, "admin/tickets_detalle.html", {
         "ticket": ticket,
@@ -1091,7 +1160,7 @@ def tickets_eliminar(request, ticket_id):
     if request.method == "POST":
         ticket_numero = ticket.id
         ticket_titulo = ticket.titulo
-        ticket.delete()
+        eliminar_ticket(ticket)
         messages.success(request, f"Ticket #{ticket_numero} - {ticket_titulo} eliminado correctamente.")
         return redirect("tickets_listar")
 
@@ -1210,7 +1279,7 @@ def ticket_tecnico_detalle(request, ticket_id):
     )
 
     puede_editar = asignado_a_mi
-    estados = EstadoTicket.objects.all()
+    estados = estados_disponibles(ticket.estado)
 
     # ---------------- POST (actualizar estado o agregar comentario) ----------------
     if request.method == "POST":
@@ -1220,12 +1289,14 @@ def ticket_tecnico_detalle(request, ticket_id):
             archivo = request.FILES.get("comentario_archivo")
 
             if texto:
-                ComentarioTicket.objects.create(
-                    ticket=ticket,
-                    usuario=request.user,
-                    texto=texto,
-                    archivo=archivo
-                )
+                with transaction.atomic():
+                    ComentarioTicket.objects.create(
+                        ticket=ticket,
+                        usuario=request.user,
+                        texto=texto,
+                        archivo=archivo or tomar_subida(request.user, request.POST.get("subida_id")),
+                        conservar_original=request.POST.get("conservar_original") == "on",
+                    )
 
                 # Notificar al solicitante
                 usuario_nombre = request.user.get_full_name() or request.user.email
@@ -1250,33 +1321,34 @@ def ticket_tecnico_detalle(request, ticket_id):
         nuevo_estado_id = request.POST.get("estado")
         comentario = (request.POST.get("comentario") or "").strip()
 
-        estado_anterior = ticket.estado
-
+        cambio_estado = False
         if nuevo_estado_id:
-            ticket.estado_id = int(nuevo_estado_id)
-
-        estado_nuevo = ticket.estado
-        if estado_nuevo.es_final:
-            if ticket.fecha_cierre is None:
-                ticket.fecha_cierre = timezone.now()
-        else:
-            ticket.fecha_cierre = None
-
-        ticket.save()
+            try:
+                cambio_estado = transicionar(
+                    ticket,
+                    get_object_or_404(EstadoTicket, id=int(nuevo_estado_id)),
+                    request.user,
+                    comentario or "Actualización realizada por el técnico.",
+                    version=version_esperada(ticket, request.POST.get("version")),
+                )
+            except (ErrorTransicion, ConflictoVersion) as error:
+                messages.error(request, str(error))
+                return redirect("ticket_tecnico_detalle", ticket_id=ticket.id)
 
-        HistorialTicket.objects.create(
-            ticket=ticket,
-            usuario=request.user,
-            estado_anterior=estado_anterior,
-            estado_nuevo=ticket.estado,
-            comentario=comentario or "Actualización realizada por el técnico.",
-        )
+        if not cambio_estado and comentario:
+            HistorialTicket.objects.create(
+                ticket=ticket,
+                usuario=request.user,
+                estado_anterior=ticket.estado,
+                estado_nuevo=ticket.estado,
+                comentario=comentario,
+            )
 
         messages.success(request, "El ticket se actualizó correctamente.")
         return redirect("ticket_tecnico_detalle", ticket_id=ticket.id)
     
     # ---------------- GET ----------------
-    comentarios = ticket.comentarios.select_related("usuario").order_by("fecha_creacion")
+    comentarios = ticket.comentarios.select_related("usuario__rol").order_by("fecha_creacion")
 
     return render(request, "tecnico/ticket_detalle.html", {
         "ticket": ticket,
@@ -1330,14 +1402,16 @@ def ticket_usuario_crear(request):
             messages.error(request, "Título, descripción y área afectada son obligatorios.")
             return render(request, "usuario/ticket_crear.html", {"areas": areas})
 
-        ticket = Ticket.objects.create(
-            titulo=titulo,
-            descripcion=descripcion,
-            solicitante=request.user,
-            area_afectada_id=int(area_id),
-            estado=estado_abierto,
-            archivo=archivo,
-        )
+        with transaction.atomic():
+            ticket = Ticket.objects.create(
+                titulo=titulo,
+                descripcion=descripcion,
+                solicitante=request.user,
+                area_afectada_id=int(area_id),
+                estado=estado_abierto,
+                archivo=archivo or tomar_subida(request.user, request.POST.get("subida_id")),
+                conservar_original=request.POST.get("conservar_original") == "on",
+            )
 
         HistorialTicket.objects.create(
             ticket=ticket,
@@ -1381,12 +1455,14 @@ def ticket_usuario_detalle(request, ticket_id):
         archivo = request.FILES.get("comentario_archivo")
 
         if texto:
-            comentario = ComentarioTicket.objects.create(
-                ticket=ticket,
-                usuario=request.user,
-                texto=texto,
-                archivo=archivo
-            )
+            with transaction.atomic():
+                comentario = ComentarioTicket.objects.create(
+                    ticket=ticket,
+                    usuario=request.user,
+                    texto=texto,
+                    archivo=archivo or tomar_subida(request.user, request.POST.get("subida_id")),
+                    conservar_original=request.POST.get("conservar_original") == "on",
+                )
 
             # --- Notificar al técnico asignado (si existe) ---
             asignacion = AsignacionTicket.objects.filter(ticket=ticket, activo=True).first()
@@ -1423,7 +1499,7 @@ def ticket_usuario_detalle(request, ticket_id):
         return redirect("ticket_usuario_detalle", ticket_id=ticket.id)
 
     # --- Obtener comentarios ---
-    comentarios = ticket.comentarios.select_related("usuario").order_by("fecha_creacion")
+    comentarios = ticket.comentarios.select_related("usuario__rol").order_by("fecha_creacion")
 
     # --- Verificar si ya calificó ---
     ya_califico = hasattr(ticket, 'calificacion')
@@ -1496,7 +1572,7 @@ def editar_perfil(request):
 def notificaciones_listar(request):
     notificaciones = Notificacion.objects.filter(
         usuario_destino=request.user
-    ).order_by("-fecha_envio")
+    ).select_related("ticket").order_by("-fecha_envio")
 
     return render(request, "notificaciones/listar.html", {
         "notificaciones": notificaciones
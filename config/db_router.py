@@ -0,0 +1,152 @@
+"""
+Router de lectura/escritura con una base `reporting` para reportes.
+
+Las vistas y jobs marcados con `lectura_reporting` / `usar_reporting()` leen
+desde el alias `reporting` (copia SQLite refrescada con el backup API o réplica
+PostgreSQL). Todo lo demás, y cualquier escritura, va a `default`.
+
+Se vuelve a la primaria cuando:
+- el alias `reporting` no está configurado,
+- la copia/réplica está más atrasada que `REPORTING_MAX_LAG` segundos,
+- el request ya escribió algo (leer lo propio),
+- el navegador hizo un POST hace menos de `REPORTING_MAX_LAG` segundos
+  (cookie que deja `PrimariaTrasEscrituraMiddleware`).
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+REPORTING = "reporting"
+COOKIE_PRIMARIA = "usar_primaria"
+
+_usar_reporting = ContextVar("usar_reporting", default=False)
+_hubo_escritura = ContextVar("hubo_escritura", default=False)
+
+# Cache del último chequeo de lag: (momento del chequeo, lag en segundos)
+_ultimo_lag = [0.0, None]
+LAG_CACHE_SEGUNDOS = 5
+
+
+def reporting_configurado() -> bool:
+    return REPORTING in settings.DATABASES
+
+
+def _medir_lag():
+    conn = connections[REPORTING]
+    if conn.vendor == "sqlite":
+        nombre = str(conn.settings_dict["NAME"])
+        if nombre == str(connections["default"].settings_dict["NAME"]):
+            return 0.0
+        try:
+            return time.time() - os.path.getmtime(nombre)
+        except OSError:
+            return None
+
+    if conn.vendor == "postgresql":
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN pg_is_in_recovery() "
+                "THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+                "ELSE 0 END"
+            )
+            lag = cursor.fetchone()[0]
+        return float(lag) if lag is not None else None
+
+    return 0.0
+
+
+def lag_reporting():
+    """
+    Segundos de atraso de `reporting` respecto a la primaria, o None si no se
+    puede usar. Se cachea unos segundos para no medir en cada query.
+    """
+    ahora = time.monotonic()
+    if ahora - _ultimo_lag[0] > LAG_CACHE_SEGUNDOS:
+        try:
+            _ultimo_lag[1] = _medir_lag()
+        except Exception:
+            _ultimo_lag[1] = None
+        _ultimo_lag[0] = ahora
+    return _ultimo_lag[1]
+
+
+def reporting_disponible() -> bool:
+    if not reporting_configurado():
+        return False
+    lag = lag_reporting()
+    return lag is not None and lag <= settings.REPORTING_MAX_LAG
+
+
+@contextmanager
+def usar_reporting():
+    """
+    Dirige las lecturas del bloque a `reporting` (si está disponible).
+    Útil para jobs de reportes fuera de una vista.
+    """
+    token_lectura = _usar_reporting.set(reporting_disponible())
+    token_escritura = _hubo_escritura.set(False)
+    try:
+        yield
+    finally:
+        _usar_reporting.reset(token_lectura)
+        _hubo_escritura.reset(token_escritura)
+
+
+def lectura_reporting(view_func):
+    """
+    Decorador para vistas de solo lectura (dashboards, exportaciones).
+    Solo aplica a GET/HEAD y respeta la cookie de lectura propia.
+    """
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or request.COOKIES.get(COOKIE_PRIMARIA):
+            return view_func(request, *args, **kwargs)
+        with usar_reporting():
+            return view_func(request, *args, **kwargs)
+
+    return _wrapped
+
+
+class PrimariaTrasEscrituraMiddleware:
+    """
+    Después de un request que escribe, fija las lecturas del navegador a la
+    primaria durante `REPORTING_MAX_LAG` segundos para que vea sus cambios.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and reporting_configurado():
+            response.set_cookie(
+                COOKIE_PRIMARIA, "1",
+                max_age=settings.REPORTING_MAX_LAG,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class ReportingRouter:
+    def db_for_read(self, model, **hints):
+        if _usar_reporting.get() and not _hubo_escritura.get():
+            return REPORTING
+        return None
+
+    def db_for_write(self, model, **hints):
+        _hubo_escritura.set(True)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # `reporting` es una copia de `default`: mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La copia/réplica se obtiene de la primaria, nunca se migra directo
+        return db != REPORTING
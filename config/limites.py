@@ -0,0 +1,222 @@
+"""
+Límites de tasa y corte de carga para la API, el login y los reportes.
+
+Cada alcance de `LIMITES_TASA` define baldes por usuario, por IP y uno total
+del alcance (por endpoint): `(capacidad, fichas por minuto)`. Un request
+consume una ficha de cada balde que le corresponde y solo pasa si todos
+tienen; si no, se responde 429 con Retry-After. El estado vive en la caché
+configurada (`CACHES`), así que con Redis/Memcached los límites son
+compartidos entre procesos. Con la LocMemCache por defecto, cada proceso
+lleva su propia cuenta.
+
+El balde se aproxima con una ventana deslizante de `capacidad / tasa`
+segundos: un contador por ventana, sumado con el de la ventana anterior
+según cuánto se solapa. Así cada request usa solo operaciones atómicas de la
+caché (`add`/`incr`), sin locks: en régimen permite `fichas por minuto` y en
+ráfaga hasta `capacidad`, como el balde.
+
+La misma función `consumir()` la usan `ThrottleTokenBucket` (DRF) y
+`LimitesMiddleware` (vistas HTML de `LIMITES_VISTAS`). El middleware además
+limita cuántos requests caros corren a la vez en el proceso
+(`LIMITES_CONCURRENCIA`). Si se llega al máximo, responde 503 de inmediato
+en vez de encolar el request detrás de los workers ocupados.
+"""
+import ipaddress
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework.throttling import BaseThrottle
+
+PREFIJO = "limite"
+
+_lock_semaforos = threading.Lock()
+_semaforos = {}
+
+
+def _direccion(ip):
+    try:
+        return ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return None
+
+
+def _es_proxy(ip, redes):
+    direccion = _direccion(ip)
+    return direccion is not None and any(direccion in red for red in redes)
+
+
+def ip_cliente(request):
+    """
+    IP del cliente. X-Forwarded-For solo se lee si el request viene de un
+    proxy de `LIMITES_PROXIES`; si no, cualquiera podría falsificarlo.
+    """
+    remota = request.META.get("REMOTE_ADDR") or ""
+    redes = [ipaddress.ip_network(red, strict=False) for red in settings.LIMITES_PROXIES]
+    if not redes or not _es_proxy(remota, redes):
+        return remota or "desconocida"
+    # De derecha a izquierda: la primera que no es un proxy propio es el cliente
+    for ip in reversed(request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")):
+        if _direccion(ip) is not None and not _es_proxy(ip, redes):
+            return ip.strip()
+    return remota
+
+
+def identidades(request, cuenta=None):
+    """
+    Claves de los baldes del request. Sin sesión, `cuenta` (el email del
+    login) se combina con la IP: quien repite el email de otro agota su
+    propio balde, no bloquea a la víctima.
+    """
+    ip = ip_cliente(request)
+    usuario = getattr(request, "user", None)
+    if usuario is not None and usuario.is_authenticated:
+        cuenta = usuario.pk
+    elif cuenta:
+        cuenta = f"cuenta:{str(cuenta).strip().lower()}:{ip}"
+    return {"usuario": cuenta or None, "ip": ip, "total": "*"}
+
+
+def _sumar(clave, numero, ventana):
+    """Suma uno al contador de la ventana `numero` y devuelve el total."""
+    clave = f"{clave}:{numero}"
+    timeout = int(2 * ventana) + 1
+    while True:
+        if cache.add(clave, 1, timeout=timeout):
+            return clave, 1
+        try:
+            return clave, cache.incr(clave)
+        except ValueError:
+            continue  # Expiró entre add e incr
+
+
+def _espera(capacidad, ventana, anterior, actual, transcurrido):
+    """Segundos hasta que vuelva a caber un request."""
+    if actual > capacidad or not anterior:
+        return ventana - transcurrido
+    # anterior * peso + actual <= capacidad, con peso = 1 - t / ventana
+    return max(ventana * (1 - (capacidad - actual) / anterior) - transcurrido, 0.001)
+
+
+def consumir(alcance, claves, costo=1):
+    """
+    Consume `costo` fichas de cada balde del alcance. Devuelve 0 si el
+    request pasa, o los segundos que faltan para que pueda pasar.
+    """
+    reglas = settings.LIMITES_TASA.get(alcance) if settings.LIMITES_ACTIVOS else None
+    if not reglas:
+        return 0.0
+    baldes = {
+        f"{PREFIJO}:{alcance}:{tipo}:{valor}": reglas[tipo]
+        for tipo, valor in claves.items()
+        if tipo in reglas and valor is not None
+    }
+
+    ahora = time.time()
+    contados = []
+    espera = 0.0
+    for clave, (capacidad, por_minuto) in baldes.items():
+        ventana = capacidad * 60 / por_minuto
+        numero, transcurrido = divmod(ahora, ventana)
+        contador, actual = None, 0
+        for _ in range(costo):
+            contador, actual = _sumar(clave, int(numero), ventana)
+            contados.append(contador)
+        anterior = cache.get(f"{clave}:{int(numero) - 1}", 0)
+        if anterior * (1 - transcurrido / ventana) + actual > capacidad:
+            espera = max(espera, _espera(capacidad, ventana, anterior, actual, transcurrido))
+    if espera:
+        # Un request rechazado no consume: se devuelven las fichas tomadas
+        for contador in contados:
+            try:
+                cache.decr(contador)
+            except ValueError:
+                pass
+    return espera
+
+
+class ThrottleTokenBucket(BaseThrottle):
+    """
+    Throttle de DRF sobre `consumir()`. El alcance es `throttle_scope` de la
+    vista, o `alcance` de la clase.
+    """
+
+    alcance = "api"
+
+    def cuenta(self, request):
+        return None
+
+    def allow_request(self, request, view):
+        alcance = getattr(view, "throttle_scope", None) or self.alcance
+        self.espera = consumir(alcance, identidades(request, self.cuenta(request)))
+        return not self.espera
+
+    def wait(self):
+        return self.espera
+
+
+class ThrottleLogin(ThrottleTokenBucket):
+    """Login JWT: baldes por IP y por cuenta (el email enviado, desde esa IP)."""
+
+    alcance = "login"
+
+    def cuenta(self, request):
+        try:
+            return request.data.get("email")
+        except AttributeError:
+            return None
+
+
+def _semaforo(nombre, maximo):
+    with _lock_semaforos:
+        if (nombre, maximo) not in _semaforos:
+            _semaforos[nombre, maximo] = threading.BoundedSemaphore(maximo)
+        return _semaforos[nombre, maximo]
+
+
+def _rechazo(request, status, segundos, mensaje):
+    if request.path.startswith("/api/"):
+        response = JsonResponse({"detail": mensaje}, status=status)
+    else:
+        response = HttpResponse(mensaje, status=status, content_type="text/plain; charset=utf-8")
+    response["Retry-After"] = str(max(1, int(segundos + 0.999)))
+    return response
+
+
+class LimitesMiddleware:
+    """
+    Límite de tasa de las vistas HTML de `LIMITES_VISTAS` y corte de carga
+    (503) de las vistas de `LIMITES_CONCURRENCIA`, por nombre de URL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.LIMITES_ACTIVOS:
+            return self.get_response(request)
+        try:
+            nombre = resolve(request.path_info).url_name
+        except Resolver404:
+            return self.get_response(request)
+
+        vista = settings.LIMITES_VISTAS.get(nombre)
+        if vista is not None and request.method in vista[1]:
+            cuenta = request.POST.get("email") if request.method == "POST" else None
+            espera = consumir(vista[0], identidades(request, cuenta))
+            if espera:
+                return _rechazo(request, 429, espera, "Demasiadas solicitudes. Intenta de nuevo más tarde.")
+
+        concurrencia = settings.LIMITES_CONCURRENCIA.get(nombre)
+        if concurrencia is None or request.method not in concurrencia[1]:
+            return self.get_response(request)
+        semaforo = _semaforo(nombre, concurrencia[0])
+        if not semaforo.acquire(blocking=False):
+            return _rechazo(request, 503, 1, "El servicio está ocupado. Intenta de nuevo en unos segundos.")
+        try:
+            return self.get_response(request)
+        finally:
+            semaforo.release()
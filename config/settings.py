@@ -64,6 +64,9 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    "DEFAULT_THROTTLE_CLASSES": (
+        "config.limites.ThrottleTokenBucket",
+    ),
 }
 
 MIDDLEWARE = [
@@ -72,8 +75,11 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tickets.eventos.RequestActualMiddleware',
+    'config.limites.LimitesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.db_router.PrimariaTrasEscrituraMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -100,13 +106,55 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfil SQLite para producción:
+# - WAL: los lectores no se bloquean detrás de un escritor.
+# - synchronous=NORMAL: seguro con WAL y mucho más rápido que FULL.
+# - mmap/cache_size: lecturas desde memoria en vez de syscalls.
+# - transaction_mode IMMEDIATE: toma el lock de escritura al abrir la
+#   transacción, evitando el "database is locked" al promover un lector.
+# - timeout: busy_timeout (segundos) antes de fallar por lock.
+SQLITE_INIT_COMMAND = (
+    "PRAGMA journal_mode=WAL;"
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA mmap_size=134217728;"
+    "PRAGMA cache_size=-20000;"
+    "PRAGMA temp_store=MEMORY;"
+)
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": SQLITE_INIT_COMMAND,
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+        # Conexiones persistentes: los PRAGMA se aplican una vez por conexión
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Base de reportes (opcional): copia SQLite de solo lectura refrescada con
+# `python manage.py refrescar_reporting`. En PostgreSQL se reemplaza por la
+# configuración de la réplica. Ver config/db_router.py.
+REPORTING_DB = os.environ.get("COYAHUE_REPORTING_DB")
+if REPORTING_DB:
+    DATABASES["reporting"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": REPORTING_DB,
+        "OPTIONS": {
+            "init_command": "PRAGMA query_only=ON;PRAGMA mmap_size=134217728;PRAGMA cache_size=-20000;",
+        },
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["config.db_router.ReportingRouter"]
+
+# Atraso máximo (segundos) aceptado en `reporting` antes de volver a la primaria
+REPORTING_MAX_LAG = int(os.environ.get("COYAHUE_REPORTING_MAX_LAG", 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -151,3 +199,76 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Descarga de adjuntos (tickets/descargas.py): None = Django sirve el archivo
+# (Range + ETag); "x-accel" = nginx (location interna ADJUNTOS_ACCEL_PREFIX con
+# alias a MEDIA_ROOT); "x-sendfile" = Apache/lighttpd.
+ADJUNTOS_SENDFILE = os.environ.get("COYAHUE_ADJUNTOS_SENDFILE") or None
+ADJUNTOS_ACCEL_PREFIX = "/media-protegida/"
+
+# Normalización de imágenes adjuntas (tickets/normalizacion.py): sin EXIF y
+# con el lado mayor limitado. Fotos en JPEG, capturas en WebP.
+ADJUNTOS_IMAGEN_MAX_LADO = 2560
+ADJUNTOS_CALIDAD_JPEG = 82
+ADJUNTOS_CALIDAD_WEBP = 90
+
+# Subidas reanudables por chunks (tickets/subidas.py). Los chunks viven en
+# MEDIA_ROOT/subidas/ hasta completarse; `limpiar_subidas` borra las vencidas.
+SUBIDAS_TAMANO_CHUNK = 5 * 1024 * 1024
+SUBIDAS_TAMANO_MAXIMO = 500 * 1024 * 1024
+SUBIDAS_EXPIRACION_HORAS = 24
+# Por usuario: subidas sin tomar (en curso o completadas) y bytes entre todas
+SUBIDAS_MAXIMO_ABIERTAS = 10
+SUBIDAS_BYTES_ABIERTOS = 2 * 1024 * 1024 * 1024
+
+# Asignación automática de tickets nuevos (tickets/asignacion.py):
+# None (manual), "menor_carga", "round_robin" o "ponderada". El índice de
+# carga de cada proceso se reconstruye cada ASIGNACION_INDICE_TTL segundos.
+ASIGNACION_AUTOMATICA = os.environ.get("COYAHUE_ASIGNACION_AUTOMATICA") or None
+ASIGNACION_INDICE_TTL = 300
+
+# Plazos de SLA en horas hábiles (tickets/calendario.py): el plazo corre solo
+# en la jornada de SLA_JORNADA (0 = lunes; hora local de TIME_ZONE) y no en
+# los feriados cargados en el admin. COYAHUE_SLA_HORAS_HABILES=0 vuelve a
+# horas corridas. El calendario se rearma cada SLA_CALENDARIO_TTL segundos.
+SLA_HORAS_HABILES = os.environ.get("COYAHUE_SLA_HORAS_HABILES", "1") != "0"
+SLA_JORNADA = {dia: ("09:00", "18:00") for dia in range(5)}
+SLA_CALENDARIO_TTL = 3600
+
+# Límites de tasa y corte de carga (config/limites.py). Baldes por alcance:
+# {tipo: (capacidad, fichas por minuto)} con tipo "usuario", "ip" o "total".
+# Se guardan en la caché por defecto; para compartirlos entre procesos hay que
+# configurar CACHES con Redis o Memcached. COYAHUE_LIMITES=0 los desactiva.
+LIMITES_ACTIVOS = os.environ.get("COYAHUE_LIMITES", "1") != "0"
+# IPs o redes (CIDR) de los proxies propios (nginx). Solo en requests que
+# llegan desde ellos se toma la IP del cliente de X-Forwarded-For.
+LIMITES_PROXIES = [red for red in os.environ.get("COYAHUE_PROXIES", "").split(",") if red]
+LIMITES_TASA = {
+    "api": {"usuario": (300, 300), "ip": (600, 600)},
+    "login": {"usuario": (5, 5), "ip": (20, 20), "total": (200, 600)},
+    "reportes": {"usuario": (5, 10), "total": (20, 60)},
+}
+# Vistas HTML limitadas por el middleware: {nombre de URL: (alcance, métodos)}.
+# La API usa el throttle de DRF (`throttle_scope` de la vista, o "api").
+LIMITES_VISTAS = {
+    "login": ("login", ("POST",)),
+    "reportes_tickets_excel": ("reportes", ("GET",)),
+    "reportes_tickets_pdf": ("reportes", ("GET",)),
+}
+# Máximo de requests simultáneos por proceso: {nombre de URL: (máximo, métodos)}.
+LIMITES_CONCURRENCIA = {
+    "login": (4, ("POST",)),
+    "token_obtain_pair": (4, ("POST",)),
+    "reportes_tickets_excel": (2, ("GET",)),
+    "reportes_tickets_pdf": (2, ("GET",)),
+}
+
+# Adjuntos deduplicados por contenido (SHA-256), ver tickets/storage.py
+STORAGES = {
+    "default": {
+        "BACKEND": "tickets.storage.AlmacenamientoDeduplicado",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
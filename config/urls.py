@@ -25,6 +25,7 @@ from accounts.views import (
     estados_listar,
 
     tickets_listar,
+    tickets_masivo,
     tickets_detalle,
     tickets_eliminar,
     tickets_tecnico_listar,
@@ -49,7 +50,11 @@ from notifications.views import (
     eliminar_todas_notificaciones,
 )
 
-from tickets.views import TicketViewSet
+from config.limites import ThrottleLogin
+
+from tickets.views import (
+    TicketViewSet, SubidaFragmentadaViewSet, adjunto_descargar, ticket_adjuntos_zip,
+)
 
 from knowledge_base.views import (
     faq_listar,
@@ -64,6 +69,7 @@ from knowledge_base.views import (
 
 router = DefaultRouter()
 router.register(r"tickets", TicketViewSet, basename="ticket")
+router.register(r"subidas", SubidaFragmentadaViewSet, basename="subida")
 
 
 urlpatterns = [
@@ -95,6 +101,7 @@ urlpatterns = [
 
     # Tickets admin
     path("panel/tickets/", tickets_listar, name="tickets_listar"),
+    path("panel/tickets/masivo/", tickets_masivo, name="tickets_masivo"),
     path("panel/tickets/<int:ticket_id>/", tickets_detalle, name="tickets_detalle"),
     path("panel/tickets/<int:ticket_id>/eliminar/", tickets_eliminar, name="tickets_eliminar"),
 
@@ -137,8 +144,12 @@ urlpatterns = [
     path("panel/admin/faq/<int:articulo_id>/eliminar/", faq_admin_eliminar, name="faq_admin_eliminar"),
     path("panel/admin/faq/archivo/<int:archivo_id>/eliminar/", faq_admin_eliminar_archivo, name="faq_admin_eliminar_archivo"),
 
+    # Adjuntos
+    path("panel/adjuntos/<str:tipo>/<int:pk>/", adjunto_descargar, name="adjunto_descargar"),
+    path("panel/tickets/<int:ticket_id>/adjuntos.zip", ticket_adjuntos_zip, name="ticket_adjuntos_zip"),
+
     # API auth JWT
-    path("api/auth/login/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path("api/auth/login/", TokenObtainPairView.as_view(throttle_classes=[ThrottleLogin]), name="token_obtain_pair"),
     path("api/auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
 
     # API REST
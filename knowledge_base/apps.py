@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class KnowledgeBaseConfig(AppConfig):
     name = 'knowledge_base'
+
+    def ready(self):
+        from . import signals  # noqa: F401
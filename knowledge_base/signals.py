@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from tickets.miniaturas import encolar_derivados
+from .models import ArchivoFAQ
+
+
+@receiver(post_save, sender=ArchivoFAQ)
+def generar_derivados_archivo_faq(sender, instance, **kwargs):
+    if instance.archivo:
+        nombre = instance.archivo.name
+        transaction.on_commit(lambda: encolar_derivados(nombre))
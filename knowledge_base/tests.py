@@ -1,3 +1,73 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from notifications.models import Notificacion
+from tickets.tests import PresupuestoQueriesMixin, HASHERS_RAPIDOS
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class FAQUsuarioQueriesTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_faq_listar(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("faq_listar")))
+
+    def test_faq_listar_busqueda(self):
+        url = reverse("faq_listar")
+        filtros = {"q": "Artículo", "categoria": self.categoria.id}
+        self.assertQueriesConstantes(lambda: self.client.get(url, filtros))
+
+    def test_faq_detalle(self):
+        url = reverse("faq_detalle", args=[self.articulo.id])
+        self.assertQueriesConstantes(lambda: self.client.get(url))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class FAQAdminQueriesTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def test_faq_admin_listar(self):
+        self.assertQueriesConstantes(lambda: self.client.get(reverse("faq_admin_listar")))
+
+    def test_faq_admin_editar(self):
+        url = reverse("faq_admin_editar", args=[self.articulo.id])
+        self.assertQueriesConstantes(lambda: self.client.get(url))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class FAQGetCondicionalTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+        self.client.get(reverse("faq_listar"))  # Fija la cookie CSRF, parte del ETag
+
+    def test_detalle_304_cuenta_la_visita(self):
+        url = reverse("faq_detalle", args=[self.articulo.id])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.articulo.refresh_from_db()
+        self.assertEqual(self.articulo.vistas, 2)
+
+        self.client.post(reverse("faq_votar", args=[self.articulo.id]), {"voto": "si"})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_listado_cambia_con_articulos_y_notificaciones(self):
+        url = reverse("faq_listar")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get(url, {"q": "VPN"})["ETag"], etag)
+
+        Notificacion.objects.create(
+            usuario_destino=self.usuario, tipo_notificacion="sistema", titulo="Aviso", mensaje="Aviso",
+        )
+        etag_notificacion = self.client.get(url, HTTP_IF_NONE_MATCH=etag)["ETag"]
+        self.assertNotEqual(etag_notificacion, etag)
+
+        self.articulo.titulo = "VPN corporativa"
+        self.articulo.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag_notificacion).status_code, 200)
@@ -1,17 +1,39 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden, JsonResponse
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
 from django.contrib import messages
 
 from .models import ArticuloFAQ, VotoFAQ, ArchivoFAQ
 from tickets.models import Categoria
+from tickets.subidas import tomar_subida
+from tickets.condicional import etag, respuesta_condicional
+from notifications.models import Notificacion
 
 
 # -------------------------------------------------------------------
 # VISTAS PARA USUARIOS (Ver FAQ)
 # -------------------------------------------------------------------
 
+def _partes_del_usuario(request):
+    """
+    Lo que cambia la página para un mismo artículo: el usuario, su token CSRF
+    y la campana de notificaciones de la plantilla base.
+    """
+    notificaciones = Notificacion.objects.filter(usuario_destino=request.user, leida=False).aggregate(
+        total=Count("pk"), ultima=Max("pk"),
+    )
+    return request.user.pk, request.META.get("CSRF_COOKIE"), notificaciones["total"], notificaciones["ultima"]
+
+
+def _condicional(request, valor, generar, ultima):
+    # Con mensajes pendientes la página no es la que el cliente tiene guardada
+    if len(messages.get_messages(request)):
+        return generar()
+    return respuesta_condicional(request, valor, generar, ultima, validar_fecha=False)
+
+
 @login_required
 def faq_listar(request):
     """Lista de artículos FAQ para usuarios (solo lectura)"""
@@ -41,20 +63,30 @@ def faq_listar(request):
     # Categorías para filtro
     categorias = Categoria.objects.filter(activo=True)
     
-    return render(request, 'knowledge_base/faq_listar.html', {
+    # Las vistas no cuentan: suben con cada visita y no cambian el listado
+    resumen = ArticuloFAQ.objects.filter(publicado=True).aggregate(
+        total=Count('pk'), suma=Sum('pk'), ultima=Max('fecha_actualizacion'),
+        util_si=Sum('util_si'), util_no=Sum('util_no'),
+    )
+    valor = etag(
+        'faq_listar', *_partes_del_usuario(request), sorted(request.GET.lists()), *resumen.values()
+    )
+    return _condicional(request, valor, lambda: render(request, 'knowledge_base/faq_listar.html', {
         'articulos': articulos,
         'destacados': destacados,
         'categorias': categorias,
         'query': query,
         'categoria_id': categoria_id,
-    })
+    }), resumen['ultima'])
 
 
 @login_required
 def faq_detalle(request, articulo_id):
     """Detalle de un artículo FAQ"""
     articulo = get_object_or_404(
-        ArticuloFAQ.objects.select_related('categoria', 'creado_por'),
+        ArticuloFAQ.objects.select_related('categoria', 'creado_por').annotate(
+            total_archivos=Count('archivos'), ultimo_archivo=Max('archivos__pk'),
+        ),
         id=articulo_id,
         publicado=True
     )
@@ -69,10 +101,16 @@ def faq_detalle(request, articulo_id):
         articulo=articulo
     ).first()
     
-    return render(request, 'knowledge_base/faq_detalle.html', {
+    # Un 304 también es una visita, pero el contador no invalida la página
+    valor = etag(
+        'faq_detalle', *_partes_del_usuario(request), articulo.pk, articulo.fecha_actualizacion,
+        articulo.util_si, articulo.util_no, articulo.total_archivos, articulo.ultimo_archivo,
+        voto_existente and voto_existente.voto,
+    )
+    return _condicional(request, valor, lambda: render(request, 'knowledge_base/faq_detalle.html', {
         'articulo': articulo,
         'voto_existente': voto_existente,
-    })
+    }), articulo.fecha_actualizacion)
 
 
 @login_required
@@ -139,6 +177,29 @@ def require_role(user, rol_nombre: str) -> bool:
     )
 
 
+def _archivos_del_formulario(request):
+    """
+    Pares (archivo, descripción) del formulario de artículo. Con JavaScript
+    cada fila llega como subida por chunks (`subida_id`, vacío si la fila no
+    tiene archivo); sin él, como multipart normal en `archivos`.
+    """
+    descripciones = request.POST.getlist('descripciones')
+
+    if 'subida_id' in request.POST:
+        pares = []
+        for subida_id, descripcion in zip(request.POST.getlist('subida_id'), descripciones):
+            nombre = tomar_subida(request.user, subida_id)
+            if nombre:
+                pares.append((nombre, descripcion))
+        return pares
+
+    archivos = request.FILES.getlist('archivos')
+    return [
+        (archivo, descripciones[i] if i < len(descripciones) else f"Archivo {i+1}")
+        for i, archivo in enumerate(archivos)
+    ]
+
+
 @login_required
 def faq_admin_listar(request):
     """Lista de artículos FAQ para admin/técnico con opciones de gestión"""
@@ -185,18 +246,16 @@ def faq_admin_crear(request):
         )
         
         # Procesar archivos adjuntos
-        archivos = request.FILES.getlist('archivos')
-        descripciones = request.POST.getlist('descripciones')
-        
-        for i, archivo in enumerate(archivos):
-            descripcion = descripciones[i] if i < len(descripciones) else f"Archivo {i+1}"
-            ArchivoFAQ.objects.create(
-                articulo=articulo,
-                archivo=archivo,
-                descripcion=descripcion.strip(),
-                orden=i,
-                subido_por=request.user
-            )
+        # Las subidas se toman en la misma transacción que crea sus ArchivoFAQ
+        with transaction.atomic():
+            for i, (archivo, descripcion) in enumerate(_archivos_del_formulario(request)):
+                ArchivoFAQ.objects.create(
+                    articulo=articulo,
+                    archivo=archivo,
+                    descripcion=descripcion.strip(),
+                    orden=i,
+                    subido_por=request.user
+                )
         
         messages.success(request, "Artículo FAQ creado correctamente.")
         return redirect('faq_admin_listar')
@@ -229,21 +288,19 @@ def faq_admin_editar(request, articulo_id):
         articulo.save()
         
         # Procesar nuevos archivos adjuntos
-        archivos = request.FILES.getlist('archivos')
-        descripciones = request.POST.getlist('descripciones')
-        
         # Obtener el orden máximo actual
         max_orden = articulo.archivos.count()
         
-        for i, archivo in enumerate(archivos):
-            descripcion = descripciones[i] if i < len(descripciones) else f"Archivo {i+1}"
-            ArchivoFAQ.objects.create(
-                articulo=articulo,
-                archivo=archivo,
-                descripcion=descripcion.strip(),
-                orden=max_orden + i,
-                subido_por=request.user
-            )
+        # Las subidas se toman en la misma transacción que crea sus ArchivoFAQ
+        with transaction.atomic():
+            for i, (archivo, descripcion) in enumerate(_archivos_del_formulario(request)):
+                ArchivoFAQ.objects.create(
+                    articulo=articulo,
+                    archivo=archivo,
+                    descripcion=descripcion.strip(),
+                    orden=max_orden + i,
+                    subido_por=request.user
+                )
         
         messages.success(request, "Artículo FAQ actualizado correctamente.")
         return redirect('faq_admin_listar')
@@ -9,6 +9,7 @@ def notificaciones_listar(request):
     notificaciones = (
         Notificacion.objects
         .filter(usuario_destino=request.user)
+        .select_related("ticket")
         .order_by("-fecha_envio")
     )
     return render(request, "notificaciones/listar.html", {
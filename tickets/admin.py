@@ -10,16 +10,42 @@ from .models import (
     HistorialTicket,
     ComentarioTicket,
     CalificacionTicket,
+    BlobAdjunto,
+    SubidaFragmentada,
+    EventoTicket,
+    AlertaSLA,
+    Feriado,
+    PoliticaSLA,
 )
 
 
 admin.site.register(Categoria)
 admin.site.register(Subcategoria)
 admin.site.register(Prioridad)
-admin.site.register(EstadoTicket)
 admin.site.register(Ticket)
 admin.site.register(AsignacionTicket)
 admin.site.register(HistorialTicket)
 admin.site.register(ComentarioTicket)
 admin.site.register(CalificacionTicket)
+admin.site.register(BlobAdjunto)
+admin.site.register(SubidaFragmentada)
+admin.site.register(EventoTicket)
+admin.site.register(AlertaSLA)
+admin.site.register(Feriado)
 
+
+@admin.register(EstadoTicket)
+class EstadoTicketAdmin(admin.ModelAdmin):
+    filter_horizontal = ["transiciones"]
+
+
+@admin.register(PoliticaSLA)
+class PoliticaSLAAdmin(admin.ModelAdmin):
+    list_display = ["prioridad", "version", "sla_horas", "fecha", "aplicada_en", "tickets_actualizados"]
+    list_filter = ["prioridad"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
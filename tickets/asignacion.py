@@ -0,0 +1,269 @@
+"""
+Asignación de tickets a técnicos, manual o automática.
+
+`asignar()` es el único punto que cambia la asignación activa de un ticket.
+`asignar_automaticamente()` elige técnico para un ticket nuevo según
+`settings.ASIGNACION_AUTOMATICA`:
+
+- "menor_carga": el técnico con menos tickets abiertos entre los que tienen
+  la categoría del ticket en su `especialidad`; si no hay, los del área; si
+  no, todos.
+- "round_robin": por turnos dentro del mismo grupo.
+- "ponderada": menor (carga + 1) / peso, con más peso para la especialidad
+  en la categoría que en el área. Un especialista algo más cargado le gana a
+  un generalista libre.
+
+La carga vive en un índice en memoria (`IndiceCarga`): un heap por
+especialidad con borrado perezoso, así elegir y actualizar cuesta
+O(log n). Se arma con una query al primer uso y se ajusta al asignar y
+al cerrar o reabrir tickets. Cada proceso tiene el suyo y lo reconstruye
+cada `ASIGNACION_INDICE_TTL` segundos para absorber los cambios hechos por
+otros procesos.
+"""
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from accounts.models import Tecnico
+from notifications.models import Notificacion
+from .models import AsignacionTicket, HistorialTicket, Ticket
+
+logger = logging.getLogger(__name__)
+
+ESTRATEGIAS = ("menor_carga", "round_robin", "ponderada")
+GENERAL = "*"
+PESO_CATEGORIA = 2.0
+PESO_AREA = 1.5
+PESO_GENERAL = 1.0
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return " ".join(texto.lower().split())
+
+
+def especialidades(texto):
+    """'Hardware, Redes / TI' -> {'hardware', 'redes', 'ti'}"""
+    return {normalizar(parte) for parte in re.split(r"[,;/|]", texto or "") if parte.strip()}
+
+
+class IndiceCarga:
+    """Tickets abiertos por técnico, con un heap de mínimos por especialidad."""
+
+    def __init__(self, filas=()):
+        self.carga = {}
+        self.grupos = {GENERAL: []}
+        self.turnos = {GENERAL: deque()}
+        self._vigente = {}
+        self._miembros = {}
+        self._orden = itertools.count()
+        self.creado_en = time.monotonic()
+        for tecnico_id, especialidad, carga in filas:
+            self.agregar(tecnico_id, especialidad, carga)
+
+    @classmethod
+    def desde_base(cls):
+        abiertos = Q(
+            tickets_asignados__activo=True,
+            tickets_asignados__ticket__estado__es_final=False,
+            tickets_asignados__ticket__eliminado_en__isnull=True,
+        )
+        filas = (
+            Tecnico.objects
+            .filter(activo=True, usuario__is_active=True)
+            .annotate(carga=Count("tickets_asignados", filter=abiertos))
+            .values_list("pk", "especialidad", "carga")
+        )
+        return cls(filas)
+
+    def agregar(self, tecnico_id, especialidad, carga=0):
+        grupos = especialidades(especialidad) | {GENERAL}
+        self._miembros[tecnico_id] = grupos
+        self.carga[tecnico_id] = carga
+        for grupo in grupos:
+            self.grupos.setdefault(grupo, [])
+            self.turnos.setdefault(grupo, deque()).append(tecnico_id)
+        self._empujar(tecnico_id)
+
+    def _empujar(self, tecnico_id):
+        orden = self._vigente[tecnico_id] = next(self._orden)
+        entrada = (self.carga[tecnico_id], orden, tecnico_id)
+        for grupo in self._miembros[tecnico_id]:
+            heap = self.grupos[grupo]
+            heapq.heappush(heap, entrada)
+            if len(heap) > 4 * len(self.turnos[grupo]) + 16:
+                self._compactar(grupo)
+
+    def _compactar(self, grupo):
+        heap = [e for e in self.grupos[grupo] if self._vigente.get(e[2]) == e[1]]
+        heapq.heapify(heap)
+        self.grupos[grupo] = heap
+
+    def ajustar(self, tecnico_id, delta):
+        if tecnico_id in self.carga:
+            self.carga[tecnico_id] = max(0, self.carga[tecnico_id] + delta)
+            self._empujar(tecnico_id)
+
+    def _tope(self, grupo):
+        """(carga, técnico) menos cargado del grupo, o None."""
+        heap = self.grupos.get(grupo)
+        while heap:
+            carga, orden, tecnico_id = heap[0]
+            if self._vigente.get(tecnico_id) == orden:
+                return carga, tecnico_id
+            heapq.heappop(heap)  # Entrada vieja: el técnico cambió de carga
+        return None
+
+    def _turno(self, grupo):
+        turnos = self.turnos.get(grupo)
+        if not turnos:
+            return None
+        tecnico_id = turnos[0]
+        turnos.rotate(-1)
+        return tecnico_id
+
+    def elegir(self, categoria="", area="", estrategia="menor_carga"):
+        """
+        Devuelve el id del técnico elegido y le suma el ticket a su carga,
+        o None si no hay técnicos activos.
+        """
+        candidatos = [
+            (normalizar(categoria), PESO_CATEGORIA),
+            (normalizar(area), PESO_AREA),
+            (GENERAL, PESO_GENERAL),
+        ]
+        candidatos = [(g, peso) for g, peso in candidatos if g and self.turnos.get(g)]
+        if not candidatos:
+            return None
+
+        if estrategia == "round_robin":
+            tecnico_id = self._turno(candidatos[0][0])
+        elif estrategia == "ponderada":
+            # El tope de cada grupo es su mejor opción: basta comparar esos
+            opciones = []
+            for grupo, peso in candidatos:
+                tope = self._tope(grupo)
+                if tope:
+                    opciones.append(((tope[0] + 1) / peso, self._vigente[tope[1]], tope[1]))
+            tecnico_id = min(opciones)[2]
+        else:
+            tecnico_id = self._tope(candidatos[0][0])[1]
+
+        self.ajustar(tecnico_id, +1)
+        return tecnico_id
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def _con_indice(funcion):
+    global _indice
+    with _lock:
+        ttl = getattr(settings, "ASIGNACION_INDICE_TTL", 300)
+        if _indice is None or time.monotonic() - _indice.creado_en > ttl:
+            _indice = IndiceCarga.desde_base()
+        return funcion(_indice)
+
+
+def invalidar_indice():
+    global _indice
+    with _lock:
+        _indice = None
+
+
+def ajustar_carga(tecnico_ids, delta):
+    """Suma `delta` a la carga de cada técnico al confirmar la transacción."""
+    tecnico_ids = [t for t in tecnico_ids if t is not None]
+    if tecnico_ids:
+        transaction.on_commit(lambda: _con_indice(
+            lambda indice: [indice.ajustar(t, delta) for t in tecnico_ids]
+        ))
+
+
+def asignar(ticket, tecnico_id, reservado=False):
+    """
+    Deja a `tecnico_id` como la asignación activa de `ticket`. Devuelve la
+    asignación nueva, o None si ya era ese técnico. Con `reservado=True` la
+    carga del técnico ya se sumó al elegirlo.
+    """
+    with transaction.atomic():
+        activas = dict(
+            AsignacionTicket.objects
+            .filter(ticket_id=ticket.pk, activo=True)
+            .values_list("pk", "tecnico_asignado_id")
+        )
+        if list(activas.values()) == [tecnico_id]:
+            return None
+        if activas:
+            AsignacionTicket.objects.filter(pk__in=activas).update(activo=False)
+        asignacion = AsignacionTicket.objects.create(ticket=ticket, tecnico_asignado_id=tecnico_id)
+
+        if not ticket.estado.es_final:
+            ajustar_carga(activas.values(), -1)
+            if not reservado:
+                ajustar_carga([tecnico_id], +1)
+    return asignacion
+
+
+def asignar_automaticamente(ticket_id, estrategia=None):
+    """Asigna un ticket sin técnico según la estrategia configurada."""
+    estrategia = estrategia or getattr(settings, "ASIGNACION_AUTOMATICA", None)
+    if estrategia not in ESTRATEGIAS:
+        return None
+    ticket = (
+        Ticket.objects.select_related("estado", "categoria", "area_afectada")
+        .filter(pk=ticket_id).first()
+    )
+    if ticket is None or ticket.estado.es_final or ticket.asignaciones.filter(activo=True).exists():
+        return None
+
+    tecnico_id = _con_indice(lambda indice: indice.elegir(
+        ticket.categoria.nombre_categoria if ticket.categoria else "",
+        ticket.area_afectada.nombre_area,
+        estrategia,
+    ))
+    if tecnico_id is None:
+        return None
+    try:
+        with transaction.atomic():
+            asignacion = asignar(ticket, tecnico_id, reservado=True)
+            HistorialTicket.objects.create(
+                ticket=ticket,
+                usuario=None,
+                estado_anterior=ticket.estado,
+                estado_nuevo=ticket.estado,
+                comentario=f"Asignación automática ({estrategia.replace('_', ' ')})",
+            )
+            usuario_id = Tecnico.objects.filter(pk=tecnico_id).values_list("usuario_id", flat=True).first()
+            Notificacion.objects.create(
+                ticket=ticket,
+                usuario_destino_id=usuario_id,
+                tipo_notificacion="asignacion",
+                titulo=f"Ticket #{ticket.id} asignado",
+                mensaje=f"Se te asignó el ticket: {ticket.titulo}",
+                canal_notificacion="portal",
+            )
+    except Exception:
+        _con_indice(lambda indice: indice.ajustar(tecnico_id, -1))
+        raise
+    return asignacion
+
+
+def asignar_al_confirmar(ticket_id):
+    def ejecutar():
+        try:
+            asignar_automaticamente(ticket_id)
+        except Exception:
+            logger.exception("No se pudo asignar automáticamente el ticket #%s", ticket_id)
+
+    transaction.on_commit(ejecutar)
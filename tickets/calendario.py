@@ -0,0 +1,170 @@
+"""
+Calendario hábil para los plazos de SLA.
+
+Con `settings.SLA_HORAS_HABILES` el plazo corre solo dentro de la jornada
+(`SLA_JORNADA`, hora local de `TIME_ZONE`) y no corre los fines de semana ni
+los feriados (`Feriado`, cargados en el admin). Sin ese setting, las horas
+son corridas.
+
+`CalendarioHabil` precalcula, para cada día de un rango, los segundos hábiles
+acumulados hasta su inicio en un `array` de enteros (8 bytes por día). Con eso
+el tiempo hábil entre dos instantes es una resta y el vencimiento de un plazo
+es una búsqueda binaria (`bisect`), sin recorrer hora por hora. El rango se
+amplía solo si llega una fecha fuera de él: se arma una tabla nueva bajo un
+lock y se reemplaza entera, y cada consulta lee la tabla una sola vez. Cada
+proceso arma el suyo y lo rehace cada `SLA_CALENDARIO_TTL` segundos o al
+cambiar un feriado.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, time as hora, timedelta
+from zoneinfo import ZoneInfo
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+MARGEN_DIAS = 366
+
+
+def _hora(texto):
+    horas, minutos = texto.split(":")
+    return hora(int(horas), int(minutos))
+
+
+class CalendarioHabil:
+    def __init__(self, jornada, feriados=(), zona=None, desde=None, hasta=None):
+        """
+        `jornada`: {día de la semana (0 = lunes): ("HH:MM", "HH:MM")}.
+        `feriados`: fechas sin jornada.
+        """
+        self.zona = zona or ZoneInfo(settings.TIME_ZONE)
+        self.jornada = {dia: (_hora(inicio), _hora(fin)) for dia, (inicio, fin) in jornada.items()}
+        self.feriados = frozenset(feriados)
+        self._lock = threading.Lock()
+        hoy = timezone.localdate()
+        self.tabla = self._armar(
+            desde or hoy - timedelta(days=MARGEN_DIAS), hasta or hoy + timedelta(days=MARGEN_DIAS)
+        )
+        self.creado_en = time.monotonic()
+
+    def _armar(self, desde, hasta):
+        """
+        (origen, último día, acumulado), con acumulado[i] = segundos hábiles
+        desde el origen hasta el inicio del día i. Se reemplaza entera, así
+        otro hilo nunca ve una tabla a medio armar.
+        """
+        acumulado = array("q", [0])
+        total = 0
+        for i in range((hasta - desde).days + 1):
+            total += self._segundos_del_dia(desde + timedelta(days=i))
+            acumulado.append(total)
+        if total == 0:
+            raise ValueError("SLA_JORNADA no tiene horas hábiles.")
+        return desde, hasta, acumulado
+
+    def _segundos_del_dia(self, fecha):
+        tramo = self.jornada.get(fecha.weekday())
+        if tramo is None or fecha in self.feriados:
+            return 0
+        inicio, fin = tramo
+        return max(0, int((datetime.combine(fecha, fin) - datetime.combine(fecha, inicio)).total_seconds()))
+
+    def _tabla_con(self, desde, hasta):
+        """
+        Una tabla que cubre de `desde` a `hasta`. La compartida se lee una sola
+        vez; si no alcanza, se arma una más amplia bajo el lock. Cada consulta
+        trabaja sobre la tupla que recibe, así otro hilo que amplíe el rango no
+        le cambia el origen a mitad del cálculo.
+        """
+        origen, ultimo, _ = tabla = self.tabla
+        if origen <= desde and hasta <= ultimo:
+            return tabla
+        with self._lock:
+            origen, ultimo, _ = tabla = self.tabla
+            if not (origen <= desde and hasta <= ultimo):
+                self.tabla = tabla = self._armar(
+                    min(origen, desde - timedelta(days=MARGEN_DIAS)), max(ultimo, hasta + timedelta(days=MARGEN_DIAS)),
+                )
+            return tabla
+
+    # ---------------- Consultas ----------------
+
+    def _segundos_hasta(self, tabla, momento):
+        """Segundos hábiles desde el origen de `tabla` hasta `momento`."""
+        local = momento.astimezone(self.zona)
+        fecha = local.date()
+        origen, _, acumulado = tabla
+        i = (fecha - origen).days
+        if acumulado[i + 1] == acumulado[i]:
+            return acumulado[i]
+        inicio, fin = self.jornada[fecha.weekday()]
+        actual = min(max(local.time().replace(tzinfo=None), inicio), fin)
+        return acumulado[i] + (datetime.combine(fecha, actual) - datetime.combine(fecha, inicio)).total_seconds()
+
+    def transcurrido(self, desde, hasta):
+        """Segundos hábiles entre dos instantes (negativo si `hasta` es anterior)."""
+        fechas = sorted(momento.astimezone(self.zona).date() for momento in (desde, hasta))
+        # Ambos conteos sobre la misma tabla: el mismo origen
+        tabla = self._tabla_con(*fechas)
+        return self._segundos_hasta(tabla, hasta) - self._segundos_hasta(tabla, desde)
+
+    def sumar(self, desde, segundos):
+        """El instante en que se cumplen `segundos` hábiles contados desde `desde`."""
+        if segundos <= 0:
+            return desde
+        fecha = desde.astimezone(self.zona).date()
+        tabla = self._tabla_con(fecha, fecha)
+        objetivo = self._segundos_hasta(tabla, desde) + segundos
+        origen, ultimo, acumulado = tabla
+        while objetivo > acumulado[-1]:
+            # Plazo más allá del rango: se amplía una tabla local, con el mismo origen
+            ultimo += timedelta(days=MARGEN_DIAS)
+            origen, ultimo, acumulado = self._armar(origen, ultimo)
+        # El día i es el primero cuyo acumulado al terminar alcanza el objetivo
+        i = bisect_left(acumulado, objetivo) - 1
+        fecha = origen + timedelta(days=i)
+        inicio = datetime.combine(fecha, self.jornada[fecha.weekday()][0], tzinfo=self.zona)
+        return inicio + timedelta(seconds=objetivo - acumulado[i])
+
+
+_calendario = None
+_lock = threading.Lock()
+
+
+def calendario():
+    """El calendario del proceso, o None si el SLA corre en horas corridas."""
+    global _calendario
+    if not getattr(settings, "SLA_HORAS_HABILES", False):
+        return None
+    with _lock:
+        ttl = getattr(settings, "SLA_CALENDARIO_TTL", 3600)
+        if _calendario is None or time.monotonic() - _calendario.creado_en > ttl:
+            Feriado = apps.get_model("tickets", "Feriado")
+            _calendario = CalendarioHabil(
+                settings.SLA_JORNADA, Feriado.objects.values_list("fecha", flat=True),
+            )
+        return _calendario
+
+
+def invalidar_calendario():
+    global _calendario
+    with _lock:
+        _calendario = None
+
+
+def sumar_horas(desde, horas):
+    cal = calendario()
+    if cal is None:
+        return desde + timedelta(hours=horas)
+    return cal.sumar(desde, horas * 3600)
+
+
+def horas_entre(desde, hasta):
+    """Horas de SLA (hábiles o corridas, según el setting) entre dos instantes."""
+    cal = calendario()
+    if cal is None:
+        return (hasta - desde).total_seconds() / 3600
+    return cal.transcurrido(desde, hasta) / 3600
@@ -0,0 +1,116 @@
+"""
+Control de concurrencia optimista para la edición de tickets.
+
+Cada escritura sube `Ticket.version`. Los formularios y la API envían la
+versión que el usuario tenía a la vista y `guardar_cambios()` escribe solo
+las columnas modificadas con `UPDATE ... WHERE version = :v`. Si otro usuario
+guardó antes, no se actualiza ninguna fila y se lanza `ConflictoVersion` con
+una pista de qué quedó distinto, para que el usuario revise y vuelva a
+guardar. No hace falta bloquear filas, cosa que SQLite no permite.
+"""
+from django.db import transaction
+from django.db.models import FileField
+from django.utils import timezone
+
+from . import eventos
+from .miniaturas import encolar_derivados
+from .models import Ticket
+
+
+class ConflictoVersion(Exception):
+    status = 409
+
+    def __init__(self, ticket, cambios):
+        """`cambios`: {campo: [antes, después]} que el usuario quería guardar."""
+        self.ticket_id = ticket.pk
+        self.cambios = cambios
+        super().__init__(self._pista(ticket))
+
+    def _pista(self, ticket):
+        campos = {c.name: c for c in eventos.campos_rastreados()}
+        actuales = (
+            Ticket.objects.filter(pk=ticket.pk)
+            .values(*(campos[n].attname for n in self.cambios if n in campos))
+            .first()
+        ) or {}
+        detalle = []
+        for nombre, (_, mio) in self.cambios.items():
+            campo = campos.get(nombre)
+            if campo is None or campo.attname not in actuales:
+                continue
+            actual = actuales[campo.attname]
+            detalle.append(
+                f"{campo.verbose_name}: «{_etiqueta(campo, mio)}» (ahora: «{_etiqueta(campo, actual)}»)"
+            )
+        mensaje = (
+            f"Otro usuario modificó el ticket #{ticket.pk} mientras lo editabas y "
+            "tus cambios no se guardaron."
+        )
+        if detalle:
+            mensaje += " Revisa y vuelve a aplicar: " + "; ".join(detalle) + "."
+        return mensaje
+
+
+def _etiqueta(campo, valor):
+    if valor is None or valor == "":
+        return "—"
+    if campo.is_relation:
+        objeto = campo.related_model._base_manager.filter(pk=valor).first()
+        return str(objeto) if objeto else valor
+    return valor
+
+
+def version_esperada(ticket, valor):
+    """La versión enviada por el cliente, o la de la instancia si no envió."""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return ticket.version
+
+
+def guardar_cambios(ticket, version=None):
+    """
+    Guarda los campos de `ticket` que cambiaron desde que se leyó, solo si
+    su versión en la base sigue siendo `version` (por defecto, la leída).
+    Lanza ConflictoVersion si no. Devuelve los cambios guardados; sin
+    cambios no escribe nada.
+    """
+    version = ticket.version if version is None else version
+    ticket.actualizar_sla()
+    subidos = []
+    for campo in Ticket._meta.concrete_fields:
+        if isinstance(campo, FileField):
+            archivo = getattr(ticket, campo.attname)
+            if archivo and not archivo._committed:
+                # Sube al storage un archivo recién asignado
+                subidos.append((campo, campo.pre_save(ticket, False).name))
+    actuales = eventos.valores(ticket)
+    cambios = eventos.diff(getattr(ticket, "_valores_guardados", {}), actuales)
+    if not cambios:
+        return cambios
+
+    columnas = {
+        campo.attname: campo.value_from_object(ticket)
+        for campo in eventos.campos_rastreados() if campo.name in cambios
+    }
+    ahora = timezone.now()
+    actualizados = Ticket.objects.filter(pk=ticket.pk, version=version).update(
+        **columnas, fecha_actualizacion=ahora, version=version + 1,
+    )
+    if not actualizados:
+        # El archivo subido no quedó en el ticket: se libera su referencia al blob
+        anteriores = getattr(ticket, "_valores_guardados", {})
+        for campo, nombre in subidos:
+            campo.storage.delete(nombre)
+            setattr(ticket, campo.attname, anteriores.get(campo.attname))
+        raise ConflictoVersion(ticket, cambios)
+
+    eventos.registrar(ticket.pk, cambios)
+    if ticket.archivo and "archivo" in cambios:
+        # Lo que haría la señal post_save, que un UPDATE no dispara
+        nombre = ticket.archivo.name
+        transaction.on_commit(lambda: encolar_derivados(nombre))
+    ticket.version = version + 1
+    ticket.fecha_actualizacion = ahora
+    ticket._valores_guardados.update((attname, actuales[attname]) for attname in columnas)
+    return cambios
@@ -0,0 +1,49 @@
+"""
+GET condicional (ETag / Last-Modified) para la API de tickets y las FAQ.
+
+La vista calcula el ETag con una consulta barata (la fila, o un agregado del
+listado) antes de serializar o renderizar. Si el cliente envía ese mismo ETag
+en If-None-Match se responde 304 sin cuerpo; si no, se genera la respuesta y
+se le agregan los validadores. Los ETag son débiles (`W/"..."`): dos
+respuestas con el mismo ETag tienen el mismo contenido, aunque no
+necesariamente los mismos bytes.
+
+Con `validar_fecha=False` (listados y páginas que dependen del usuario) el
+Last-Modified se informa pero no se usa para responder 304: el máximo de
+`fecha_actualizacion` no cambia si un elemento sale del listado.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+# Cualquier caché puede guardar la respuesta, pero debe revalidarla siempre
+CACHE_CONTROL = "private, no-cache"
+VARY = ("Authorization", "Cookie")
+
+
+def etag(*partes):
+    """ETag débil a partir de los valores que determinan el contenido."""
+    resumen = hashlib.md5(repr(partes).encode(), usedforsecurity=False).hexdigest()
+    return f'W/"{resumen}"'
+
+
+def _validadores(response, valor, ultima):
+    response["ETag"] = valor
+    if ultima is not None:
+        response["Last-Modified"] = http_date(ultima.timestamp())
+    response["Cache-Control"] = CACHE_CONTROL
+    patch_vary_headers(response, VARY)
+    return response
+
+
+def respuesta_condicional(request, valor, generar, ultima=None, validar_fecha=True):
+    """
+    304 si el cliente ya tiene la versión `valor`; si no, `generar()` con
+    ETag, Last-Modified (`ultima`) y Cache-Control.
+    """
+    desde = int(ultima.timestamp()) if ultima is not None and validar_fecha else None
+    no_modificado = get_conditional_response(request, etag=valor, last_modified=desde)
+    if no_modificado is not None:
+        return _validadores(no_modificado, valor, ultima)
+    return _validadores(generar(), valor, ultima)
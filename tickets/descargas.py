@@ -0,0 +1,216 @@
+"""
+Entrega de adjuntos ya autorizados.
+
+Según `ADJUNTOS_SENDFILE` la transferencia se delega al servidor web
+(`x-accel` para nginx, `x-sendfile` para Apache/lighttpd) o la hace Django
+con soporte de ETag/If-None-Match y Range (descargas reanudables).
+"""
+import mimetypes
+import os
+import re
+import zipfile
+from datetime import datetime
+
+from django.conf import settings
+from django.urls import reverse
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, content_disposition_header
+
+# model_name → tipo usado en la URL `adjunto_descargar`
+TIPOS_ADJUNTO = {
+    "ticket": "ticket",
+    "comentarioticket": "comentario",
+    "archivofaq": "faq",
+}
+RANGO_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+TAMANO_CHUNK = 64 * 1024
+# Solo estos tipos se muestran en el navegador; el resto (SVG, HTML, ...)
+# se descarga, porque se abriría con el origen de la aplicación.
+TIPOS_INLINE = {"image/png", "image/jpeg", "image/gif", "image/webp", "application/pdf", "text/plain"}
+
+# Formatos ya comprimidos: se guardan sin comprimir (ZIP_STORED) en el ZIP
+EXTENSIONES_COMPRIMIDAS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".pdf", ".zip", ".gz", ".tgz",
+    ".7z", ".rar", ".bz2", ".xz", ".docx", ".xlsx", ".pptx", ".mp4", ".mp3",
+}
+
+
+def url_adjunto(archivo, tamano=None) -> str:
+    """
+    URL protegida de un FieldFile de Ticket, ComentarioTicket o ArchivoFAQ.
+    Con `tamano` apunta al derivado (miniatura/preview).
+    """
+    if not archivo:
+        return ""
+    tipo = TIPOS_ADJUNTO[archivo.instance._meta.model_name]
+    url = reverse("adjunto_descargar", kwargs={"tipo": tipo, "pk": archivo.instance.pk})
+    return f"{url}?tamano={tamano}" if tamano else url
+
+
+def _etag(nombre, stat):
+    # Fuerte (como nginx): If-Range solo acepta validadores fuertes
+    return f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def _if_range_coincide(if_range, etag):
+    """Comparación fuerte (RFC 9110 13.1.5): un ETag débil nunca coincide."""
+    return not if_range.startswith("W/") and if_range == etag
+
+
+def _encabezados(response, disposicion, cache_control):
+    response["Content-Disposition"] = disposicion
+    response["Cache-Control"] = cache_control
+    response["X-Content-Type-Options"] = "nosniff"
+    response["Content-Security-Policy"] = "sandbox"
+    return response
+
+
+def _rango(header, tamano):
+    """
+    Devuelve (inicio, fin) inclusivo para un header Range de un solo rango,
+    None si no hay rango utilizable, o False si es insatisfacible.
+    """
+    match = RANGO_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    inicio, fin = match.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # bytes=-N → últimos N bytes
+        largo = int(fin)
+        if largo == 0:
+            return False
+        return max(tamano - largo, 0), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer(ruta, inicio, largo):
+    with open(ruta, "rb") as f:
+        f.seek(inicio)
+        while largo > 0:
+            chunk = f.read(min(TAMANO_CHUNK, largo))
+            if not chunk:
+                break
+            largo -= len(chunk)
+            yield chunk
+
+
+def servir_archivo(request, nombre, nombre_descarga=None, cache_control="private, no-cache"):
+    """
+    Responde con el archivo `nombre` (relativo a MEDIA_ROOT). La autorización
+    debe hacerse antes de llamar a esta función.
+    """
+    nombre_descarga = nombre_descarga or os.path.basename(nombre)
+    content_type = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+    disposicion = content_disposition_header(
+        content_type not in TIPOS_INLINE, nombre_descarga
+    )
+
+    modo = getattr(settings, "ADJUNTOS_SENDFILE", None)
+    if modo in ("x-accel", "x-sendfile"):
+        response = HttpResponse(content_type=content_type)
+        if modo == "x-accel":
+            response["X-Accel-Redirect"] = settings.ADJUNTOS_ACCEL_PREFIX + nombre
+        else:
+            response["X-Sendfile"] = default_storage.path(nombre)
+        return _encabezados(response, disposicion, cache_control)
+
+    ruta = default_storage.path(nombre)
+    stat = os.stat(ruta)
+    etag = _etag(nombre, stat)
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if no_modificado is not None:
+        return _encabezados(no_modificado, disposicion, cache_control)
+
+    rango = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or _if_range_coincide(if_range, etag):
+        rango = _rango(request.headers.get("Range"), stat.st_size)
+
+    if rango is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+    elif rango:
+        inicio, fin = rango
+        largo = fin - inicio + 1
+        response = StreamingHttpResponse(_leer(ruta, inicio, largo), status=206, content_type=content_type)
+        response["Content-Range"] = f"bytes {inicio}-{fin}/{stat.st_size}"
+        response["Content-Length"] = str(largo)
+    else:
+        response = FileResponse(open(ruta, "rb"), content_type=content_type)
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    return _encabezados(response, disposicion, cache_control)
+
+
+class _BufferZip:
+    """
+    Destino no seekable para ZipFile: acumula lo escrito y lo entrega por
+    partes, así el ZIP nunca está completo en memoria ni en disco.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    # Sin seek(): ZipFile escribe en modo streaming (data descriptors)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def zip_en_streaming(entradas):
+    """
+    Genera un ZIP por chunks a partir de `entradas`: pares
+    (nombre dentro del ZIP, nombre en el storage).
+    """
+    buffer = _BufferZip()
+    with zipfile.ZipFile(buffer, mode="w", allowZip64=True) as zf:
+        for nombre_zip, nombre in entradas:
+            ruta = default_storage.path(nombre)
+            try:
+                stat = os.stat(ruta)
+            except OSError:
+                continue
+
+            fecha = datetime.fromtimestamp(stat.st_mtime).timetuple()[:6]
+            info = zipfile.ZipInfo(nombre_zip, date_time=fecha)
+            info.file_size = stat.st_size
+            if os.path.splitext(nombre)[1].lower() in EXTENSIONES_COMPRIMIDAS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(ruta, "rb") as origen, zf.open(info, mode="w") as destino:
+                while chunk := origen.read(TAMANO_CHUNK):
+                    destino.write(chunk)
+                    if datos := buffer.vaciar():
+                        yield datos
+            if datos := buffer.vaciar():
+                yield datos
+    # Directorio central
+    if datos := buffer.vaciar():
+        yield datos
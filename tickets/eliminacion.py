@@ -0,0 +1,208 @@
+"""
+Eliminación de tickets y usuarios en dos fases.
+
+`eliminar_ticket()` y `eliminar_usuario()` solo marcan `eliminado_en`: el
+ticket desaparece de inmediato de los listados y el usuario ya no puede
+entrar. La purga corre después del commit, en un hilo aparte, y borra los
+dependientes por lotes de `LOTE` filas. Cada lote va en su propia transacción
+corta, así la base no queda bloqueada ni se cargan miles de objetos en
+memoria. Las tablas sin dependientes ni señales de borrado se limpian con
+DELETE directo (`_raw_delete`). Los adjuntos se borran del storage después
+del commit de cada lote.
+
+`python manage.py purgar_eliminados` retoma lo que haya quedado pendiente,
+por ejemplo tras reiniciar el servidor.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from accounts.models import Usuario
+from knowledge_base.models import ArticuloFAQ, ArchivoFAQ, VotoFAQ
+from notifications.models import Notificacion
+from .models import (
+    Ticket, AsignacionTicket, HistorialTicket, ComentarioTicket, CalificacionTicket,
+    SubidaFragmentada, EventoTicket, AlertaSLA, CambioSincronizacion,
+)
+from .asignacion import invalidar_indice
+from . import sincronizacion
+from .subidas import descartar_chunks
+
+logger = logging.getLogger(__name__)
+
+LOTE = 500
+ARCHIVOS_ADJUNTO = ("archivo", "archivo_original")
+
+# Un solo hilo: las purgas se serializan y no compiten entre sí por el lock
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eliminacion")
+
+# (modelo, filtro por ticket, campos de archivo): tablas hoja, DELETE directo
+DEPENDIENTES_TICKET = [
+    (Notificacion, "ticket_id__in", ()),
+    (HistorialTicket, "ticket_id__in", ()),
+    (AsignacionTicket, "ticket_id__in", ()),
+    (ComentarioTicket, "ticket_id__in", ARCHIVOS_ADJUNTO),
+    (CalificacionTicket, "ticket_id__in", ()),
+    (EventoTicket, "ticket_id__in", ()),
+    (AlertaSLA, "ticket_id__in", ()),
+]
+
+# Lo que un usuario dejó en tickets ajenos y en la base de conocimiento
+DEPENDIENTES_USUARIO = [
+    (ComentarioTicket, "usuario_id", ARCHIVOS_ADJUNTO),
+    (CalificacionTicket, "usuario_id", ()),
+    (Notificacion, "usuario_destino_id", ()),
+    (VotoFAQ, "usuario_id", ()),
+    (AsignacionTicket, "tecnico_asignado__usuario_id", ()),
+]
+
+# FKs con on_delete=SET_NULL hacia el usuario
+REFERENCIAS_USUARIO = [
+    (HistorialTicket, "usuario_id"),
+    (EventoTicket, "usuario_id"),
+    (ArticuloFAQ, "creado_por_id"),
+    (ArchivoFAQ, "subido_por_id"),
+]
+
+
+def _borrar_archivos_al_confirmar(qs, campos):
+    nombres = [nombre for fila in qs.values_list(*campos) for nombre in fila if nombre]
+    if nombres:
+        transaction.on_commit(lambda: _borrar_archivos(nombres))
+
+
+def _borrar_archivos(nombres):
+    for nombre in nombres:
+        try:
+            default_storage.delete(nombre)
+        except OSError:
+            logger.exception("No se pudo borrar el adjunto %s", nombre)
+
+
+def _borrar_por_lotes(qs, campos_archivo=(), directo=True):
+    """
+    Borra las filas de `qs` por lotes de PK, una transacción por lote.
+    Con `directo=False` usa el borrado del ORM (señales y cascadas).
+    Devuelve cuántas filas borró.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            pks = list(qs.values_list("pk", flat=True)[:LOTE])
+            if not pks:
+                return total
+            lote = qs.model._base_manager.filter(pk__in=pks)
+            if campos_archivo:
+                _borrar_archivos_al_confirmar(lote, campos_archivo)
+            if directo:
+                total += lote._raw_delete(lote.db)
+            else:
+                total += lote.delete()[1].get(qs.model._meta.label, 0)
+
+
+def _anular_por_lotes(modelo, campo, valor):
+    while True:
+        pks = list(modelo._base_manager.filter(**{campo: valor}).values_list("pk", flat=True)[:LOTE])
+        if not pks:
+            return
+        modelo._base_manager.filter(pk__in=pks).update(**{campo: None})
+
+
+# -------------------------------------------------------------------
+# Fase 1: marcar
+# -------------------------------------------------------------------
+
+def eliminar_ticket(ticket):
+    Ticket.todos.filter(pk=ticket.pk).update(eliminado_en=timezone.now())
+    sincronizacion.registrar_tickets([ticket.pk], solicitantes={ticket.pk: ticket.solicitante_id})
+    transaction.on_commit(invalidar_indice)
+    _encolar(purgar_ticket, ticket.pk)
+
+
+def eliminar_usuario(usuario):
+    ahora = timezone.now()
+    with transaction.atomic():
+        Usuario.objects.filter(pk=usuario.pk).update(
+            eliminado_en=ahora, is_active=False, activo=False
+        )
+        tickets = Ticket.todos.filter(solicitante_id=usuario.pk, eliminado_en__isnull=True)
+        ids = list(tickets.values_list("pk", flat=True))
+        sincronizacion.registrar_tickets(ids, solicitantes=dict.fromkeys(ids, usuario.pk))
+        tickets.update(eliminado_en=ahora)
+    transaction.on_commit(invalidar_indice)
+    _encolar(purgar_usuario, usuario.pk)
+
+
+def _encolar(funcion, pk):
+    transaction.on_commit(lambda: _executor.submit(_purgar_seguro, funcion, pk))
+
+
+def _purgar_seguro(funcion, pk):
+    try:
+        funcion(pk)
+    except Exception:
+        logger.exception("Falló %s(%s); purgar_eliminados lo retomará", funcion.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+# -------------------------------------------------------------------
+# Fase 2: purgar
+# -------------------------------------------------------------------
+
+def purgar_tickets(ids):
+    """Purga los tickets `ids` (lista de PK) con todos sus dependientes."""
+    for modelo, filtro, campos_archivo in DEPENDIENTES_TICKET:
+        _borrar_por_lotes(modelo._base_manager.filter(**{filtro: ids}), campos_archivo)
+    return _borrar_por_lotes(Ticket.todos.filter(pk__in=ids), ARCHIVOS_ADJUNTO, directo=False)
+
+
+def purgar_ticket(pk):
+    if Ticket.todos.filter(pk=pk, eliminado_en__isnull=False).exists():
+        purgar_tickets([pk])
+
+
+def purgar_usuario(pk):
+    if not Usuario.objects.filter(pk=pk, eliminado_en__isnull=False).exists():
+        return
+
+    while ids := list(Ticket.todos.filter(solicitante_id=pk).values_list("pk", flat=True)[:LOTE]):
+        purgar_tickets(ids)
+
+    # Lo que se borra de tickets ajenos queda como eliminado para la sincronización
+    sincronizacion.registrar(
+        CambioSincronizacion.RECURSO_COMENTARIO,
+        ComentarioTicket.objects.filter(usuario_id=pk).values_list("pk", "ticket_id"),
+    )
+    sincronizacion.registrar_tickets(
+        AsignacionTicket.objects.filter(tecnico_asignado__usuario_id=pk).values_list("ticket_id", flat=True),
+        CambioSincronizacion.RECURSO_ASIGNACION,
+    )
+    for modelo, campo, campos_archivo in DEPENDIENTES_USUARIO:
+        _borrar_por_lotes(modelo._base_manager.filter(**{campo: pk}), campos_archivo)
+    for modelo, campo in REFERENCIAS_USUARIO:
+        _anular_por_lotes(modelo, campo, pk)
+
+    for subida in SubidaFragmentada.objects.filter(usuario_id=pk):
+        descartar_chunks(subida)
+        if subida.archivo:
+            default_storage.delete(subida.archivo)
+
+    # Lo que queda (perfil técnico, tokens, subidas) es poco: cascada normal
+    Usuario.objects.filter(pk=pk).delete()
+
+
+def purgar_pendientes():
+    """Purga todo lo marcado. Devuelve (tickets, usuarios) procesados."""
+    usuarios = list(Usuario.objects.filter(eliminado_en__isnull=False).values_list("pk", flat=True))
+    for pk in usuarios:
+        purgar_usuario(pk)
+
+    tickets = 0
+    marcados = Ticket.todos.filter(eliminado_en__isnull=False)
+    while ids := list(marcados.values_list("pk", flat=True)[:LOTE]):
+        tickets += purgar_tickets(ids)
+    return tickets, len(usuarios)
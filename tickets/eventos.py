@@ -0,0 +1,191 @@
+"""
+Línea de tiempo de tickets como log de eventos (`EventoTicket`).
+
+Cada creación o modificación de un ticket agrega un evento con solo los campos
+que cambiaron: `{"campo": [antes, después]}`, con las FK como id. Los eventos
+de una transacción se juntan y se insertan con un solo `bulk_create` después
+del commit. Si la transacción, o el savepoint donde se generaron, se revierte,
+se descartan. `estado_en()` / `estados_en()` reconstruyen el estado de uno o
+varios tickets en cualquier instante, para reportes históricos exactos.
+
+Los cambios hechos con `QuerySet.update()` no pasan por `save()`. Quien los
+haga debe registrar el evento con `registrar()`.
+"""
+from contextvars import ContextVar
+from weakref import WeakValueDictionary
+
+from django.db import transaction
+from django.db.models.fields.files import FieldFile, FileField
+from django.utils import timezone
+
+from . import sincronizacion
+from .models import EventoTicket, Ticket
+
+# Campos sin valor histórico: se excluyen de los diffs
+CAMPOS_EXCLUIDOS = {"id", "fecha_creacion", "fecha_actualizacion", "version"}
+
+_request_actual = ContextVar("request_actual", default=None)
+
+
+class RequestActualMiddleware:
+    """Deja el request a mano para atribuir los eventos a su usuario."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request_actual.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request_actual.reset(token)
+
+
+def _usuario_actual_id():
+    # DRF asigna el usuario autenticado (JWT) al HttpRequest original, así
+    # que se lee recién al registrar y no al entrar al middleware.
+    request = _request_actual.get()
+    usuario = getattr(request, "user", None)
+    return usuario.pk if usuario is not None and usuario.is_authenticated else None
+
+
+def campos_rastreados():
+    return [f for f in Ticket._meta.concrete_fields if f.name not in CAMPOS_EXCLUIDOS]
+
+
+def _valor(campo, instance):
+    valor = campo.value_from_object(instance)
+    if isinstance(valor, FieldFile):
+        return valor.name or None
+    return valor
+
+
+def valores(instance):
+    """{attname: valor} de los campos rastreados, comparable con `from_db`."""
+    return {campo.attname: _valor(campo, instance) for campo in campos_rastreados()}
+
+
+def diff(anteriores, actuales):
+    """
+    Cambios entre dos dicts {attname: valor}. Las claves sin valor anterior
+    conocido (campos diferidos) se ignoran.
+    """
+    cambios = {}
+    for campo in campos_rastreados():
+        if campo.attname not in anteriores:
+            continue
+        antes, despues = anteriores[campo.attname], actuales[campo.attname]
+        if isinstance(campo, FileField):
+            antes = antes or None  # En la base un archivo vacío es ""
+        if antes != despues:
+            cambios[campo.name] = [antes, despues]
+    return cambios
+
+
+class _LoteEventos(list):
+    """
+    Eventos pendientes de una transacción (o savepoint). El propio lote es el
+    callback de `on_commit`: lo registra una vez el primer evento y al
+    ejecutarse inserta todo con un solo `bulk_create`. `sincronizados` son
+    los (ticket_id, es asignación) que ya tienen su fila de sincronización.
+    """
+
+    def __init__(self, lotes, clave):
+        super().__init__()
+        self.lotes = lotes
+        self.clave = clave
+        self.sincronizados = set()
+
+    def __call__(self):
+        if self.lotes.get(self.clave) is self:
+            del self.lotes[self.clave]
+        EventoTicket.objects.bulk_create(self)
+        self.clear()
+
+
+def _lotes(conexion):
+    """
+    Lotes pendientes de la conexión por savepoint. Las referencias son
+    débiles: si el savepoint o la transacción se revierten, Django descarta
+    el callback y el lote desaparece del dict sin que nadie lo limpie.
+    """
+    return conexion.__dict__.setdefault("_eventos_ticket", WeakValueDictionary())
+
+
+def registrar(ticket_id, cambios, tipo=EventoTicket.TIPO_CAMBIO, usuario_id=None):
+    if not cambios:
+        return
+    evento = EventoTicket(
+        ticket_id=ticket_id,
+        usuario_id=usuario_id if usuario_id is not None else _usuario_actual_id(),
+        fecha=timezone.now(),
+        tipo=tipo,
+        cambios=cambios,
+    )
+
+    conexion = transaction.get_connection()
+    if not conexion.in_atomic_block:
+        # Autocommit: el cambio del ticket ya está confirmado
+        evento.save()
+        sincronizacion.registrar_eventos([evento])
+        return
+
+    lotes = _lotes(conexion)
+    clave = tuple(conexion.savepoint_ids)
+    lote = lotes.get(clave)
+    if lote is None:
+        lote = lotes[clave] = _LoteEventos(lotes, clave)
+        transaction.on_commit(lote)
+    # La secuencia de sincronización se escribe en esta misma transacción;
+    # basta una fila por ticket (o por sus asignaciones) en cada lote.
+    sincronizado = (ticket_id, tipo == EventoTicket.TIPO_ASIGNACION)
+    if sincronizado not in lote.sincronizados:
+        lote.sincronizados.add(sincronizado)
+        sincronizacion.registrar_eventos([evento])
+    lote.append(evento)
+
+
+def _pendientes(ticket_id):
+    for lote in list(_lotes(transaction.get_connection()).values()):
+        yield from (evento for evento in lote if evento.ticket_id == ticket_id)
+
+
+def tecnico_asignado(ticket_id):
+    """
+    Último técnico asignado según el log (None si nunca tuvo), contando los
+    eventos de la transacción en curso que aún no se insertan.
+    """
+    pendientes = [e for e in _pendientes(ticket_id) if "tecnico_asignado" in e.cambios]
+    if pendientes:
+        return max(pendientes, key=lambda e: e.fecha).cambios["tecnico_asignado"][1]
+    ultimo = (
+        EventoTicket.objects
+        .filter(ticket_id=ticket_id, cambios__has_key="tecnico_asignado")
+        .order_by("-fecha", "-pk")
+        .values_list("cambios", flat=True)
+        .first()
+    )
+    return ultimo["tecnico_asignado"][1] if ultimo else None
+
+
+def estados_en(ticket_ids, momento):
+    """
+    {ticket_id: {campo: valor}} con el estado de cada ticket en `momento`,
+    en una sola query. Los tickets que aún no existían no aparecen.
+    """
+    estados = {}
+    eventos = (
+        EventoTicket.objects
+        .filter(ticket_id__in=ticket_ids, fecha__lte=momento)
+        .order_by("fecha", "pk")
+        .values_list("ticket_id", "cambios")
+    )
+    for ticket_id, cambios in eventos.iterator(chunk_size=2000):
+        estado = estados.setdefault(ticket_id, {"id": ticket_id})
+        for campo, (_, nuevo) in cambios.items():
+            estado[campo] = nuevo
+    return estados
+
+
+def estado_en(ticket_id, momento):
+    return estados_en([ticket_id], momento).get(ticket_id)
@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import Rol, Usuario
+from tickets.models import AreaAfectada, Categoria, EstadoTicket, Prioridad, Ticket
+from tickets.serializers import TicketListaSerializer, TicketSerializer
+
+
+class _Deshacer(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide filas/s del listado de tickets con TicketSerializer (DRF) y con "
+        "TicketListaSerializer (values_list). Los tickets de prueba se crean "
+        "en una transacción que se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=10_000)
+        parser.add_argument("--repeticiones", type=int, default=3)
+
+    def handle(self, *args, tickets, repeticiones, **options):
+        try:
+            with transaction.atomic():
+                self._sembrar(tickets)
+                resultados = self._medir(repeticiones)
+                raise _Deshacer
+        except _Deshacer:
+            pass
+
+        drf, rapido, iguales = resultados
+        if not iguales:
+            raise CommandError("Los dos serializadores no producen el mismo JSON.")
+        self.stdout.write(f"TicketSerializer       {drf:10,.0f} filas/s")
+        self.stdout.write(f"TicketListaSerializer  {rapido:10,.0f} filas/s")
+        self.stdout.write(self.style.SUCCESS(f"Ganancia: x{rapido / drf:.1f} (mismo JSON)"))
+
+    def _sembrar(self, tickets):
+        rol, _ = Rol.objects.get_or_create(nombre_rol="USUARIO")
+        solicitante = Usuario.objects.create_user(email="benchmark@coyahue.cl", password=None, rol=rol)
+        categoria = Categoria.objects.create(nombre_categoria="Benchmark")
+        prioridad = Prioridad.objects.create(nombre_prioridad="Benchmark", nivel=99, sla_horas=8)
+        area = AreaAfectada.objects.create(nombre_area="Benchmark")
+        estado = EstadoTicket.objects.create(nombre_estado="Benchmark")
+        Ticket.objects.bulk_create(
+            [
+                Ticket(
+                    titulo=f"Ticket {i}", descripcion="Equipo no enciende", solicitante=solicitante,
+                    categoria=categoria, prioridad=prioridad, area_afectada=area, estado=estado,
+                    sla_horas_objetivo=8, archivo="tickets_adjuntos/captura.png" if i % 4 == 0 else None,
+                )
+                for i in range(tickets)
+            ],
+            batch_size=1000,
+        )
+        self.queryset = Ticket.objects.filter(solicitante=solicitante).order_by("pk")
+        # Las URL de adjuntos son absolutas, como en la API
+        host = next((h for h in settings.ALLOWED_HOSTS if h[0] not in ".*"), "localhost")
+        self.contexto = {"request": RequestFactory(HTTP_HOST=host).get("/api/tickets/")}
+
+    def _medir(self, repeticiones):
+        filas = self.queryset.count()
+        tiempos = {}
+        salidas = {}
+        for nombre, serializar in (
+            ("drf", lambda: TicketSerializer(
+                self.queryset.select_related("solicitante"), many=True, context=self.contexto,
+            ).data),
+            ("rapido", lambda: TicketListaSerializer(self.queryset, self.contexto).data),
+        ):
+            mejor = None
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                datos = serializar()
+                transcurrido = time.perf_counter() - inicio
+                mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+            tiempos[nombre] = filas / mejor
+            salidas[nombre] = JSONRenderer().render(datos)
+        return tiempos["drf"], tiempos["rapido"], salidas["drf"] == salidas["rapido"]
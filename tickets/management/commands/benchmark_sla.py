@@ -0,0 +1,93 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tickets.calendario import CalendarioHabil
+from tickets.models import Feriado, SLA_FRACCION_ADVERTENCIA
+
+HORAS_SLA = (2, 4, 8, 24, 48, 72)
+
+
+def sumar_hora_a_hora(calendario, desde, segundos):
+    """Cálculo ingenuo, sin tabla: avanza como mucho una hora por vuelta."""
+    actual = desde.astimezone(calendario.zona)
+    restantes = segundos
+    while restantes > 0:
+        fecha = actual.date()
+        tramo = calendario.jornada.get(fecha.weekday())
+        if tramo is None or fecha in calendario.feriados:
+            actual = datetime.combine(fecha + timedelta(days=1), datetime.min.time(), tzinfo=calendario.zona)
+            continue
+        inicio = datetime.combine(fecha, tramo[0], tzinfo=calendario.zona)
+        fin = datetime.combine(fecha, tramo[1], tzinfo=calendario.zona)
+        if actual < inicio:
+            actual = inicio
+        elif actual >= fin:
+            actual = datetime.combine(fecha + timedelta(days=1), datetime.min.time(), tzinfo=calendario.zona)
+        else:
+            paso = min(restantes, 3600, (fin - actual).total_seconds())
+            actual += timedelta(seconds=paso)
+            restantes -= paso
+    return actual
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el cálculo de plazos de SLA en horas hábiles con la tabla "
+        "precalculada (búsqueda binaria) contra el recorrido hora a hora."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=1_000_000)
+        parser.add_argument("--muestra", type=int, default=5000,
+                            help="Tickets calculados hora a hora (se extrapola al total).")
+        parser.add_argument("--semilla", type=int, default=42)
+
+    def handle(self, *args, tickets, muestra, semilla, **options):
+        azar = random.Random(semilla)
+        ahora = timezone.now()
+        datos = [
+            (ahora - timedelta(seconds=azar.randrange(180 * 86400)), azar.choice(HORAS_SLA) * 3600)
+            for _ in range(tickets)
+        ]
+
+        inicio = time.perf_counter()
+        calendario = CalendarioHabil(settings.SLA_JORNADA, Feriado.objects.values_list("fecha", flat=True))
+        armado = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        plazos = [
+            (calendario.sumar(creacion, segundos), calendario.sumar(creacion, segundos * (1 - SLA_FRACCION_ADVERTENCIA)))
+            for creacion, segundos in datos
+        ]
+        tabla = time.perf_counter() - inicio
+
+        muestra = min(muestra, tickets)
+        inicio = time.perf_counter()
+        ingenuos = [
+            (sumar_hora_a_hora(calendario, creacion, segundos),
+             sumar_hora_a_hora(calendario, creacion, segundos * (1 - SLA_FRACCION_ADVERTENCIA)))
+            for creacion, segundos in datos[:muestra]
+        ]
+        hora_a_hora = (time.perf_counter() - inicio) * tickets / max(muestra, 1)
+
+        distintos = sum(
+            abs((a - b).total_seconds()) > 1
+            for calculado, ingenuo in zip(plazos, ingenuos)
+            for a, b in zip(calculado, ingenuo)
+        )
+        _, _, acumulado = calendario.tabla
+        self.stdout.write(
+            f"Tabla: {len(acumulado)} días, {acumulado.itemsize * len(acumulado) / 1024:.1f} KiB, "
+            f"armada en {armado * 1000:.1f} ms"
+        )
+        self.stdout.write(f"Con tabla   {tabla:8.2f} s  ({tickets / tabla:,.0f} tickets/s)")
+        self.stdout.write(f"Hora a hora {hora_a_hora:8.2f} s  (estimado con {muestra} tickets)")
+        if distintos:
+            self.stderr.write(self.style.ERROR(f"{distintos} plazos distintos entre ambos cálculos."))
+        elif tabla:
+            self.stdout.write(self.style.SUCCESS(f"Ganancia: x{hora_a_hora / tabla:.1f}"))
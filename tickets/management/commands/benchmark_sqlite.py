@@ -0,0 +1,120 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el throughput de escrituras/lecturas concurrentes en SQLite "
+        "con la configuración por defecto y con el perfil de producción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escritores", type=int, default=8)
+        parser.add_argument("--lectores", type=int, default=4)
+        parser.add_argument("--operaciones", type=int, default=300,
+                            help="Transacciones de escritura por hilo.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = self._correr(Path(tmp) / "default.sqlite3", perfil_produccion=False, **options)
+            prod = self._correr(Path(tmp) / "produccion.sqlite3", perfil_produccion=True, **options)
+
+        for nombre, r in (("Por defecto", base), ("Producción", prod)):
+            self.stdout.write(
+                f"{nombre:12} {r['escrituras_s']:9.1f} escrituras/s  "
+                f"{r['lecturas_s']:9.1f} lecturas/s  "
+                f"{r['bloqueos']:5d} 'database is locked'"
+            )
+        if base["escrituras_s"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"Ganancia en escrituras: x{prod['escrituras_s'] / base['escrituras_s']:.1f}"
+            ))
+
+    def _conectar(self, ruta, perfil_produccion):
+        db_opts = settings.DATABASES["default"].get("OPTIONS", {})
+        if not perfil_produccion:
+            # Igual que Django sin OPTIONS: timeout de 5 s y transacciones diferidas
+            return sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+
+        conn = sqlite3.connect(
+            ruta, timeout=db_opts.get("timeout", 5), isolation_level=None, check_same_thread=False
+        )
+        for pragma in db_opts.get("init_command", "").split(";"):
+            if pragma.strip():
+                conn.execute(pragma)
+        return conn
+
+    def _correr(self, ruta, perfil_produccion, escritores, lectores, operaciones, **kwargs):
+        conn = self._conectar(ruta, perfil_produccion)
+        conn.execute("CREATE TABLE articulo (id INTEGER PRIMARY KEY, vistas INTEGER NOT NULL)")
+        conn.execute(
+            "CREATE TABLE notificacion (id INTEGER PRIMARY KEY, articulo_id INTEGER, mensaje TEXT)"
+        )
+        conn.executemany("INSERT INTO articulo (id, vistas) VALUES (?, 0)", [(i,) for i in range(50)])
+        conn.close()
+
+        begin = "BEGIN IMMEDIATE" if perfil_produccion else "BEGIN"
+        contadores = {"escrituras": 0, "lecturas": 0, "bloqueos": 0}
+        lock = threading.Lock()
+        terminado = threading.Event()
+
+        def escritor(n):
+            c = self._conectar(ruta, perfil_produccion)
+            for i in range(operaciones):
+                articulo_id = (n * operaciones + i) % 50
+                try:
+                    # Patrón típico del ORM: leer y luego escribir en la misma transacción
+                    c.execute(begin)
+                    c.execute("SELECT vistas FROM articulo WHERE id = ?", (articulo_id,)).fetchone()
+                    c.execute("UPDATE articulo SET vistas = vistas + 1 WHERE id = ?", (articulo_id,))
+                    c.execute(
+                        "INSERT INTO notificacion (articulo_id, mensaje) VALUES (?, ?)",
+                        (articulo_id, "benchmark"),
+                    )
+                    c.execute("COMMIT")
+                    with lock:
+                        contadores["escrituras"] += 1
+                except sqlite3.OperationalError:
+                    if c.in_transaction:
+                        c.execute("ROLLBACK")
+                    with lock:
+                        contadores["bloqueos"] += 1
+            c.close()
+
+        def lector():
+            c = self._conectar(ruta, perfil_produccion)
+            while not terminado.is_set():
+                try:
+                    c.execute("SELECT COUNT(*), SUM(vistas) FROM articulo").fetchone()
+                    c.execute("SELECT COUNT(*) FROM notificacion").fetchone()
+                    with lock:
+                        contadores["lecturas"] += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        contadores["bloqueos"] += 1
+            c.close()
+
+        hilos_escritores = [threading.Thread(target=escritor, args=(n,)) for n in range(escritores)]
+        hilos_lectores = [threading.Thread(target=lector) for _ in range(lectores)]
+
+        inicio = time.perf_counter()
+        for h in hilos_escritores + hilos_lectores:
+            h.start()
+        for h in hilos_escritores:
+            h.join()
+        duracion = time.perf_counter() - inicio
+        terminado.set()
+        for h in hilos_lectores:
+            h.join()
+
+        return {
+            "escrituras_s": contadores["escrituras"] / duracion,
+            "lecturas_s": contadores["lecturas"] / duracion,
+            "bloqueos": contadores["bloqueos"],
+        }
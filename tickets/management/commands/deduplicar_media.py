@@ -0,0 +1,89 @@
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tickets.storage import es_blob
+
+# (app, modelo, campo) de todos los adjuntos del sistema
+ADJUNTOS = [
+    ("tickets", "Ticket", "archivo"),
+    ("tickets", "ComentarioTicket", "archivo"),
+    ("knowledge_base", "ArchivoFAQ", "archivo"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Migra los adjuntos existentes en carpetas por fecha al storage "
+        "deduplicado por SHA-256 y borra los originales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=500)
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Solo informa cuántos archivos y bytes se migrarían.",
+        )
+
+    def handle(self, *args, **options):
+        total_archivos = 0
+        total_bytes = 0
+        faltantes = 0
+        viejos = set()
+        nuevos = set()
+
+        for app_label, nombre_modelo, campo in ADJUNTOS:
+            modelo = apps.get_model(app_label, nombre_modelo)
+            pendientes = (
+                modelo.objects
+                .exclude(**{f"{campo}__isnull": True})
+                .exclude(**{campo: ""})
+                .exclude(**{f"{campo}__startswith": "blobs/"})
+                .values_list("pk", campo)
+            )
+
+            lote = []
+            for pk, nombre in pendientes.iterator(chunk_size=options["lote"]):
+                if not default_storage.exists(nombre):
+                    faltantes += 1
+                    continue
+
+                total_archivos += 1
+                total_bytes += default_storage.size(nombre)
+                if options["dry_run"]:
+                    continue
+
+                with default_storage.open(nombre, "rb") as f:
+                    nuevo = default_storage.save(nombre, f)
+                lote.append(modelo(pk=pk, **{campo: nuevo}))
+                viejos.add(nombre)
+                nuevos.add(nuevo)
+
+                if len(lote) >= options["lote"]:
+                    self._guardar(modelo, campo, lote)
+                    lote = []
+            if lote:
+                self._guardar(modelo, campo, lote)
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"Se migrarían {total_archivos} archivos ({total_bytes / 1024 / 1024:.1f} MB). "
+                f"Faltantes en disco: {faltantes}."
+            )
+            return
+
+        for nombre in viejos:
+            if not es_blob(nombre):
+                default_storage.delete(nombre)
+
+        bytes_blobs = sum(default_storage.size(n) for n in nuevos)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total_archivos} archivos migrados. Antes: {total_bytes / 1024 / 1024:.1f} MB, "
+            f"después: {bytes_blobs / 1024 / 1024:.1f} MB en {len(nuevos)} blobs. "
+            f"Faltantes en disco: {faltantes}."
+        ))
+
+    def _guardar(self, modelo, campo, lote):
+        with transaction.atomic():
+            modelo.objects.bulk_update(lote, [campo])
@@ -0,0 +1,177 @@
+import os
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.miniaturas import TAMANOS
+from tickets.storage import CARPETA_BLOBS
+from tickets.subidas import CARPETA_SUBIDAS
+
+# (app, modelo, campo) que pueden apuntar a un archivo de MEDIA_ROOT
+REFERENCIAS = [
+    ("tickets", "Ticket", "archivo"),
+    ("tickets", "Ticket", "archivo_original"),
+    ("tickets", "ComentarioTicket", "archivo"),
+    ("tickets", "ComentarioTicket", "archivo_original"),
+    ("tickets", "SubidaFragmentada", "archivo"),
+    ("knowledge_base", "ArchivoFAQ", "archivo"),
+]
+SUFIJOS_DERIVADO = tuple(f".{tamano}.webp" for tamano in TAMANOS)
+TEMPORALES_DERIVADO = tuple(f"{sufijo}.tmp" for sufijo in SUFIJOS_DERIVADO)
+
+
+def recorrer(raiz, relativa=""):
+    """
+    Recorre `raiz/relativa` con os.scandir sin armar la lista completa:
+    entrega (ruta relativa, stat) de cada archivo. No sigue symlinks.
+    """
+    pendientes = [relativa]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with os.scandir(os.path.join(raiz, actual)) as entradas:
+                for entrada in entradas:
+                    nombre = f"{actual}/{entrada.name}" if actual else entrada.name
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendientes.append(nombre)
+                    elif entrada.is_file(follow_symlinks=False):
+                        yield nombre, entrada.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+
+
+def dueno(nombre):
+    """
+    Qué debe estar referenciado para que `nombre` se conserve:
+    ("archivo", nombre base) o ("subida", uuid). None = temporal sin dueño.
+    """
+    if nombre.startswith(f"{CARPETA_SUBIDAS}/"):
+        partes = nombre.split("/")
+        return ("subida", partes[1]) if len(partes) > 2 else None
+    if nombre.startswith(f"{CARPETA_BLOBS}/tmp/") or nombre.endswith(TEMPORALES_DERIVADO):
+        return None
+    for sufijo in SUFIJOS_DERIVADO:
+        if nombre.endswith(sufijo):
+            return ("archivo", nombre[: -len(sufijo)])
+    return ("archivo", nombre)
+
+
+class Command(BaseCommand):
+    help = (
+        "Busca archivos en MEDIA_ROOT que ningún ticket, comentario, FAQ o "
+        "subida referencia (incluidos blobs y derivados) y los informa o borra."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "directorios", nargs="*",
+            help="Subdirectorios de MEDIA_ROOT a revisar (por defecto, todo).",
+        )
+        parser.add_argument(
+            "--gracia", type=float, default=24,
+            help="Horas: no se toca lo modificado más recientemente (subidas en curso).",
+        )
+        parser.add_argument("--lote", type=int, default=500)
+        parser.add_argument(
+            "--borrar", action="store_true",
+            help="Borra los huérfanos. Sin esta opción solo se informan.",
+        )
+
+    def handle(self, *args, **options):
+        self.raiz = os.path.realpath(settings.MEDIA_ROOT)
+        self.borrar = options["borrar"]
+        self.verbosity = options["verbosity"]
+        self.huerfanos = 0
+        self.bytes_huerfanos = 0
+        revisados = 0
+        self.limite = limite = time.time() - options["gracia"] * 3600
+
+        directorios = [d.strip("/") for d in options["directorios"]] or [""]
+        for directorio in directorios:
+            ruta = os.path.realpath(os.path.join(self.raiz, directorio))
+            if ruta != self.raiz and not ruta.startswith(self.raiz + os.sep):
+                raise CommandError(f"{directorio} está fuera de MEDIA_ROOT.")
+
+            lote = []
+            for nombre, stat in recorrer(self.raiz, directorio):
+                revisados += 1
+                if stat.st_mtime > limite:
+                    continue
+                lote.append((nombre, stat.st_size))
+                if len(lote) >= options["lote"]:
+                    self._procesar(lote)
+                    lote = []
+            if lote:
+                self._procesar(lote)
+
+            if self.borrar:
+                self._borrar_directorios_vacios(ruta)
+
+        accion = "eliminados" if self.borrar else "encontrados (usa --borrar para eliminarlos)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{revisados} archivos revisados. {self.huerfanos} huérfanos {accion}: "
+            f"{self.bytes_huerfanos / 1024 / 1024:.1f} MB."
+        ))
+
+    def _procesar(self, lote):
+        duenos = {nombre: dueno(nombre) for nombre, _ in lote}
+        archivos = {d[1] for d in duenos.values() if d and d[0] == "archivo"}
+        subidas = {d[1] for d in duenos.values() if d and d[0] == "subida"}
+
+        vivos = set()
+        for app_label, nombre_modelo, campo in REFERENCIAS:
+            modelo = apps.get_model(app_label, nombre_modelo)
+            vivos.update(
+                ("archivo", n) for n in
+                modelo._base_manager.filter(**{f"{campo}__in": archivos}).values_list(campo, flat=True)
+            )
+        if subidas:
+            SubidaFragmentada = apps.get_model("tickets", "SubidaFragmentada")
+            validas = [s for s in subidas if _es_uuid(s)]
+            vivos.update(
+                ("subida", str(pk)) for pk in
+                SubidaFragmentada.objects.filter(pk__in=validas).values_list("pk", flat=True)
+            )
+
+        blobs_borrados = []
+        for nombre, tamano in lote:
+            if duenos[nombre] in vivos:
+                continue
+            self.huerfanos += 1
+            self.bytes_huerfanos += tamano
+            if self.verbosity >= 2:
+                self.stdout.write(f"  {nombre} ({tamano} bytes)")
+            if self.borrar:
+                ruta = os.path.join(self.raiz, nombre)
+                try:
+                    # Un blob reutilizado por una subida nueva renueva su mtime
+                    if os.stat(ruta).st_mtime > self.limite:
+                        continue
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                if nombre.startswith(f"{CARPETA_BLOBS}/") and duenos[nombre] == ("archivo", nombre):
+                    blobs_borrados.append(nombre)
+
+        if blobs_borrados:
+            # Referencias que quedaron colgando por borrados en cascada
+            apps.get_model("tickets", "BlobAdjunto").objects.filter(nombre__in=blobs_borrados).delete()
+
+    def _borrar_directorios_vacios(self, ruta):
+        for actual, _, _ in os.walk(ruta, topdown=False):
+            if actual != self.raiz:
+                try:
+                    os.rmdir(actual)  # Falla (y se ignora) si no está vacío
+                except OSError:
+                    pass
+
+
+def _es_uuid(valor):
+    try:
+        uuid.UUID(valor)
+    except ValueError:
+        return False
+    return True
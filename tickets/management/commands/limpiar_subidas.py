@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tickets.subidas import limpiar_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las subidas por chunks abandonadas: sus chunks en "
+        "MEDIA_ROOT/subidas/ y los blobs ensamblados que nadie adjuntó."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horas", type=int, default=getattr(settings, "SUBIDAS_EXPIRACION_HORAS", 24),
+            help="Antigüedad mínima de una subida para considerarla abandonada.",
+        )
+
+    def handle(self, *args, **options):
+        total = limpiar_vencidas(options["horas"])
+        self.stdout.write(self.style.SUCCESS(f"{total} subidas vencidas eliminadas."))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from tickets.sla import MonitorSLA
+
+
+class Command(BaseCommand):
+    help = (
+        "Monitor de SLA: notifica una sola vez cuando un ticket abierto entra "
+        "en advertencia o vence. Corre hasta que se detiene (Ctrl+C)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--intervalo", type=float, default=30,
+            help="Segundos máximos entre lecturas de tickets modificados.",
+        )
+        parser.add_argument(
+            "--recarga", type=float, default=6,
+            help="Horas entre cargas completas de tickets abiertos.",
+        )
+        parser.add_argument(
+            "--una-vez", action="store_true",
+            help="Avisa los cruces pendientes y termina (para cron).",
+        )
+
+    def handle(self, *args, **options):
+        monitor = MonitorSLA()
+        if options["una_vez"]:
+            monitor.cargar()
+            avisados = monitor.procesar()
+            self.stdout.write(self.style.SUCCESS(f"{avisados} alertas de SLA emitidas."))
+            return
+
+        self.stdout.write("Monitor de SLA iniciado.")
+        try:
+            monitor.ejecutar(intervalo=options["intervalo"], recarga=options["recarga"] * 3600)
+        except KeyboardInterrupt:
+            self.stdout.write("Monitor de SLA detenido.")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from tickets.eliminacion import purgar_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Purga por lotes los tickets y usuarios marcados como eliminados que "
+        "hayan quedado pendientes (por ejemplo, tras un reinicio)."
+    )
+
+    def handle(self, *args, **options):
+        tickets, usuarios = purgar_pendientes()
+        self.stdout.write(self.style.SUCCESS(
+            f"{usuarios} usuarios y {tickets} tickets marcados purgados."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from tickets.sla import LOTE, aplicar_pendientes, recalcular_plazos
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica las políticas de SLA pendientes y recalcula el vencimiento y "
+        "la advertencia de SLA de los tickets abiertos (tras cambiar la "
+        "jornada o los feriados)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=LOTE, help="Tickets por transacción.")
+
+    def handle(self, *args, **options):
+        for politica, actualizados in aplicar_pendientes(lote=options["lote"]):
+            self.stdout.write(f"Política {politica}: {actualizados} tickets abiertos actualizados.")
+        revisados, actualizados = recalcular_plazos(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{revisados} tickets abiertos revisados, {actualizados} con plazo nuevo."
+        ))
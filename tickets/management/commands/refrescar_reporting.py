@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from config.db_router import REPORTING, reporting_configurado
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresca la copia SQLite de solo lectura usada por los reportes "
+        "(alias `reporting`) con el backup API online."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--intervalo", type=int, default=0,
+            help="Segundos entre refrescos. 0 = refrescar una vez y salir.",
+        )
+        parser.add_argument(
+            "--paginas", type=int, default=1024,
+            help="Páginas copiadas por paso (libera el lock entre pasos).",
+        )
+
+    def handle(self, *args, **options):
+        if not reporting_configurado():
+            raise CommandError("No hay alias `reporting` configurado (COYAHUE_REPORTING_DB).")
+
+        destino = connections[REPORTING]
+        if destino.vendor != "sqlite":
+            self.stdout.write("`reporting` es una réplica gestionada por la base de datos; nada que refrescar.")
+            return
+
+        origen = str(connections["default"].settings_dict["NAME"])
+        destino = str(destino.settings_dict["NAME"])
+
+        while True:
+            inicio = time.perf_counter()
+            self.refrescar(origen, destino, options["paginas"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Copia de reportes actualizada en {time.perf_counter() - inicio:.2f}s → {destino}"
+            ))
+            if not options["intervalo"]:
+                break
+            time.sleep(options["intervalo"])
+
+    def refrescar(self, origen, destino, paginas):
+        """
+        Copia a un archivo temporal y lo reemplaza de forma atómica, así las
+        lecturas en curso terminan sobre la copia anterior.
+        """
+        temporal = f"{destino}.tmp"
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+        src = sqlite3.connect(origen)
+        dst = sqlite3.connect(temporal)
+        try:
+            src.backup(dst, pages=paginas)
+            # La copia es de solo lectura: sin WAL ni archivos -wal/-shm
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+            src.close()
+
+        os.replace(temporal, destino)
@@ -0,0 +1,312 @@
+"""
+Operaciones masivas sobre tickets: asignar técnico, cambiar estado,
+prioridad o categoría, o cerrar varios tickets en una sola transacción.
+
+`aplicar()` lee los tickets en una query, valida cada uno y aplica el cambio
+a todos los válidos con un UPDATE por conjunto. Las asignaciones, el
+historial, las notificaciones y los eventos van con un `bulk_create` cada
+uno, así el costo no crece query a query con la cantidad de tickets. Un
+ticket que no se puede cambiar (no existe, transición no permitida, versión
+distinta de la enviada) se informa en `errores` y no frena al resto. Lo usan
+`/api/tickets/bulk/` y la acción masiva del listado del panel.
+"""
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import Tecnico
+from notifications.models import Notificacion
+from . import eventos, sincronizacion
+from .asignacion import ajustar_carga
+from .models import (
+    AsignacionTicket, Categoria, EstadoTicket, EventoTicket, HistorialTicket, Prioridad, Ticket, plazos_sla,
+)
+from .transiciones import Transicion, _permitida
+
+ACCIONES = {
+    "asignar": "Asignar técnico",
+    "estado": "Cambiar estado",
+    "prioridad": "Cambiar prioridad",
+    "categoria": "Cambiar categoría",
+    "cerrar": "Cerrar",
+}
+MAXIMO = 500
+
+CAMPOS = (
+    "pk", "titulo", "solicitante_id", "estado_id", "prioridad_id", "categoria_id", "version",
+    "fecha_creacion", "fecha_cierre", "sla_horas_objetivo", "sla_deadline", "sla_warning_at", "sla_version",
+)
+
+
+class ErrorMasivo(Exception):
+    """La operación completa no es válida (acción, valor o lista de tickets)."""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def _ids(valores):
+    if not isinstance(valores, (list, tuple)) or not valores:
+        raise ErrorMasivo("Indica la lista de tickets (ids).")
+    try:
+        ids = list(dict.fromkeys(int(v) for v in valores))
+    except (TypeError, ValueError):
+        raise ErrorMasivo("Los ids de tickets deben ser números.")
+    if len(ids) > MAXIMO:
+        raise ErrorMasivo(f"Como máximo {MAXIMO} tickets por operación.")
+    return ids
+
+
+def _destino(accion, valor):
+    """El objeto al que apunta la acción (técnico, estado, prioridad o categoría)."""
+    if accion not in ACCIONES:
+        raise ErrorMasivo(f"Acción desconocida: {accion!r}. Opciones: {', '.join(ACCIONES)}.")
+    if accion == "cerrar" and valor in (None, ""):
+        destino = (
+            EstadoTicket.objects.filter(es_final=True, nombre_estado__iexact="Cerrado").first()
+            or EstadoTicket.objects.filter(es_final=True).first()
+        )
+        if destino is None:
+            raise ErrorMasivo("No hay un estado final configurado.")
+        return destino
+
+    modelo = {
+        "asignar": Tecnico, "estado": EstadoTicket, "cerrar": EstadoTicket,
+        "prioridad": Prioridad, "categoria": Categoria,
+    }[accion]
+    consulta = modelo.objects.all()
+    if accion == "asignar":
+        consulta = Tecnico.objects.select_related("usuario").filter(activo=True)
+    elif accion == "cerrar":
+        consulta = consulta.filter(es_final=True)
+    try:
+        destino = consulta.filter(pk=int(valor)).first()
+    except (TypeError, ValueError):
+        destino = None
+    if destino is None:
+        raise ErrorMasivo(f"{ACCIONES[accion]}: valor no válido ({valor!r}).")
+    return destino
+
+
+def aplicar(ids, accion, valor=None, usuario=None, comentario="", versiones=None):
+    """
+    Aplica `accion` con `valor` a los tickets `ids`. `versiones` opcional:
+    {id: versión que el cliente tenía}; si no coincide, ese ticket da 409.
+    Devuelve {"actualizados": [...], "sin_cambios": [...], "errores":
+    [{"id", "status", "detalle"}]}. Lanza ErrorMasivo si la operación
+    completa no es válida.
+    """
+    ids = _ids(ids)
+    destino = _destino(accion, valor)
+    if versiones is not None and not isinstance(versiones, dict):
+        raise ErrorMasivo("Las versiones deben ser un objeto {id: versión}.")
+    versiones = {str(k): v for k, v in (versiones or {}).items()}
+    resultado = {"actualizados": [], "sin_cambios": [], "errores": []}
+
+    def error(pk, status, detalle):
+        resultado["errores"].append({"id": pk, "status": status, "detalle": detalle})
+
+    # Con transaction_mode IMMEDIATE la lectura ya toma el lock de escritura:
+    # nadie cambia estos tickets entre la validación y el UPDATE.
+    with transaction.atomic(), sincronizacion.en_lote() as solicitantes:
+        filas = {fila["pk"]: fila for fila in Ticket.objects.filter(pk__in=ids).values(*CAMPOS)}
+        solicitantes.update((pk, fila["solicitante_id"]) for pk, fila in filas.items())
+        asignados = {}
+        for ticket_id, tecnico_id, usuario_id in (
+            AsignacionTicket.objects.filter(ticket_id__in=filas, activo=True)
+            .values_list("ticket_id", "tecnico_asignado_id", "tecnico_asignado__usuario_id")
+        ):
+            asignados.setdefault(ticket_id, []).append((tecnico_id, usuario_id))
+        estados = {e.pk: e for e in EstadoTicket.objects.filter(pk__in={f["estado_id"] for f in filas.values()})}
+        permitidas = {}
+        if accion in ("estado", "cerrar"):
+            for origen, fin in Transicion.objects.filter(from_estadoticket_id__in=estados).values_list(
+                "from_estadoticket_id", "to_estadoticket_id",
+            ):
+                permitidas.setdefault(origen, set()).add(fin)
+
+        validos = []
+        for pk in ids:
+            fila = filas.get(pk)
+            if fila is None:
+                error(pk, 404, "El ticket no existe.")
+                continue
+            esperada = versiones.get(str(pk))
+            if esperada is not None and str(esperada) != str(fila["version"]):
+                error(pk, 409, f"Otro usuario modificó el ticket #{pk}. Recarga e inténtalo de nuevo.")
+                continue
+            if accion in ("estado", "cerrar"):
+                if fila["estado_id"] == destino.pk:
+                    resultado["sin_cambios"].append(pk)
+                    continue
+                alcanzables = permitidas.get(fila["estado_id"])
+                if alcanzables and destino.pk not in alcanzables:
+                    anterior = estados[fila["estado_id"]].nombre_estado
+                    error(pk, 400, f"No se puede pasar de «{anterior}» a «{destino.nombre_estado}».")
+                    continue
+            elif accion == "asignar":
+                if [t for t, _ in asignados.get(pk, [])] == [destino.pk]:
+                    resultado["sin_cambios"].append(pk)
+                    continue
+            elif fila[f"{accion}_id"] == destino.pk:
+                resultado["sin_cambios"].append(pk)
+                continue
+            validos.append(fila)
+
+        if validos:
+            contexto = {
+                "usuario": usuario, "comentario": comentario, "asignados": asignados,
+                "estados": estados, "ahora": timezone.now(),
+            }
+            {
+                "asignar": _asignar, "estado": _cambiar_estado, "cerrar": _cambiar_estado,
+                "prioridad": _cambiar_prioridad, "categoria": _cambiar_categoria,
+            }[accion](validos, destino, **contexto)
+            resultado["actualizados"] = [fila["pk"] for fila in validos]
+    return resultado
+
+
+def _actualizar(validos, *condiciones, **valores):
+    """UPDATE por conjunto de los tickets validados, subiendo su versión."""
+    pks = [fila["pk"] for fila in validos]
+    actualizados = Ticket.objects.filter(*condiciones, pk__in=pks).update(**valores, version=F("version") + 1)
+    if actualizados != len(pks):
+        # Algún ticket cambió entre la lectura y el UPDATE: se revierte todo
+        raise ErrorMasivo("Los tickets cambiaron durante la operación. Inténtalo de nuevo.", status=409)
+
+
+def _historial(validos, usuario, comentario, estado_nuevo=None):
+    HistorialTicket.objects.bulk_create([
+        HistorialTicket(
+            ticket_id=fila["pk"],
+            usuario=usuario,
+            estado_anterior_id=fila["estado_id"],
+            estado_nuevo_id=estado_nuevo.pk if estado_nuevo else fila["estado_id"],
+            comentario=comentario,
+        )
+        for fila in validos
+    ])
+
+
+def _notificar(avisos):
+    """`avisos`: [(ticket_id, usuario_destino_id, tipo, título, mensaje)]."""
+    Notificacion.objects.bulk_create([
+        Notificacion(
+            ticket_id=ticket_id,
+            usuario_destino_id=destino,
+            tipo_notificacion=tipo,
+            titulo=titulo,
+            mensaje=mensaje,
+            canal_notificacion="portal",
+        )
+        for ticket_id, destino, tipo, titulo, mensaje in avisos
+    ])
+
+
+def _usuario_id(usuario):
+    return usuario.pk if usuario else None
+
+
+def _cambiar_estado(validos, estado, usuario, comentario, asignados, estados, ahora):
+    _actualizar(
+        validos, _permitida(estado.pk),
+        estado_id=estado.pk,
+        fecha_cierre=Coalesce(F("fecha_cierre"), Value(ahora)) if estado.es_final else None,
+        fecha_actualizacion=ahora,
+    )
+
+    _historial(validos, usuario, comentario or "Cambio de estado masivo", estado)
+    avisos = []
+    for fila in validos:
+        pk = fila["pk"]
+        cambios = {"estado": [fila["estado_id"], estado.pk]}
+        fecha_cierre = (fila["fecha_cierre"] or ahora) if estado.es_final else None
+        if fecha_cierre != fila["fecha_cierre"]:
+            cambios["fecha_cierre"] = [fila["fecha_cierre"], fecha_cierre]
+        eventos.registrar(pk, cambios, usuario_id=_usuario_id(usuario))
+
+        tecnicos = asignados.get(pk, [])
+        if estados[fila["estado_id"]].es_final != estado.es_final:
+            # Cerrar libera al técnico en el índice de carga; reabrir lo vuelve a sumar
+            ajustar_carga([t for t, _ in tecnicos], -1 if estado.es_final else +1)
+        destinos = {fila["solicitante_id"], *(u for _, u in tecnicos)} - {_usuario_id(usuario)}
+        avisos.extend(
+            (pk, destino, "cambio_estado", f"Ticket #{pk} actualizado", f"El estado actual es: {estado.nombre_estado}")
+            for destino in destinos
+        )
+    _notificar(avisos)
+
+
+def _cambiar_prioridad(validos, prioridad, usuario, comentario, ahora, **kwargs):
+    # El plazo depende de la creación de cada ticket: todo va en un solo
+    # bulk_update, con la versión leída bajo el lock de escritura
+    plazos = {fila["pk"]: plazos_sla(fila["fecha_creacion"], prioridad.sla_horas) for fila in validos}
+    actualizados = Ticket.objects.bulk_update(
+        [
+            Ticket(
+                pk=fila["pk"], prioridad_id=prioridad.pk, sla_horas_objetivo=prioridad.sla_horas,
+                sla_version=prioridad.version_sla, fecha_actualizacion=ahora,
+                sla_deadline=plazos[fila["pk"]][0], sla_warning_at=plazos[fila["pk"]][1],
+                version=fila["version"] + 1,
+            )
+            for fila in validos
+        ],
+        [
+            "prioridad", "sla_horas_objetivo", "sla_version", "fecha_actualizacion",
+            "sla_deadline", "sla_warning_at", "version",
+        ],
+    )
+    if actualizados != len(validos):
+        raise ErrorMasivo("Los tickets cambiaron durante la operación. Inténtalo de nuevo.", status=409)
+
+    _historial(validos, usuario, comentario or f"Prioridad cambiada a {prioridad} (masivo)")
+    nombres = ["prioridad", "sla_horas_objetivo", "sla_deadline", "sla_warning_at", "sla_version"]
+    for fila in validos:
+        antes = [fila[f"{n}_id" if n == "prioridad" else n] for n in nombres]
+        despues = [prioridad.pk, prioridad.sla_horas, *plazos[fila["pk"]], prioridad.version_sla]
+        eventos.registrar(
+            fila["pk"], {n: [a, d] for n, a, d in zip(nombres, antes, despues) if a != d},
+            usuario_id=_usuario_id(usuario),
+        )
+    _notificar(
+        (fila["pk"], fila["solicitante_id"], "cambio_prioridad", f"Ticket #{fila['pk']} actualizado",
+         f"La prioridad actual es: {prioridad}")
+        for fila in validos if fila["solicitante_id"] != _usuario_id(usuario)
+    )
+
+
+def _cambiar_categoria(validos, categoria, usuario, comentario, ahora, **kwargs):
+    _actualizar(validos, categoria_id=categoria.pk, fecha_actualizacion=ahora)
+    _historial(validos, usuario, comentario or f"Categoría cambiada a {categoria} (masivo)")
+    for fila in validos:
+        eventos.registrar(
+            fila["pk"], {"categoria": [fila["categoria_id"], categoria.pk]}, usuario_id=_usuario_id(usuario),
+        )
+
+
+def _asignar(validos, tecnico, usuario, comentario, asignados, estados, **kwargs):
+    pks = [fila["pk"] for fila in validos]
+    AsignacionTicket.objects.filter(ticket_id__in=pks, activo=True).update(activo=False)
+    # bulk_create no dispara la señal que registra el evento: se registra aquí
+    AsignacionTicket.objects.bulk_create([AsignacionTicket(ticket_id=pk, tecnico_asignado=tecnico) for pk in pks])
+
+    abiertos = [fila for fila in validos if not estados[fila["estado_id"]].es_final]
+    ajustar_carga([t for fila in abiertos for t, _ in asignados.get(fila["pk"], [])], -1)
+    ajustar_carga([tecnico.pk] * len(abiertos), +1)
+
+    _historial(validos, usuario, comentario or f"Asignado al técnico {tecnico.usuario} (masivo)")
+    for fila in validos:
+        anteriores = asignados.get(fila["pk"], [])
+        eventos.registrar(
+            fila["pk"],
+            {"tecnico_asignado": [anteriores[-1][0] if anteriores else None, tecnico.pk]},
+            tipo=EventoTicket.TIPO_ASIGNACION,
+            usuario_id=_usuario_id(usuario),
+        )
+    _notificar(
+        (fila["pk"], tecnico.usuario_id, "asignacion", f"Ticket #{fila['pk']} asignado",
+         f"Se te asignó el ticket: {fila['titulo']}")
+        for fila in validos
+    )
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_calificacionticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobAdjunto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('tamano', models.BigIntegerField(help_text='Tamaño en bytes')),
+                ('referencias', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Blob de adjunto',
+                'verbose_name_plural': 'Blobs de adjuntos',
+            },
+        ),
+    ]
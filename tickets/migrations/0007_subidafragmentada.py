@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-19 18:11
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_blobadjunto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaFragmentada',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('tamano_total', models.BigIntegerField(help_text='Tamaño final en bytes')),
+                ('tamano_chunk', models.PositiveIntegerField()),
+                ('sha256', models.CharField(blank=True, help_text='SHA-256 esperado del archivo completo (opcional)', max_length=64)),
+                ('archivo', models.CharField(blank=True, help_text='Nombre en el storage una vez ensamblada', max_length=255)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_fragmentadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Subida fragmentada',
+                'verbose_name_plural': 'Subidas fragmentadas',
+            },
+        ),
+    ]
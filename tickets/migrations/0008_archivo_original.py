@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_subidafragmentada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comentarioticket',
+            name='archivo_original',
+            field=models.FileField(blank=True, help_text='Imagen original sin comprimir (solo si se pidió conservarla)', null=True, upload_to='comentarios/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='comentarioticket',
+            name='conservar_original',
+            field=models.BooleanField(default=False, help_text='Conservar la imagen original además de la versión comprimida'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='archivo_original',
+            field=models.FileField(blank=True, help_text='Imagen original sin comprimir (solo si se pidió conservarla)', null=True, upload_to='tickets_adjuntos/'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='conservar_original',
+            field=models.BooleanField(default=False, help_text='Conservar la imagen original además de la versión comprimida'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_archivo_original'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='eliminado_en',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Marcado para eliminación; la purga corre en segundo plano', null=True),
+        ),
+    ]
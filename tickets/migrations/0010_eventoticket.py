@@ -0,0 +1,75 @@
+# Generated by Django 6.0 on 2026-10-19 18:20
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+LOTE = 1000
+EXCLUIDOS = {"id", "fecha_creacion", "fecha_actualizacion"}
+
+
+def importar_estado_actual(apps, schema_editor):
+    """
+    Un evento `snapshot` por ticket existente, fechado en su creación, con
+    los valores actuales: el historial anterior a este log no se conoce.
+    """
+    Ticket = apps.get_model("tickets", "Ticket")
+    AsignacionTicket = apps.get_model("tickets", "AsignacionTicket")
+    EventoTicket = apps.get_model("tickets", "EventoTicket")
+
+    campos = [f for f in Ticket._meta.concrete_fields if f.name not in EXCLUIDOS]
+    attnames = [f.attname for f in campos]
+    ultimo = 0
+    while True:
+        filas = list(
+            Ticket.objects.filter(pk__gt=ultimo).order_by("pk")
+            .values("pk", "fecha_creacion", *attnames)[:LOTE]
+        )
+        if not filas:
+            return
+        ultimo = filas[-1]["pk"]
+        tecnicos = dict(
+            AsignacionTicket.objects
+            .filter(ticket_id__in=[f["pk"] for f in filas], activo=True)
+            .values_list("ticket_id", "tecnico_asignado_id")
+        )
+        eventos = []
+        for fila in filas:
+            cambios = {f.name: [None, fila[f.attname]] for f in campos if fila[f.attname] not in (None, "")}
+            if fila["pk"] in tecnicos:
+                cambios["tecnico_asignado"] = [None, tecnicos[fila["pk"]]]
+            eventos.append(EventoTicket(
+                ticket_id=fila["pk"], fecha=fila["fecha_creacion"], tipo="snapshot", cambios=cambios,
+            ))
+        EventoTicket.objects.bulk_create(eventos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_eliminado_en'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tipo', models.CharField(choices=[('creacion', 'Creación'), ('cambio', 'Cambio'), ('asignacion', 'Asignación'), ('snapshot', 'Estado inicial importado')], default='cambio', max_length=20)),
+                ('cambios', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='tickets.ticket')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Evento de ticket',
+                'verbose_name_plural': 'Eventos de tickets',
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['ticket', 'fecha'], name='tickets_eve_ticket__b9a835_idx'), models.Index(fields=['fecha'], name='tickets_eve_fecha_4f2637_idx')],
+            },
+        ),
+        migrations.RunPython(importar_estado_actual, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0010_eventoticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadoticket',
+            name='transiciones',
+            field=models.ManyToManyField(blank=True, help_text='Estados a los que se puede pasar desde este. Vacío: cualquiera.', related_name='+', to='tickets.estadoticket'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0011_estadoticket_transiciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='version',
+            field=models.PositiveIntegerField(default=1, help_text='Sube con cada escritura; ver tickets/concurrencia.py'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 18:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0012_ticket_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertaSLA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ADVERTENCIA', 'Advertencia'), ('VENCIDO', 'Vencido')], max_length=20)),
+                ('vencimiento', models.DateTimeField(help_text='Vencimiento de SLA vigente al cruzar el umbral')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alertas_sla', to='tickets.ticket')),
+            ],
+            options={
+                'verbose_name': 'Alerta de SLA',
+                'verbose_name_plural': 'Alertas de SLA',
+                'constraints': [models.UniqueConstraint(fields=('ticket', 'tipo', 'vencimiento'), name='alerta_sla_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0 on 2026-10-19 18:35
+
+from datetime import timedelta
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+LOTE = 1000
+FRACCION_ADVERTENCIA = 0.25
+
+
+def calcular_plazos(apps, schema_editor):
+    """
+    Completa `sla_horas_objetivo` con el SLA de la prioridad donde falte y
+    guarda el vencimiento y el inicio de la advertencia de cada ticket.
+    """
+    Ticket = apps.get_model("tickets", "Ticket")
+    ultimo = 0
+    while True:
+        lote = list(
+            Ticket.objects.filter(pk__gt=ultimo).order_by("pk")
+            .select_related("prioridad")
+            .only("pk", "fecha_creacion", "sla_horas_objetivo", "prioridad__sla_horas")[:LOTE]
+        )
+        if not lote:
+            return
+        ultimo = lote[-1].pk
+        for ticket in lote:
+            if ticket.sla_horas_objetivo is None and ticket.prioridad_id:
+                ticket.sla_horas_objetivo = ticket.prioridad.sla_horas
+            if ticket.sla_horas_objetivo and ticket.fecha_creacion:
+                plazo = timedelta(hours=ticket.sla_horas_objetivo)
+                ticket.sla_deadline = ticket.fecha_creacion + plazo
+                ticket.sla_warning_at = ticket.sla_deadline - plazo * FRACCION_ADVERTENCIA
+        Ticket.objects.bulk_update(lote, ["sla_horas_objetivo", "sla_deadline", "sla_warning_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0013_alertasla'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='sla_deadline',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='sla_warning_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='fecha_creacion',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('fecha_cierre__isnull', True)), fields=['sla_deadline'], name='ticket_sla_abiertos'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('fecha_cierre__isnull', True)), fields=['sla_warning_at'], name='ticket_sla_adv_abiertos'),
+        ),
+        migrations.RunPython(calcular_plazos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0014_sla_deadline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('nombre', models.CharField(max_length=100)),
+            ],
+            options={
+                'ordering': ['fecha'],
+            },
+        ),
+    ]
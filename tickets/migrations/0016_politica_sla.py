@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-19 18:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def politicas_iniciales(apps, schema_editor):
+    """
+    Versión 1 de la política de cada prioridad. Los tickets cuyo objetivo
+    coincide con el SLA actual de su prioridad quedan con esa versión; el
+    resto, sin versión conocida.
+    """
+    Prioridad = apps.get_model("tickets", "Prioridad")
+    PoliticaSLA = apps.get_model("tickets", "PoliticaSLA")
+    Ticket = apps.get_model("tickets", "Ticket")
+    ahora = django.utils.timezone.now()
+    for prioridad in Prioridad.objects.all():
+        actualizados = Ticket.objects.filter(
+            prioridad=prioridad, sla_horas_objetivo=prioridad.sla_horas,
+        ).update(sla_version=1)
+        PoliticaSLA.objects.create(
+            prioridad=prioridad, version=1, sla_horas=prioridad.sla_horas,
+            fecha=ahora, aplicada_en=ahora, tickets_actualizados=actualizados,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0015_feriado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prioridad',
+            name='version_sla',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Sube cada vez que cambia sla_horas (ver PoliticaSLA).'),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='sla_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Versión de la política de SLA de la prioridad aplicada (PoliticaSLA).', null=True),
+        ),
+        migrations.CreateModel(
+            name='PoliticaSLA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('sla_horas', models.PositiveIntegerField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('aplicada_en', models.DateTimeField(blank=True, help_text='Fin del recálculo de los tickets abiertos; vacío mientras está pendiente.', null=True)),
+                ('tickets_actualizados', models.PositiveIntegerField(blank=True, null=True)),
+                ('prioridad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='politicas_sla', to='tickets.prioridad')),
+            ],
+            options={
+                'verbose_name': 'Política de SLA',
+                'verbose_name_plural': 'Políticas de SLA',
+                'ordering': ['prioridad', '-version'],
+                'constraints': [models.UniqueConstraint(fields=('prioridad', 'version'), name='politica_sla_unica')],
+            },
+        ),
+        migrations.RunPython(politicas_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-19 18:55
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+LOTE = 1000
+
+
+def sembrar_secuencia(apps, schema_editor):
+    """
+    Una fila por ticket, por ticket con asignaciones y por comentario
+    existentes: `since=0` entrega todo lo que había antes del log.
+    """
+    Ticket = apps.get_model("tickets", "Ticket")
+    AsignacionTicket = apps.get_model("tickets", "AsignacionTicket")
+    ComentarioTicket = apps.get_model("tickets", "ComentarioTicket")
+    CambioSincronizacion = apps.get_model("tickets", "CambioSincronizacion")
+
+    # (recurso, queryset, campo con el objeto, campo con el ticket)
+    fuentes = [
+        ("ticket", Ticket.objects.filter(eliminado_en__isnull=True), "pk", "pk"),
+        ("asignacion", AsignacionTicket.objects.filter(ticket__eliminado_en__isnull=True), "ticket_id", "ticket_id"),
+        ("comentario", ComentarioTicket.objects.filter(ticket__eliminado_en__isnull=True), "pk", "ticket_id"),
+    ]
+    for recurso, queryset, objeto, ticket in fuentes:
+        ultimo = 0
+        while True:
+            lote = list(
+                queryset.filter(**{f"{objeto}__gt": ultimo}).order_by(objeto)
+                .values_list(objeto, ticket).distinct()[:LOTE]
+            )
+            if not lote:
+                break
+            ultimo = lote[-1][0]
+            CambioSincronizacion.objects.bulk_create(
+                CambioSincronizacion(recurso=recurso, objeto_id=objeto_id, ticket_id=ticket_id)
+                for objeto_id, ticket_id in lote
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0016_politica_sla'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioSincronizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurso', models.CharField(choices=[('ticket', 'Ticket'), ('comentario', 'Comentario'), ('asignacion', 'Asignaciones del ticket')], max_length=12)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('ticket_id', models.PositiveBigIntegerField(db_index=True)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cambio para sincronización',
+                'verbose_name_plural': 'Cambios para sincronización',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['fecha_actualizacion'], name='ticket_actualizacion'),
+        ),
+        migrations.RunPython(sembrar_secuencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 19:16
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def asignar_solicitantes(apps, schema_editor):
+    """Los cambios ya registrados toman el solicitante actual de su ticket."""
+    Ticket = apps.get_model("tickets", "Ticket")
+    CambioSincronizacion = apps.get_model("tickets", "CambioSincronizacion")
+    CambioSincronizacion.objects.update(
+        solicitante_id=Subquery(
+            Ticket._base_manager.filter(pk=OuterRef("ticket_id")).values("solicitante_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0017_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cambiosincronizacion',
+            name='solicitante_id',
+            field=models.PositiveBigIntegerField(db_index=True, null=True),
+        ),
+        migrations.RunPython(asignar_solicitantes, migrations.RunPython.noop),
+    ]
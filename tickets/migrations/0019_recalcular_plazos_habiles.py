@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-19 19:40
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+from tickets.calendario import CalendarioHabil
+
+LOTE = 1000
+FRACCION_ADVERTENCIA = 0.25
+
+
+def recalcular_plazos(apps, schema_editor):
+    """
+    Los plazos de los tickets abiertos se guardaron en horas corridas (0014).
+    Con `SLA_HORAS_HABILES` se rehacen con el calendario hábil, y cada
+    ticket que cambia queda en la secuencia de sincronización.
+    """
+    if not getattr(settings, "SLA_HORAS_HABILES", False):
+        return
+    Ticket = apps.get_model("tickets", "Ticket")
+    Feriado = apps.get_model("tickets", "Feriado")
+    CambioSincronizacion = apps.get_model("tickets", "CambioSincronizacion")
+    calendario = CalendarioHabil(settings.SLA_JORNADA, Feriado.objects.values_list("fecha", flat=True))
+    campos = ["sla_deadline", "sla_warning_at", "fecha_actualizacion"]
+    ahora = timezone.now()
+    ultimo = 0
+    while True:
+        lote = list(
+            Ticket._base_manager.filter(pk__gt=ultimo, fecha_cierre__isnull=True).order_by("pk")
+            .only("pk", "solicitante_id", "fecha_creacion", "sla_horas_objetivo", *campos)[:LOTE]
+        )
+        if not lote:
+            return
+        ultimo = lote[-1].pk
+        cambiados = []
+        for ticket in lote:
+            if not ticket.sla_horas_objetivo or ticket.fecha_creacion is None:
+                continue
+            segundos = ticket.sla_horas_objetivo * 3600
+            vencimiento = calendario.sumar(ticket.fecha_creacion, segundos)
+            advertencia = calendario.sumar(ticket.fecha_creacion, segundos * (1 - FRACCION_ADVERTENCIA))
+            if (vencimiento, advertencia) != (ticket.sla_deadline, ticket.sla_warning_at):
+                ticket.sla_deadline, ticket.sla_warning_at = vencimiento, advertencia
+                ticket.fecha_actualizacion = ahora
+                cambiados.append(ticket)
+        Ticket._base_manager.bulk_update(cambiados, campos)
+        CambioSincronizacion.objects.bulk_create([
+            CambioSincronizacion(
+                recurso="ticket", objeto_id=ticket.pk, ticket_id=ticket.pk, solicitante_id=ticket.solicitante_id,
+            )
+            for ticket in cambiados
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0018_cambiosincronizacion_solicitante'),
+    ]
+
+    operations = [
+        migrations.RunPython(recalcular_plazos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+"""
+Miniaturas y previews WebP de los adjuntos de imagen.
+
+Los derivados se generan en segundo plano después de subir el archivo y se
+guardan junto al original (`<nombre>.miniatura.webp`, `<nombre>.preview.webp`).
+Mientras no existan, las vistas sirven el original.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+# Lado mayor en píxeles de cada derivado
+TAMANOS = {
+    "miniatura": 320,
+    "preview": 1280,
+}
+EXTENSIONES_IMAGEN = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"]
+CALIDAD_WEBP = 80
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "ADJUNTOS_WORKERS", 2),
+    thread_name_prefix="adjuntos",
+)
+
+
+def executor():
+    """Pool compartido para el procesamiento de adjuntos fuera del request."""
+    return _executor
+
+
+def es_imagen(nombre) -> bool:
+    return bool(nombre) and os.path.splitext(str(nombre))[1].lower() in EXTENSIONES_IMAGEN
+
+
+def nombre_derivado(nombre: str, tamano: str) -> str:
+    return f"{nombre}.{tamano}.webp"
+
+
+def generar_derivados(nombre: str):
+    """Genera los derivados que falten para `nombre`. Idempotente."""
+    from PIL import Image, ImageOps
+
+    pendientes = [
+        t for t in TAMANOS if not default_storage.exists(nombre_derivado(nombre, t))
+    ]
+    if not pendientes or not default_storage.exists(nombre):
+        return
+
+    with default_storage.open(nombre, "rb") as f:
+        with Image.open(f) as original:
+            original = ImageOps.exif_transpose(original)
+            modo = "RGBA" if original.mode in ("RGBA", "LA", "P") else "RGB"
+            original = original.convert(modo)
+
+            for tamano in pendientes:
+                lado = TAMANOS[tamano]
+                imagen = original.copy()
+                imagen.thumbnail((lado, lado), Image.LANCZOS)
+
+                buffer = io.BytesIO()
+                imagen.save(buffer, "WEBP", quality=CALIDAD_WEBP, method=4)
+
+                # Escritura directa junto al original (no pasa por el storage
+                # deduplicado: el derivado pertenece a su original).
+                ruta = default_storage.path(nombre_derivado(nombre, tamano))
+                temporal = f"{ruta}.tmp"
+                with open(temporal, "wb") as destino:
+                    destino.write(buffer.getvalue())
+                os.replace(temporal, ruta)
+
+
+def _generar_seguro(nombre):
+    try:
+        generar_derivados(nombre)
+    except Exception:
+        logger.exception("No se pudieron generar los derivados de %s", nombre)
+
+
+def encolar_derivados(nombre):
+    if es_imagen(nombre):
+        executor().submit(_generar_seguro, str(nombre))
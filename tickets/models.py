@@ -1,8 +1,26 @@
-from django.db import models
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from accounts.models import Usuario, Tecnico
-from datetime import timedelta
 from django.utils import timezone
 
+from .calendario import sumar_horas
+
+# Fracción del plazo restante bajo la cual un ticket abierto pasa a ADVERTENCIA
+SLA_FRACCION_ADVERTENCIA = 0.25
+
+# Valores de `Ticket.sla_status` / `sla_estado`, con su nombre para filtros
+SLA_ESTADOS = {
+    "VENCIDO": "Vencido",
+    "ADVERTENCIA": "Por vencer",
+    "EN_CURSO": "En curso",
+    "CUMPLIDO": "Cumplido",
+    "VENCIDO_CERR": "Cerrado fuera de plazo",
+    "SIN_SLA": "Sin SLA",
+}
+
 
 class Categoria(models.Model):
     nombre_categoria = models.CharField(max_length=100, unique=True)
@@ -30,6 +48,10 @@ class Subcategoria(models.Model):
         return f"{self.categoria.nombre_categoria} / {self.nombre_subcategoria}"
 
 
+# `sla_horas` no se leyó de la base (instancia armada a mano o campo diferido)
+_SIN_LEER = object()
+
+
 class Prioridad(models.Model):
     nombre_prioridad = models.CharField(max_length=50, unique=True)
     descripcion = models.TextField(blank=True)
@@ -44,10 +66,84 @@ class Prioridad(models.Model):
         blank=True,
         help_text="Horas objetivo de resolución para esta prioridad."
     )
+    version_sla = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text="Sube cada vez que cambia sla_horas (ver PoliticaSLA)."
+    )
 
     def __str__(self) -> str:
         return self.nombre_prioridad
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._sla_horas_guardadas = dict(zip(field_names, values)).get("sla_horas", _SIN_LEER)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Lo lee la señal post_save para registrar la política y recalcular
+        self._sla_cambiado = False
+        if self._state.adding or getattr(self, "_sla_horas_guardadas", _SIN_LEER) == self.sla_horas:
+            super().save(*args, **kwargs)
+        else:
+            # La fila bloqueada decide: dos ediciones concurrentes no pueden
+            # calcular la misma versión (PoliticaSLA es única por versión)
+            with transaction.atomic(using=kwargs.get("using")):
+                fila = (
+                    Prioridad.objects.select_for_update().filter(pk=self.pk)
+                    .values_list("sla_horas", "version_sla").first()
+                )
+                if fila is not None and fila[0] != self.sla_horas:
+                    self._sla_cambiado = True
+                    self.version_sla = fila[1] + 1
+                    if kwargs.get("update_fields") is not None:
+                        kwargs["update_fields"] = {*kwargs["update_fields"], "version_sla"}
+                super().save(*args, **kwargs)
+        self._sla_horas_guardadas = self.sla_horas
+
+
+class PoliticaSLA(models.Model):
+    """
+    Versión de la política de SLA de una prioridad. Cada cambio de
+    `Prioridad.sla_horas` crea una y recalcula por lotes los tickets abiertos
+    de esa prioridad (tickets/sla.py). `Ticket.sla_version` indica qué versión
+    tiene aplicada cada ticket.
+    """
+    prioridad = models.ForeignKey(Prioridad, on_delete=models.CASCADE, related_name="politicas_sla")
+    version = models.PositiveIntegerField()
+    sla_horas = models.PositiveIntegerField(null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+    aplicada_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Fin del recálculo de los tickets abiertos; vacío mientras está pendiente."
+    )
+    tickets_actualizados = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Política de SLA"
+        verbose_name_plural = "Políticas de SLA"
+        ordering = ["prioridad", "-version"]
+        constraints = [
+            models.UniqueConstraint(fields=["prioridad", "version"], name="politica_sla_unica"),
+        ]
+
+    def __str__(self):
+        return f"{self.prioridad} v{self.version} ({self.sla_horas or '—'} h)"
+
+
+class Feriado(models.Model):
+    """Día sin jornada hábil para el cálculo de SLA (tickets/calendario.py)."""
+    fecha = models.DateField(unique=True)
+    nombre = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ["fecha"]
+
+    def __str__(self):
+        return f"{self.fecha:%d-%m-%Y} {self.nombre}"
+
 
 class EstadoTicket(models.Model):
     """
@@ -63,6 +159,13 @@ class EstadoTicket(models.Model):
         default=False,
         help_text="Indica si es un estado final (Resuelto, Cerrado)."
     )
+    transiciones = models.ManyToManyField(
+        "self",
+        symmetrical=False,
+        blank=True,
+        related_name="+",
+        help_text="Estados a los que se puede pasar desde este. Vacío: cualquiera.",
+    )
 
     def __str__(self):
         return self.nombre_estado
@@ -84,6 +187,63 @@ class AreaAfectada(models.Model):
         return self.nombre_area
 
 
+def plazos_sla(fecha_creacion, sla_horas):
+    """
+    (vencimiento, inicio de advertencia) de un SLA, o (None, None) sin SLA.
+    Las horas son hábiles o corridas según `settings.SLA_HORAS_HABILES`.
+    """
+    if not sla_horas or fecha_creacion is None:
+        return None, None
+    vencimiento = sumar_horas(fecha_creacion, sla_horas)
+    advertencia = sumar_horas(fecha_creacion, sla_horas * (1 - SLA_FRACCION_ADVERTENCIA))
+    return vencimiento, advertencia
+
+
+class TicketQuerySet(models.QuerySet):
+    def con_sla(self, ahora=None):
+        """
+        Anota `sla_estado` (los mismos valores que `Ticket.sla_status`) y
+        `sla_riesgo` (0 = vencido, 1 = advertencia, 2 = en curso, 3 = sin
+        SLA, 4 = cerrado) para filtrar y ordenar en SQL.
+        """
+        ahora = ahora or timezone.now()
+        cerrado = Q(fecha_cierre__isnull=False)
+        return self.annotate(
+            sla_estado=Case(
+                When(sla_deadline__isnull=True, then=Value("SIN_SLA")),
+                When(cerrado & Q(fecha_cierre__lte=F("sla_deadline")), then=Value("CUMPLIDO")),
+                When(cerrado, then=Value("VENCIDO_CERR")),
+                When(sla_deadline__lt=ahora, then=Value("VENCIDO")),
+                When(sla_warning_at__lte=ahora, then=Value("ADVERTENCIA")),
+                default=Value("EN_CURSO"),
+                output_field=models.CharField(),
+            ),
+            sla_riesgo=Case(
+                When(cerrado, then=Value(4)),
+                When(sla_deadline__isnull=True, then=Value(3)),
+                When(sla_deadline__lt=ahora, then=Value(0)),
+                When(sla_warning_at__lte=ahora, then=Value(1)),
+                default=Value(2),
+                output_field=models.IntegerField(),
+            ),
+        )
+
+    def por_sla(self, valor):
+        """Filtra por un valor de `SLA_ESTADOS` o "riesgo" (vencidos y por vencer)."""
+        if valor == "riesgo":
+            return self.con_sla().filter(sla_riesgo__lte=1)
+        if valor in SLA_ESTADOS:
+            return self.con_sla().filter(sla_estado=valor)
+        return self
+
+
+class TicketManager(models.Manager.from_queryset(TicketQuerySet)):
+    """Excluye los tickets marcados para eliminación (ver tickets/eliminacion.py)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(eliminado_en__isnull=True)
+
+
 class Ticket(models.Model):
     titulo = models.CharField(max_length=200)
     descripcion = models.TextField()
@@ -136,8 +296,18 @@ class Ticket(models.Model):
         null=True,
         help_text="Archivos adjuntos: imágenes, PDF, etc."
     )
+    archivo_original = models.FileField(
+        upload_to="tickets_adjuntos/",
+        blank=True,
+        null=True,
+        help_text="Imagen original sin comprimir (solo si se pidió conservarla)"
+    )
+    conservar_original = models.BooleanField(
+        default=False,
+        help_text="Conservar la imagen original además de la versión comprimida"
+    )
 
-    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_creacion = models.DateTimeField(default=timezone.now, editable=False)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     fecha_cierre = models.DateTimeField(null=True, blank=True)
 
@@ -146,19 +316,82 @@ class Ticket(models.Model):
         blank=True,
         help_text="SLA en horas, si aplica."
     )
+    # Calculados al crear el ticket o cambiar su prioridad (actualizar_sla)
+    sla_deadline = models.DateTimeField(null=True, blank=True, editable=False)
+    sla_warning_at = models.DateTimeField(null=True, blank=True, editable=False)
+    sla_version = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Versión de la política de SLA de la prioridad aplicada (PoliticaSLA)."
+    )
+
+    eliminado_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="Marcado para eliminación; la purga corre en segundo plano"
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        help_text="Sube con cada escritura; ver tickets/concurrencia.py"
+    )
+
+    objects = TicketManager()
+    todos = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fecha_actualizacion"], name="ticket_actualizacion"),
+            # Solo tickets abiertos: son los que se filtran por riesgo de SLA
+            models.Index(
+                fields=["sla_deadline"], condition=Q(fecha_cierre__isnull=True), name="ticket_sla_abiertos",
+            ),
+            models.Index(
+                fields=["sla_warning_at"], condition=Q(fecha_cierre__isnull=True), name="ticket_sla_adv_abiertos",
+            ),
+        ]
 
     def __str__(self):
         return f"Ticket #{self.id} - {self.titulo}"
-    
-    @property
-    def sla_deadline(self):
+
+    def actualizar_sla(self):
         """
-        Fecha/hora límite de SLA según la prioridad.
+        Al crear el ticket o cambiar su prioridad: toma el SLA de la
+        prioridad y su versión (si no venía uno) y recalcula `sla_deadline`
+        y `sla_warning_at`. Devuelve True si recalculó.
         """
-        if self.prioridad and self.prioridad.sla_horas:
-            return self.fecha_creacion + timedelta(hours=self.prioridad.sla_horas)
-        return None
-
+        if self._state.adding:
+            if self.sla_horas_objetivo is None and self.prioridad_id:
+                self.sla_horas_objetivo = self.prioridad.sla_horas
+                self.sla_version = self.prioridad.version_sla
+        else:
+            guardados = getattr(self, "_valores_guardados", None)
+            if guardados is None or guardados.get("prioridad_id", self.prioridad_id) == self.prioridad_id:
+                return False
+            self.sla_horas_objetivo = self.prioridad.sla_horas if self.prioridad_id else None
+            self.sla_version = self.prioridad.version_sla if self.prioridad_id else None
+        self.sla_deadline, self.sla_warning_at = plazos_sla(self.fecha_creacion, self.sla_horas_objetivo)
+        return True
+
+    def save(self, *args, **kwargs):
+        if self.actualizar_sla() and kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {
+                *kwargs["update_fields"], "sla_horas_objetivo", "sla_deadline", "sla_warning_at", "sla_version",
+            }
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores tal como se leyeron, para el diff de tickets/eventos.py
+        instance._valores_guardados = dict(zip(field_names, values))
+        return instance
+    
     @property
     def sla_status(self):
         """
@@ -169,28 +402,30 @@ class Ticket(models.Model):
         - VENCIDO      → abierto, plazo vencido
         - CUMPLIDO     → cerrado dentro de SLA
         - VENCIDO_CERR → cerrado pero fuera de SLA
+
+        Usa las columnas guardadas, o la anotación de `con_sla()` si está.
         """
+        if "sla_estado" in self.__dict__:
+            return self.sla_estado
+
         deadline = self.sla_deadline
         if not deadline:
             return "SIN_SLA"
 
-        now = timezone.now()
-
-        # Si está en estado final
-        if self.estado and self.estado.es_final and self.fecha_cierre:
+        # Cerrado: fecha_cierre solo existe en estados finales
+        if self.fecha_cierre:
             if self.fecha_cierre <= deadline:
                 return "CUMPLIDO"
             else:
                 return "VENCIDO_CERR"
 
         # Ticket abierto
+        now = timezone.now()
         if now > deadline:
             return "VENCIDO"
 
         # Advertencia cuando queda menos del 25% del tiempo
-        total_seg = (deadline - self.fecha_creacion).total_seconds()
-        restantes_seg = (deadline - now).total_seconds()
-        if total_seg > 0 and (restantes_seg / total_seg) <= 0.25:
+        if self.sla_warning_at and now >= self.sla_warning_at:
             return "ADVERTENCIA"
 
         return "EN_CURSO"
@@ -284,6 +519,16 @@ class ComentarioTicket(models.Model):
         null=True,
         help_text="Archivo adjunto opcional (imagen, PDF, etc.)"
     )
+    archivo_original = models.FileField(
+        upload_to='comentarios/%Y/%m/',
+        blank=True,
+        null=True,
+        help_text="Imagen original sin comprimir (solo si se pidió conservarla)"
+    )
+    conservar_original = models.BooleanField(
+        default=False,
+        help_text="Conservar la imagen original además de la versión comprimida"
+    )
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -295,6 +540,13 @@ class ComentarioTicket(models.Model):
         usuario_nombre = self.usuario.get_full_name() or self.usuario.email
         return f"Comentario de {usuario_nombre} en Ticket #{self.ticket.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Para saber si un save() cambió el adjunto (ver tickets/signals.py)
+        instance._valores_guardados = dict(zip(field_names, values))
+        return instance
+
 
 class CalificacionTicket(models.Model):
     """
@@ -332,3 +584,179 @@ class CalificacionTicket(models.Model):
 
     def __str__(self):
         return f"Calificación {self.puntuacion}⭐ - Ticket #{self.ticket.id}"
+
+
+class BlobAdjunto(models.Model):
+    """
+    Archivo adjunto almacenado una sola vez por contenido (SHA-256).
+    `referencias` cuenta cuántos adjuntos apuntan al mismo blob; el archivo
+    físico se borra cuando llega a cero. Ver tickets/storage.py.
+    """
+    nombre = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    tamano = models.BigIntegerField(help_text="Tamaño en bytes")
+    referencias = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Blob de adjunto"
+        verbose_name_plural = "Blobs de adjuntos"
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias} ref.)"
+
+
+class SubidaFragmentada(models.Model):
+    """
+    Subida reanudable de un adjunto grande, enviada por chunks de tamaño fijo.
+
+    Los chunks se guardan en `MEDIA_ROOT/subidas/<id>/` (el disco es la fuente
+    de verdad de qué chunks llegaron) y al completar se ensamblan en un blob
+    deduplicado. `archivo` queda con ese nombre hasta que un ticket, comentario
+    o archivo FAQ lo toma. Ver tickets/subidas.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name="subidas_fragmentadas",
+    )
+    nombre_archivo = models.CharField(max_length=255)
+    tamano_total = models.BigIntegerField(help_text="Tamaño final en bytes")
+    tamano_chunk = models.PositiveIntegerField()
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="SHA-256 esperado del archivo completo (opcional)"
+    )
+    archivo = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Nombre en el storage una vez ensamblada"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Subida fragmentada"
+        verbose_name_plural = "Subidas fragmentadas"
+
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.usuario.email})"
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.tamano_total // self.tamano_chunk))
+
+    @property
+    def completada(self):
+        return bool(self.archivo)
+
+
+class EventoTicket(models.Model):
+    """
+    Evento de la línea de tiempo de un ticket (solo se agregan, nunca se
+    editan). `cambios` guarda únicamente los campos modificados como
+    {"campo": [antes, después]}, con las FK como id. Ver tickets/eventos.py.
+    """
+    TIPO_CREACION = "creacion"
+    TIPO_CAMBIO = "cambio"
+    TIPO_ASIGNACION = "asignacion"
+    TIPO_SNAPSHOT = "snapshot"
+    TIPOS = [
+        (TIPO_CREACION, "Creación"),
+        (TIPO_CAMBIO, "Cambio"),
+        (TIPO_ASIGNACION, "Asignación"),
+        (TIPO_SNAPSHOT, "Estado inicial importado"),
+    ]
+
+    ticket = models.ForeignKey(
+        Ticket,
+        on_delete=models.CASCADE,
+        related_name="eventos",
+    )
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    fecha = models.DateTimeField(default=timezone.now)
+    tipo = models.CharField(max_length=20, choices=TIPOS, default=TIPO_CAMBIO)
+    cambios = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        verbose_name = "Evento de ticket"
+        verbose_name_plural = "Eventos de tickets"
+        ordering = ["fecha", "id"]
+        indexes = [
+            models.Index(fields=["ticket", "fecha"]),
+            models.Index(fields=["fecha"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} Ticket #{self.ticket_id} ({self.fecha:%d-%m-%Y %H:%M})"
+
+
+class AlertaSLA(models.Model):
+    """
+    Cruce de umbral de SLA ya avisado por el monitor (tickets/sla.py). La
+    restricción única garantiza un solo aviso por cruce aunque corran dos
+    monitores; si el vencimiento cambia, el nuevo cruce se avisa otra vez.
+    """
+    TIPO_ADVERTENCIA = "ADVERTENCIA"
+    TIPO_VENCIDO = "VENCIDO"
+    TIPOS = [
+        (TIPO_ADVERTENCIA, "Advertencia"),
+        (TIPO_VENCIDO, "Vencido"),
+    ]
+
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="alertas_sla")
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    vencimiento = models.DateTimeField(help_text="Vencimiento de SLA vigente al cruzar el umbral")
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Alerta de SLA"
+        verbose_name_plural = "Alertas de SLA"
+        constraints = [
+            models.UniqueConstraint(fields=["ticket", "tipo", "vencimiento"], name="alerta_sla_unica"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} SLA ticket #{self.ticket_id}"
+
+
+
+class CambioSincronizacion(models.Model):
+    """
+    Secuencia de cambios para la sincronización incremental (ver
+    tickets/sincronizacion.py). El `id` es el cursor. Cada fila dice qué
+    cambió, no cómo: el cliente recibe el objeto actual, o su id como
+    eliminado si ya no existe. Sin FK, para que sobreviva a la purga.
+    """
+    RECURSO_TICKET = "ticket"
+    RECURSO_COMENTARIO = "comentario"
+    RECURSO_ASIGNACION = "asignacion"
+    RECURSOS = [
+        (RECURSO_TICKET, "Ticket"),
+        (RECURSO_COMENTARIO, "Comentario"),
+        (RECURSO_ASIGNACION, "Asignaciones del ticket"),
+    ]
+
+    recurso = models.CharField(max_length=12, choices=RECURSOS)
+    # Para asignaciones, el ticket: se envían todas las suyas
+    objeto_id = models.PositiveBigIntegerField()
+    ticket_id = models.PositiveBigIntegerField(db_index=True)
+    # Dueño del ticket al registrar el cambio: el solicitante sigue viendo el
+    # cambio (o la eliminación) aunque el ticket ya se haya purgado
+    solicitante_id = models.PositiveBigIntegerField(null=True, db_index=True)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Cambio para sincronización"
+        verbose_name_plural = "Cambios para sincronización"
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_recurso_display()} {self.objeto_id}"
@@ -0,0 +1,148 @@
+"""
+Normalización de imágenes adjuntas a tickets y comentarios.
+
+Después del commit, en el pool de `miniaturas.executor()`, las imágenes se
+re-encodean sin EXIF (ubicación GPS de fotos de celular incluida) y se
+reducen si su lado mayor supera `ADJUNTOS_IMAGEN_MAX_LADO`. Las fotos quedan
+en JPEG y el resto (capturas PNG/BMP) en WebP. Si el adjunto se creó con
+`conservar_original`, el archivo subido pasa a `archivo_original`; si no, se
+libera su blob. Al terminar se generan las miniaturas del archivo final.
+"""
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import eventos, sincronizacion
+from .miniaturas import es_imagen, executor, generar_derivados
+from .models import CambioSincronizacion, ComentarioTicket, Ticket
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_FOTO = ("JPEG", "MPO")
+# Sin cambio de tamaño ni metadatos, solo se reemplaza si ahorra al menos un
+# 10%: evita re-encodear (y degradar) una y otra vez un JPEG ya comprimido.
+AHORRO_MINIMO = 0.9
+
+
+def max_lado() -> int:
+    return getattr(settings, "ADJUNTOS_IMAGEN_MAX_LADO", 2560)
+
+
+def normalizar_imagen(nombre):
+    """
+    Devuelve (bytes, extensión) con la imagen normalizada, o None si no vale
+    la pena reemplazarla (animada, o ya chica, sin metadatos y sin ahorro
+    suficiente).
+    """
+    from PIL import Image, ImageOps
+
+    tamano_original = default_storage.size(nombre)
+    with default_storage.open(nombre, "rb") as f:
+        with Image.open(f) as imagen:
+            if getattr(imagen, "is_animated", False):
+                return None
+
+            formato = imagen.format
+            con_metadatos = bool(imagen.getexif()) or "icc_profile" in imagen.info
+            grande = max(imagen.size) > max_lado()
+
+            imagen = ImageOps.exif_transpose(imagen)
+            if grande:
+                imagen.thumbnail((max_lado(), max_lado()), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            if formato in FORMATOS_FOTO:
+                extension = ".jpg"
+                imagen.convert("RGB").save(
+                    buffer, "JPEG",
+                    quality=getattr(settings, "ADJUNTOS_CALIDAD_JPEG", 82),
+                    optimize=True, progressive=True,
+                )
+            else:
+                extension = ".webp"
+                modo = "RGBA" if imagen.mode in ("RGBA", "LA", "P") else "RGB"
+                imagen.convert(modo).save(
+                    buffer, "WEBP",
+                    quality=getattr(settings, "ADJUNTOS_CALIDAD_WEBP", 90), method=4,
+                )
+
+    datos = buffer.getvalue()
+    if not (grande or con_metadatos) and len(datos) > tamano_original * AHORRO_MINIMO:
+        return None
+    return datos, extension
+
+
+def _reemplazar(modelo, pk, fila, cambios):
+    """
+    Cambia el adjunto solo si no cambió mientras se procesaba. Es un campo
+    derivado, como los plazos de SLA: el ticket no sube `version` (quien ya
+    abrió el formulario no choca con el reemplazo), pero sí
+    `fecha_actualizacion`, que invalida los ETag, y registra su evento; el
+    comentario, su fila de sincronización.
+    """
+    extra = {}
+    if modelo is Ticket:
+        extra = {"fecha_actualizacion": timezone.now()}
+    if not modelo.objects.filter(pk=pk, archivo=fila["archivo"]).update(**cambios, **extra):
+        return False
+
+    if modelo is Ticket:
+        eventos.registrar(pk, {campo: [fila[campo] or None, valor] for campo, valor in cambios.items()})
+    elif modelo is ComentarioTicket:
+        ticket_id = ComentarioTicket.objects.filter(pk=pk).values_list("ticket_id", flat=True).first()
+        sincronizacion.registrar(CambioSincronizacion.RECURSO_COMENTARIO, [(pk, ticket_id)])
+    return True
+
+
+def procesar_adjunto(app_label, nombre_modelo, pk):
+    """Normaliza el adjunto de una fila y genera sus derivados. Idempotente."""
+    modelo = apps.get_model(app_label, nombre_modelo)
+    fila = modelo.objects.filter(pk=pk).values("archivo", "archivo_original", "conservar_original").first()
+    if not fila or not es_imagen(fila["archivo"]):
+        return
+
+    nombre = fila["archivo"]
+    resultado = normalizar_imagen(nombre)
+    if resultado:
+        datos, extension = resultado
+        base = os.path.splitext(os.path.basename(nombre))[0]
+        nuevo = default_storage.save(base + extension, ContentFile(datos))
+
+        cambios = {"archivo": nuevo}
+        if fila["conservar_original"]:
+            # La referencia al blob original pasa a `archivo_original`
+            cambios["archivo_original"] = nombre
+        with transaction.atomic():
+            if _reemplazar(modelo, pk, fila, cambios):
+                if not fila["conservar_original"]:
+                    default_storage.delete(nombre)
+                nombre = nuevo
+            else:
+                default_storage.delete(nuevo)
+                return
+
+    generar_derivados(nombre)
+
+
+def _procesar_seguro(app_label, nombre_modelo, pk):
+    try:
+        procesar_adjunto(app_label, nombre_modelo, pk)
+    except Exception:
+        logger.exception("No se pudo procesar el adjunto de %s.%s #%s", app_label, nombre_modelo, pk)
+    finally:
+        # El hilo del pool no pasa por el ciclo de request que cierra conexiones
+        close_old_connections()
+
+
+def encolar_procesamiento(instance):
+    if es_imagen(instance.archivo.name):
+        executor().submit(
+            _procesar_seguro, instance._meta.app_label, instance._meta.object_name, instance.pk
+        )
@@ -1,8 +1,13 @@
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
 from .models import (
     Ticket, Categoria, Subcategoria, Prioridad,
-    EstadoTicket, AsignacionTicket, HistorialTicket,
+    EstadoTicket, AsignacionTicket, HistorialTicket, SubidaFragmentada,
+    EventoTicket, ComentarioTicket, CalificacionTicket,
 )
+from .descargas import url_adjunto
+from .subidas import chunks_recibidos
 
 class CategoriaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,7 +39,86 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = "__all__"
-        read_only_fields = ["solicitante", "fecha_creacion", "fecha_actualizacion", "fecha_cierre"]
+        read_only_fields = ["solicitante", "fecha_creacion", "fecha_actualizacion", "fecha_cierre", "version"]
+
+
+class ValoresSerializer:
+    """
+    Serialización de solo lectura para listados grandes. Lee las filas con
+    `values_list()` y convierte cada columna con una función elegida una
+    sola vez a partir de los campos de `serializer_class`. Así no se crean
+    instancias del modelo ni se recorre la maquinaria de campos de DRF por
+    fila. El JSON resultante es el mismo que el de `serializer_class(many=True)`.
+    """
+    serializer_class = None
+    # {campo: lookup} de los StringRelatedField: el __str__ leído como columna
+    texto = {}
+
+    def __init__(self, queryset, context=None):
+        self.queryset = queryset
+        self.context = context or {}
+
+    def _fecha_hora(self, campo):
+        formato = getattr(campo, "format", api_settings.DATETIME_FORMAT)
+        zona = campo.timezone if hasattr(campo, "timezone") else campo.default_timezone()
+        if formato is None or formato.lower() != ISO_8601 or zona is None:
+            return campo.to_representation
+
+        def convertir(valor):
+            texto = valor.astimezone(zona).isoformat()
+            return texto[:-6] + "Z" if texto.endswith("+00:00") else texto
+        return convertir
+
+    def _archivo(self, storage):
+        request = self.context.get("request")
+        absoluta = request.build_absolute_uri if request is not None else str
+
+        def convertir(nombre):
+            return absoluta(storage.url(nombre)) if nombre else None
+        return convertir
+
+    def _columnas(self):
+        """[(nombre, lookup de values_list, conversor o None)], en el orden del serializer."""
+        modelo = self.serializer_class.Meta.model
+        columnas = []
+        for nombre, campo in self.serializer_class(context=self.context).fields.items():
+            if campo.write_only:
+                continue
+            if nombre in self.texto:
+                columnas.append((nombre, self.texto[nombre], None))
+            elif isinstance(campo, serializers.PrimaryKeyRelatedField):
+                columnas.append((nombre, modelo._meta.get_field(campo.source).attname, None))
+            elif isinstance(campo, serializers.FileField):
+                storage = modelo._meta.get_field(campo.source).storage
+                columnas.append((nombre, campo.source, self._archivo(storage)))
+            elif isinstance(campo, serializers.DateTimeField):
+                columnas.append((nombre, campo.source, self._fecha_hora(campo)))
+            elif isinstance(campo, (serializers.IntegerField, serializers.CharField,
+                                    serializers.BooleanField, serializers.ChoiceField)):
+                # Los valores de la base ya vienen con el tipo que entrega DRF
+                columnas.append((nombre, campo.source, None))
+            else:
+                raise TypeError(f"{nombre}: {type(campo).__name__} no tiene conversor en ValoresSerializer")
+        return columnas
+
+    @property
+    def data(self):
+        columnas = self._columnas()
+        nombres = [nombre for nombre, _, _ in columnas]
+        conversores = [(i, conversor) for i, (_, _, conversor) in enumerate(columnas) if conversor]
+        resultado = []
+        for fila in self.queryset.values_list(*(lookup for _, lookup, _ in columnas)):
+            fila = list(fila)
+            for i, conversor in conversores:
+                if fila[i] is not None:
+                    fila[i] = conversor(fila[i])
+            resultado.append(dict(zip(nombres, fila)))
+        return resultado
+
+
+class TicketListaSerializer(ValoresSerializer):
+    serializer_class = TicketSerializer
+    texto = {"solicitante": "solicitante__email"}  # Usuario.__str__
 
 
 class AsignacionTicketSerializer(serializers.ModelSerializer):
@@ -48,3 +132,46 @@ class HistorialTicketSerializer(serializers.ModelSerializer):
         model = HistorialTicket
         fields = "__all__"
 
+
+class ComentarioTicketSerializer(serializers.ModelSerializer):
+    usuario = serializers.StringRelatedField(read_only=True)
+    archivo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ComentarioTicket
+        fields = ["id", "ticket", "usuario", "texto", "archivo", "fecha_creacion"]
+
+    def get_archivo(self, obj):
+        return url_adjunto(obj.archivo)
+
+
+class CalificacionTicketSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CalificacionTicket
+        fields = "__all__"
+
+
+class EventoTicketSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventoTicket
+        fields = ["id", "fecha", "tipo", "usuario", "cambios"]
+
+
+
+class SubidaFragmentadaSerializer(serializers.ModelSerializer):
+    total_chunks = serializers.IntegerField(read_only=True)
+    completada = serializers.BooleanField(read_only=True)
+    recibidos = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SubidaFragmentada
+        fields = [
+            "id", "nombre_archivo", "tamano_total", "tamano_chunk", "sha256",
+            "total_chunks", "recibidos", "completada", "fecha_creacion",
+        ]
+        read_only_fields = ["tamano_chunk", "fecha_creacion"]
+
+    def get_recibidos(self, obj):
+        if obj.completada:
+            return list(range(obj.total_chunks))
+        return chunks_recibidos(obj)
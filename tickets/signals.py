@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Tecnico
+from .asignacion import asignar_al_confirmar, invalidar_indice
+from .calendario import invalidar_calendario
+from .miniaturas import encolar_derivados
+from . import eventos, sincronizacion
+from .models import (
+    Ticket, ComentarioTicket, AsignacionTicket, EventoTicket, Feriado, Prioridad, CambioSincronizacion,
+)
+from .sla import registrar_politica
+from .normalizacion import encolar_procesamiento
+
+
+def _archivo_cambiado(instance, update_fields):
+    """Si el save() escribió un adjunto distinto del leído (o no se sabe)."""
+    if update_fields is not None and "archivo" not in update_fields:
+        return False
+    guardados = getattr(instance, "_valores_guardados", None)
+    if guardados is None or "archivo" not in guardados:
+        return True
+    return (guardados["archivo"] or None) != (instance.archivo.name or None)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=ComentarioTicket)
+def generar_derivados_adjunto(sender, instance, created, update_fields=None, **kwargs):
+    # Después del commit, para no procesar un upload revertido
+    if instance.archivo and created:
+        # Normaliza la imagen y luego genera los derivados del resultado
+        transaction.on_commit(lambda: encolar_procesamiento(instance))
+    elif instance.archivo and _archivo_cambiado(instance, update_fields):
+        # Un save() que no toca el adjunto (estado, SLA...) no encola nada
+        nombre = instance.archivo.name
+        transaction.on_commit(lambda: encolar_derivados(nombre))
+    if sender is ComentarioTicket and hasattr(instance, "_valores_guardados"):
+        # Los del ticket los renueva registrar_evento_ticket, después de su diff
+        instance._valores_guardados["archivo"] = instance.archivo.name
+
+
+@receiver(post_save, sender=Ticket)
+def registrar_evento_ticket(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    actuales = eventos.valores(instance)
+    if created:
+        cambios = {
+            campo.name: [None, actuales[campo.attname]]
+            for campo in eventos.campos_rastreados()
+            if actuales[campo.attname] is not None
+        }
+        eventos.registrar(instance.pk, cambios, tipo=EventoTicket.TIPO_CREACION)
+    else:
+        anteriores = getattr(instance, "_valores_guardados", {})
+        eventos.registrar(instance.pk, eventos.diff(anteriores, actuales))
+    instance._valores_guardados = actuales
+
+
+@receiver(post_save, sender=AsignacionTicket)
+def registrar_evento_asignacion(sender, instance, raw=False, **kwargs):
+    if raw or not instance.activo:
+        return
+    # El técnico anterior sale del propio log: sirve igual si la vista crea
+    # una asignación nueva o reutiliza la fila con update_or_create()
+    anterior = eventos.tecnico_asignado(instance.ticket_id)
+    if anterior != instance.tecnico_asignado_id:
+        eventos.registrar(
+            instance.ticket_id,
+            {"tecnico_asignado": [anterior, instance.tecnico_asignado_id]},
+            tipo=EventoTicket.TIPO_ASIGNACION,
+        )
+
+
+@receiver(post_save, sender=ComentarioTicket)
+@receiver(post_delete, sender=ComentarioTicket)
+def registrar_cambio_comentario(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sincronizacion.registrar(CambioSincronizacion.RECURSO_COMENTARIO, [(instance.pk, instance.ticket_id)])
+
+
+@receiver(post_delete, sender=Ticket)
+def registrar_ticket_borrado(sender, instance, **kwargs):
+    # Borrados por el ORM (admin, purga); los cambios ya pasan por el log de eventos
+    sincronizacion.registrar_tickets([instance.pk], solicitantes={instance.pk: instance.solicitante_id})
+
+
+@receiver(post_delete, sender=AsignacionTicket)
+def registrar_asignacion_borrada(sender, instance, **kwargs):
+    sincronizacion.registrar_tickets([instance.ticket_id], CambioSincronizacion.RECURSO_ASIGNACION)
+
+
+@receiver(post_save, sender=Ticket)
+def asignar_ticket_nuevo(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and getattr(settings, "ASIGNACION_AUTOMATICA", None):
+        asignar_al_confirmar(instance.pk)
+
+
+@receiver(post_save, sender=Tecnico)
+@receiver(post_delete, sender=Tecnico)
+def recargar_indice_carga(sender, **kwargs):
+    # Cambió la especialidad o la disponibilidad: se rearma en el próximo uso
+    transaction.on_commit(invalidar_indice)
+
+
+@receiver(post_save, sender=Feriado)
+@receiver(post_delete, sender=Feriado)
+def recargar_calendario(sender, **kwargs):
+    # Los plazos ya guardados se rehacen con `python manage.py recalcular_sla`
+    transaction.on_commit(invalidar_calendario)
+
+
+@receiver(post_save, sender=Prioridad)
+def registrar_politica_sla(sender, instance, created, raw=False, **kwargs):
+    if not raw and (created or getattr(instance, "_sla_cambiado", False)):
+        registrar_politica(instance, creada=created)
@@ -0,0 +1,159 @@
+"""
+Sincronización incremental de tickets para la app móvil y el BI.
+
+`GET /api/tickets/changes/?since=<cursor>` entrega lo que cambió después del
+cursor: tickets, comentarios, asignaciones e ids eliminados, más el cursor
+para la próxima llamada. El costo depende de cuántos cambios hubo, no de
+cuántos tickets existen. `since=0` (o sin `since`) es una sincronización
+completa: la migración dejó una fila por cada objeto que ya existía.
+
+Cada cambio agrega una fila a `CambioSincronizacion` en la misma transacción
+que lo produce: si la transacción se confirma, el cambio queda en la
+secuencia. Los cambios de tickets y asignaciones se toman del log de eventos
+(tickets/eventos.py). Los comentarios se registran con señales y las
+eliminaciones al marcarlas. Con transaction_mode IMMEDIATE la transacción
+tiene el lock de escritura desde que empieza, así que los ids se asignan en
+el orden de los commits y un cursor nunca salta un cambio que se confirma
+después. Las operaciones por conjunto usan `en_lote()` para insertar todas
+sus filas con un solo INSERT.
+
+Cada fila guarda el solicitante del ticket. Así el solicitante recibe la
+eliminación de su ticket aunque la purga ya haya borrado la fila del ticket.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .models import AsignacionTicket, CambioSincronizacion, ComentarioTicket, EventoTicket, Ticket
+from .serializers import AsignacionTicketSerializer, ComentarioTicketSerializer, TicketSerializer
+
+LIMITE = 500
+
+
+# Del `en_lote()` activo: ({(recurso, objeto_id, ticket_id): solicitante_id},
+# {ticket_id: solicitante_id} que el llamador ya conoce)
+_lote = ContextVar("lote_sincronizacion", default=None)
+
+
+class CursorInvalido(ValueError):
+    status = 400
+
+
+def _insertar(pendientes, conocidos):
+    faltan = {
+        ticket_id for (_, _, ticket_id), solicitante in pendientes.items()
+        if solicitante is None and ticket_id not in conocidos
+    }
+    solicitantes = dict(conocidos)
+    if faltan:
+        solicitantes.update(Ticket.todos.filter(pk__in=faltan).values_list("pk", "solicitante_id"))
+    CambioSincronizacion.objects.bulk_create([
+        CambioSincronizacion(
+            recurso=recurso, objeto_id=objeto_id, ticket_id=ticket_id,
+            solicitante_id=solicitante if solicitante is not None else solicitantes.get(ticket_id),
+        )
+        for (recurso, objeto_id, ticket_id), solicitante in pendientes.items()
+    ])
+
+
+@contextmanager
+def en_lote():
+    """
+    Junta lo que se registre dentro del bloque y lo inserta al salir, todavía
+    dentro de la transacción. Si el bloque falla no se inserta nada. Entrega
+    un dict {ticket_id: solicitante_id} que el llamador puede llenar con lo
+    que ya leyó, para no volver a consultarlo.
+    """
+    if _lote.get() is not None:
+        yield _lote.get()[1]
+        return
+    pendientes, conocidos = {}, {}
+    token = _lote.set((pendientes, conocidos))
+    try:
+        yield conocidos
+    finally:
+        _lote.reset(token)
+    if pendientes:
+        _insertar(pendientes, conocidos)
+
+
+def registrar(recurso, pares, solicitantes=None):
+    """
+    Agrega los pares (objeto_id, ticket_id) a la secuencia. `solicitantes`
+    ({ticket_id: solicitante_id}) hace falta si el ticket ya no existe, por
+    ejemplo en un post_delete; si no se pasa, se consulta.
+    """
+    solicitantes = solicitantes or {}
+    lote = _lote.get()
+    pendientes = {} if lote is None else lote[0]
+    for objeto_id, ticket_id in pares:
+        clave = (recurso, objeto_id, ticket_id)
+        if pendientes.get(clave) is None:
+            pendientes[clave] = solicitantes.get(ticket_id)
+    if lote is None and pendientes:
+        _insertar(pendientes, {})
+
+
+def registrar_tickets(ids, recurso=CambioSincronizacion.RECURSO_TICKET, solicitantes=None):
+    registrar(recurso, ((pk, pk) for pk in ids), solicitantes)
+
+
+def registrar_eventos(eventos):
+    """Los tickets (o sus asignaciones) de `eventos`."""
+    registrar_tickets(e.ticket_id for e in eventos if e.tipo != EventoTicket.TIPO_ASIGNACION)
+    registrar_tickets(
+        (e.ticket_id for e in eventos if e.tipo == EventoTicket.TIPO_ASIGNACION),
+        CambioSincronizacion.RECURSO_ASIGNACION,
+    )
+
+
+def _cursor(valor):
+    try:
+        cursor = int(valor or 0)
+    except (TypeError, ValueError):
+        raise CursorInvalido("since debe ser el cursor entregado por la llamada anterior.")
+    if cursor < 0:
+        raise CursorInvalido("since debe ser el cursor entregado por la llamada anterior.")
+    return cursor
+
+
+def cambios_desde(valor, usuario, limite=LIMITE):
+    """
+    Hasta `limite` cambios posteriores al cursor `valor`, con el estado
+    actual de cada objeto. `mas` indica que quedan cambios por pedir.
+    """
+    cursor = _cursor(valor)
+    filas = CambioSincronizacion.objects.filter(pk__gt=cursor)
+    if usuario.rol.nombre_rol not in ("ADMIN", "TECNICO"):
+        # Por la columna propia: incluye los tickets ya purgados
+        filas = filas.filter(solicitante_id=usuario.pk)
+    filas = list(filas.values_list("pk", "recurso", "objeto_id")[:limite + 1])
+    mas = len(filas) > limite
+    filas = filas[:limite]
+
+    ids = {recurso: set() for recurso, _ in CambioSincronizacion.RECURSOS}
+    for _, recurso, objeto_id in filas:
+        ids[recurso].add(objeto_id)
+
+    tickets = list(
+        Ticket.objects.filter(pk__in=ids[CambioSincronizacion.RECURSO_TICKET])
+        .select_related("solicitante").order_by("pk")
+    )
+    comentarios = list(
+        ComentarioTicket.objects.filter(
+            pk__in=ids[CambioSincronizacion.RECURSO_COMENTARIO], ticket__eliminado_en__isnull=True,
+        ).select_related("usuario").order_by("pk")
+    )
+    asignaciones = AsignacionTicket.objects.filter(
+        ticket_id__in=ids[CambioSincronizacion.RECURSO_ASIGNACION], ticket__eliminado_en__isnull=True,
+    ).order_by("pk")
+    return {
+        "cursor": filas[-1][0] if filas else cursor,
+        "mas": mas,
+        "tickets": TicketSerializer(tickets, many=True).data,
+        "comentarios": ComentarioTicketSerializer(comentarios, many=True).data,
+        "asignaciones": AsignacionTicketSerializer(asignaciones, many=True).data,
+        "eliminados": {
+            "tickets": sorted(ids[CambioSincronizacion.RECURSO_TICKET] - {t.pk for t in tickets}),
+            "comentarios": sorted(ids[CambioSincronizacion.RECURSO_COMENTARIO] - {c.pk for c in comentarios}),
+        },
+    }
@@ -0,0 +1,315 @@
+"""
+Monitor de SLA: avisa cuando un ticket abierto entra en ADVERTENCIA (queda
+menos de `SLA_FRACCION_ADVERTENCIA` del plazo) o VENCIDO.
+
+`MonitorSLA` guarda en un heap de mínimos los umbrales de cada ticket abierto
+(`sla_warning_at` y `sla_deadline`) y duerme hasta el primero, así no
+recorre la tabla en cada vuelta.
+Los cambios de tickets (creación, cambio de prioridad, cierre, reapertura,
+eliminación) los toma de la secuencia de sincronización
+(`CambioSincronizacion`), que se escribe en la misma transacción que el
+cambio: solo vuelve a leer los tickets con filas nuevas. El cursor es el id
+de esa secuencia, así que supone, como `/api/tickets/changes/`, que los ids
+se asignan en el orden de los commits (SQLite con transaction_mode
+IMMEDIATE). Con otra configuración el monitor lo advierte al arrancar y un
+cambio confirmado fuera de orden se toma en la siguiente carga completa.
+Las entradas del heap de un ticket que cambió quedan viejas y se descartan
+al salir.
+
+Cada cruce se registra en `AlertaSLA`, con restricción única por ticket,
+umbral y vencimiento, antes de crear las notificaciones: un cruce se avisa
+una sola vez aunque el monitor se reinicie o haya dos corriendo. Los que se
+cruzaron con el monitor detenido se avisan al arrancar.
+
+Se ejecuta con `python manage.py monitor_sla`.
+
+`recalcular_plazos()` rehace `sla_deadline` / `sla_warning_at` de los tickets
+abiertos por lotes, por ejemplo al cambiar la jornada o los feriados
+(`python manage.py recalcular_sla`). Al cambiar `Prioridad.sla_horas` se
+registra una `PoliticaSLA` nueva y, después del commit, un hilo aparte la
+aplica a los tickets abiertos de esa prioridad con el mismo recálculo por
+lotes. Las que queden pendientes tras un reinicio las retoma
+`recalcular_sla`.
+"""
+import heapq
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts.models import Usuario
+from notifications.models import EventoCritico, Notificacion
+from . import eventos, sincronizacion
+from .models import AlertaSLA, AsignacionTicket, CambioSincronizacion, PoliticaSLA, Ticket, plazos_sla
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ("pk", "titulo", "sla_warning_at", "sla_deadline", "fecha_cierre")
+LOTE = 2000
+
+
+# Un solo hilo: las políticas se aplican en orden y no compiten entre sí
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="politicas_sla")
+
+
+def recalcular_plazos(tickets=None, lote=LOTE, politica=None):
+    """
+    Recalcula los plazos de los tickets abiertos de `tickets` (por defecto,
+    todos) y guarda solo los que cambiaron, un `bulk_update` por lote. Con
+    `politica` (PoliticaSLA) además les aplica sus horas y su versión.
+    Devuelve (revisados, actualizados).
+    """
+    tickets = Ticket.objects.all() if tickets is None else tickets
+    abiertos = tickets.filter(fecha_cierre__isnull=True).order_by("pk")
+    campos = ["sla_horas_objetivo", "sla_deadline", "sla_warning_at", "sla_version"]
+    revisados = actualizados = 0
+    ultimo = 0
+    while True:
+        cambiados = []
+        with transaction.atomic(), sincronizacion.en_lote() as solicitantes:
+            filas = list(
+                abiertos.filter(pk__gt=ultimo).values_list("pk", "solicitante_id", "fecha_creacion", *campos)[:lote]
+            )
+            if not filas:
+                return revisados, actualizados
+            ultimo = filas[-1][0]
+            revisados += len(filas)
+            ahora = timezone.now()
+            solicitantes.update((pk, solicitante) for pk, solicitante, *_ in filas)
+
+            for pk, _, creacion, *antes in filas:
+                horas, version = antes[0], antes[3]
+                if politica is not None:
+                    horas, version = politica.sla_horas, politica.version
+                despues = [horas, *plazos_sla(creacion, horas), version]
+                cambios = {c: [a, d] for c, a, d in zip(campos, antes, despues) if a != d}
+                if cambios:
+                    cambiados.append(Ticket(pk=pk, fecha_actualizacion=ahora, **dict(zip(campos, despues))))
+                    eventos.registrar(pk, cambios)
+            # Campos derivados: no suben `version`, no es una edición del ticket,
+            # pero sí `fecha_actualizacion`, que invalida los ETag de la API
+            Ticket.objects.bulk_update(cambiados, [*campos, "fecha_actualizacion"])
+        actualizados += len(cambiados)
+
+
+def registrar_politica(prioridad, creada=False):
+    """
+    Registra la versión vigente del SLA de `prioridad`. Si no es nueva,
+    encola su aplicación a los tickets abiertos para después del commit.
+    """
+    politica = PoliticaSLA.objects.create(
+        prioridad=prioridad,
+        version=prioridad.version_sla,
+        sla_horas=prioridad.sla_horas,
+        **({"aplicada_en": timezone.now(), "tickets_actualizados": 0} if creada else {}),
+    )
+    if not creada:
+        transaction.on_commit(lambda: _executor.submit(_aplicar_seguro, politica.pk))
+    return politica
+
+
+def _aplicar_seguro(politica_id):
+    try:
+        aplicar_politica(politica_id)
+    except Exception:
+        logger.exception("Falló la política de SLA %s; recalcular_sla la retomará", politica_id)
+    finally:
+        close_old_connections()
+
+
+def aplicar_politica(politica_id, lote=LOTE):
+    """
+    Aplica una política pendiente a los tickets abiertos de su prioridad que
+    no la tengan. Guarda y devuelve cuántos cambiaron (None si no estaba
+    pendiente).
+    """
+    politica = (
+        PoliticaSLA.objects.select_related("prioridad")
+        .filter(pk=politica_id, aplicada_en__isnull=True).first()
+    )
+    if politica is None:
+        return None
+    actualizados = 0
+    # Si ya hay una versión más nueva, es esa la que recalcula los tickets
+    if politica.version == politica.prioridad.version_sla:
+        tickets = Ticket.objects.filter(prioridad_id=politica.prioridad_id).exclude(sla_version=politica.version)
+        _, actualizados = recalcular_plazos(tickets, lote, politica=politica)
+    PoliticaSLA.objects.filter(pk=politica.pk).update(
+        aplicada_en=timezone.now(), tickets_actualizados=actualizados,
+    )
+    logger.info("Política de SLA %s aplicada a %s tickets abiertos", politica, actualizados)
+    return actualizados
+
+
+def aplicar_pendientes(lote=LOTE):
+    """Aplica las políticas pendientes, en orden. Devuelve [(política, actualizados)]."""
+    pendientes = PoliticaSLA.objects.filter(aplicada_en__isnull=True).select_related("prioridad").order_by("pk")
+    return [(politica, aplicar_politica(politica.pk, lote)) for politica in pendientes]
+
+
+def orden_de_commit():
+    """Si los ids de la secuencia se asignan en el orden de los commits."""
+    conexion = connections["default"]
+    modo = conexion.settings_dict.get("OPTIONS", {}).get("transaction_mode") or ""
+    return conexion.vendor == "sqlite" and modo.upper() == "IMMEDIATE"
+
+
+class MonitorSLA:
+    def __init__(self):
+        self.heap = []  # (momento, ticket_id, tipo, vencimiento)
+        self.vencimientos = {}  # ticket_id -> vencimiento vigente
+        self.titulos = {}
+        self.ultimo_cambio = 0
+
+    # ---------------- Carga ----------------
+
+    def cargar(self):
+        """Carga completa: todos los tickets abiertos con SLA."""
+        self.heap.clear()
+        self.vencimientos.clear()
+        self.ultimo_cambio = CambioSincronizacion.objects.aggregate(ultimo=Max("pk"))["ultimo"] or 0
+        abiertos = Ticket.objects.filter(fecha_cierre__isnull=True, sla_deadline__isnull=False)
+        self._actualizar(abiertos.values_list(*CAMPOS).iterator(chunk_size=2000))
+
+    def refrescar(self):
+        """Relee solo los tickets con cambios nuevos. Devuelve cuántos."""
+        nuevos = list(
+            CambioSincronizacion.objects
+            .filter(pk__gt=self.ultimo_cambio, recurso=CambioSincronizacion.RECURSO_TICKET)
+            .order_by("pk").values_list("pk", "ticket_id")
+        )
+        if not nuevos:
+            return 0
+        self.ultimo_cambio = nuevos[-1][0]
+        ids = {ticket_id for _, ticket_id in nuevos}
+        filas = list(Ticket.objects.filter(pk__in=ids).values_list(*CAMPOS))
+        for ticket_id in ids - {fila[0] for fila in filas}:
+            self.vencimientos.pop(ticket_id, None)  # Eliminado
+        self._actualizar(filas)
+        return len(ids)
+
+    def _actualizar(self, filas):
+        pendientes = []
+        for ticket_id, titulo, advertencia, vence, fecha_cierre in filas:
+            if vence is None or fecha_cierre is not None:
+                self.vencimientos.pop(ticket_id, None)
+            elif self.vencimientos.get(ticket_id) != vence:
+                self.vencimientos[ticket_id] = vence
+                self.titulos[ticket_id] = titulo
+                pendientes.append((ticket_id, advertencia, vence))
+
+        for i in range(0, len(pendientes), 2000):
+            lote = pendientes[i:i + 2000]
+            avisadas = set(
+                AlertaSLA.objects.filter(ticket_id__in=[p[0] for p in lote])
+                .values_list("ticket_id", "tipo", "vencimiento")
+            )
+            for ticket_id, advertencia, vence in lote:
+                for momento, tipo in ((advertencia, AlertaSLA.TIPO_ADVERTENCIA), (vence, AlertaSLA.TIPO_VENCIDO)):
+                    if (ticket_id, tipo, vence) not in avisadas:
+                        heapq.heappush(self.heap, (momento, ticket_id, tipo, vence))
+
+    # ---------------- Eventos ----------------
+
+    def _vigente(self, entrada):
+        return self.vencimientos.get(entrada[1]) == entrada[3]
+
+    def proximo(self):
+        """Momento del próximo cruce vigente, o None."""
+        while self.heap and not self._vigente(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def procesar(self, ahora=None):
+        """Avisa los cruces hasta `ahora`. Devuelve cuántos avisó."""
+        ahora = ahora or timezone.now()
+        avisados = 0
+        while (momento := self.proximo()) is not None and momento <= ahora:
+            _, ticket_id, tipo, vence = heapq.heappop(self.heap)
+            if tipo == AlertaSLA.TIPO_ADVERTENCIA and vence <= ahora:
+                continue  # Se cruzó también el vencimiento: basta con ese aviso
+            if self._avisar(ticket_id, tipo, vence, ahora):
+                avisados += 1
+        return avisados
+
+    def _avisar(self, ticket_id, tipo, vence, ahora):
+        try:
+            with transaction.atomic():
+                AlertaSLA.objects.create(ticket_id=ticket_id, tipo=tipo, vencimiento=vence, fecha=ahora)
+                self._notificar(ticket_id, tipo, vence, ahora)
+        except IntegrityError:
+            return False  # Otro monitor ya lo avisó
+        return True
+
+    def _notificar(self, ticket_id, tipo, vence, ahora):
+        titulo = self.titulos.get(ticket_id, "")
+        tecnicos = set(
+            AsignacionTicket.objects.filter(ticket_id=ticket_id, activo=True)
+            .values_list("tecnico_asignado__usuario_id", flat=True)
+        )
+        destinos = set(tecnicos)
+        if tipo == AlertaSLA.TIPO_VENCIDO or not tecnicos:
+            destinos |= set(
+                Usuario.objects.filter(rol__nombre_rol="ADMIN", is_active=True).values_list("pk", flat=True)
+            )
+
+        limite = timezone.localtime(vence).strftime("%d-%m-%Y %H:%M")
+        if tipo == AlertaSLA.TIPO_VENCIDO:
+            titulo_aviso = f"SLA vencido: Ticket #{ticket_id}"
+            mensaje = f"El ticket «{titulo}» venció su SLA ({limite})."
+        else:
+            titulo_aviso = f"SLA por vencer: Ticket #{ticket_id}"
+            mensaje = f"El ticket «{titulo}» vence su SLA el {limite}."
+
+        Notificacion.objects.bulk_create([
+            Notificacion(
+                ticket_id=ticket_id,
+                usuario_destino_id=destino,
+                tipo_notificacion=f"sla_{tipo.lower()}",
+                titulo=titulo_aviso,
+                mensaje=mensaje,
+                canal_notificacion="portal",
+            )
+            for destino in destinos
+        ])
+        if tipo == AlertaSLA.TIPO_VENCIDO:
+            EventoCritico.objects.create(
+                tipo_evento="SLA vencido",
+                descripcion=f"Ticket #{ticket_id} «{titulo}» venció su SLA ({limite}).",
+                fecha_deteccion=ahora,
+                nivel_gravedad="alta",
+            )
+
+    # ---------------- Bucle ----------------
+
+    def ejecutar(self, intervalo=30, recarga=6 * 3600, dormir=time.sleep, vueltas=None):
+        """
+        Duerme hasta el próximo cruce, o como mucho `intervalo` segundos
+        para tomar cambios. Cada `recarga` segundos hace una carga completa
+        (toma cambios que no dejan evento, como el SLA de una prioridad).
+        """
+        if not orden_de_commit():
+            logger.warning(
+                "La base no asigna los ids en el orden de los commits (transaction_mode IMMEDIATE): "
+                "un cambio confirmado fuera de orden se toma en la carga completa, cada %s s.", recarga,
+            )
+        self.cargar()
+        ultima_carga = time.monotonic()
+        vuelta = 0
+        while vueltas is None or vuelta < vueltas:
+            vuelta += 1
+            if time.monotonic() - ultima_carga > recarga:
+                self.cargar()
+                ultima_carga = time.monotonic()
+            else:
+                self.refrescar()
+            self.procesar()
+
+            espera = intervalo
+            proximo = self.proximo()
+            if proximo is not None:
+                espera = min(espera, max(0, (proximo - timezone.now()).total_seconds()))
+            dormir(espera)
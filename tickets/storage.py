@@ -0,0 +1,126 @@
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+CARPETA_BLOBS = "blobs"
+
+
+def nombre_blob(sha256: str, extension: str) -> str:
+    """Ruta relativa a MEDIA_ROOT de un blob: blobs/ab/cd/<sha256>.<ext>"""
+    return f"{CARPETA_BLOBS}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def es_blob(nombre: str) -> bool:
+    return bool(nombre) and nombre.startswith(f"{CARPETA_BLOBS}/")
+
+
+class AlmacenamientoDeduplicado(FileSystemStorage):
+    """
+    Storage direccionado por contenido para los adjuntos.
+
+    Cada subida se escribe por chunks a un temporal mientras se calcula su
+    SHA-256; si ya existe un blob con ese hash se descarta el temporal y se
+    devuelve la ruta existente. `BlobAdjunto.referencias` lleva la cuenta de
+    cuántos adjuntos lo usan y `delete()` solo borra el archivo en la última.
+    """
+
+    def _save(self, name, content):
+        carpeta_tmp = self.path(os.path.join(CARPETA_BLOBS, "tmp"))
+        os.makedirs(carpeta_tmp, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        tamano = 0
+        fd, temporal = tempfile.mkstemp(dir=carpeta_tmp)
+        try:
+            with os.fdopen(fd, "wb") as destino:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    destino.write(chunk)
+                    tamano += len(chunk)
+
+            return self.importar(temporal, name, sha256.hexdigest(), tamano)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def importar(self, temporal, name, sha256, tamano):
+        """
+        Mueve un archivo local ya hasheado (mismo filesystem que MEDIA_ROOT)
+        a su blob, o lo descarta si el blob ya existe. Lo usan `_save()` y el
+        ensamblado de subidas por chunks, que calcula el hash al concatenar.
+
+        La referencia se suma antes de mirar el disco y en la transacción del
+        llamador: un delete() concurrente de la última referencia espera el
+        lock, y si ganó antes, el blob se repone desde el temporal. Si la
+        transacción se revierte, la referencia se revierte con ella.
+        """
+        nombre = nombre_blob(sha256, os.path.splitext(name)[1])
+        ruta = self.path(nombre)
+        try:
+            with transaction.atomic():
+                self.sumar_referencia(nombre, sha256, tamano)
+                if os.path.exists(ruta):
+                    # Renueva el mtime: gc_media no borra blobs dentro del período de gracia
+                    os.utime(ruta)
+                else:
+                    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                    os.replace(temporal, ruta)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(ruta, self.file_permissions_mode)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        return nombre
+
+    def sumar_referencia(self, nombre, sha256, tamano):
+        BlobAdjunto = apps.get_model("tickets", "BlobAdjunto")
+        # El UPDATE condicional toma el lock de la fila antes de tocar el archivo
+        if BlobAdjunto.objects.filter(nombre=nombre).update(referencias=F("referencias") + 1):
+            return
+        try:
+            with transaction.atomic():
+                BlobAdjunto.objects.create(nombre=nombre, sha256=sha256, tamano=tamano, referencias=1)
+        except IntegrityError:
+            # Otro proceso creó la fila entre el UPDATE y el INSERT
+            BlobAdjunto.objects.filter(nombre=nombre).update(referencias=F("referencias") + 1)
+
+    def delete(self, name):
+        if not es_blob(name):
+            super().delete(name)
+            self.borrar_derivados(name)
+            return
+        # Si la transacción del llamador se revierte, el adjunto sigue usando el blob
+        transaction.on_commit(lambda: self.liberar(name))
+
+    def liberar(self, name):
+        """Resta una referencia y, si era la última, borra la fila y el archivo."""
+        BlobAdjunto = apps.get_model("tickets", "BlobAdjunto")
+        with transaction.atomic():
+            BlobAdjunto.objects.filter(nombre=name, referencias__gt=0).update(
+                referencias=F("referencias") - 1
+            )
+            if BlobAdjunto.objects.filter(nombre=name, referencias__gt=0).exists():
+                return
+            BlobAdjunto.objects.filter(nombre=name).delete()
+            # Todavía con el lock: un importar() que llegue después no ve el archivo y lo repone
+            super().delete(name)
+            self.borrar_derivados(name)
+
+    def borrar_derivados(self, name):
+        from .miniaturas import TAMANOS, nombre_derivado
+
+        for tamano in TAMANOS:
+            super().delete(nombre_derivado(name, tamano))
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre final lo decide el hash en _save(); no hace falta
+        # buscar un nombre libre con sufijos aleatorios.
+        return name
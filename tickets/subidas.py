@@ -0,0 +1,242 @@
+"""
+Subidas reanudables por chunks (ver `SubidaFragmentada`).
+
+Flujo: `iniciar()` → `guardar_chunk()` por cada número (en cualquier orden,
+reintentables) → `completar()`, que concatena los chunks verificando tamaño y
+SHA-256 y entrega el resultado al storage deduplicado. El nombre resultante se
+adjunta con `tomar_subida()` al crear el ticket, comentario o archivo FAQ.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.transaction import TransactionManagementError
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from accounts.models import Usuario
+from .models import SubidaFragmentada
+
+CARPETA_SUBIDAS = "subidas"
+TAMANO_LECTURA = 64 * 1024
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ErrorSubida(Exception):
+    """Error de validación de una subida; `status` es el código HTTP sugerido."""
+
+    def __init__(self, mensaje, status=400, **extra):
+        super().__init__(mensaje)
+        self.status = status
+        self.extra = extra
+
+
+def tamano_chunk() -> int:
+    return getattr(settings, "SUBIDAS_TAMANO_CHUNK", 5 * 1024 * 1024)
+
+
+def tamano_maximo() -> int:
+    return getattr(settings, "SUBIDAS_TAMANO_MAXIMO", 500 * 1024 * 1024)
+
+
+def maximo_abiertas() -> int:
+    return getattr(settings, "SUBIDAS_MAXIMO_ABIERTAS", 10)
+
+
+def bytes_abiertos() -> int:
+    return getattr(settings, "SUBIDAS_BYTES_ABIERTOS", 2 * 1024 * 1024 * 1024)
+
+
+def carpeta(subida) -> str:
+    return default_storage.path(os.path.join(CARPETA_SUBIDAS, str(subida.pk)))
+
+
+def _ruta_chunk(subida, numero):
+    return os.path.join(carpeta(subida), f"{numero:06d}.part")
+
+
+def chunks_recibidos(subida) -> list:
+    try:
+        nombres = os.listdir(carpeta(subida))
+    except FileNotFoundError:
+        return []
+    return sorted(int(n[:-5]) for n in nombres if n.endswith(".part"))
+
+
+def _tamano_esperado(subida, numero):
+    if numero == subida.total_chunks - 1:
+        return subida.tamano_total - numero * subida.tamano_chunk
+    return subida.tamano_chunk
+
+
+def iniciar(usuario, nombre_archivo, tamano_total, sha256=""):
+    nombre_archivo = get_valid_filename(os.path.basename(nombre_archivo or ""))
+    sha256 = (sha256 or "").lower()
+    if not nombre_archivo:
+        raise ErrorSubida("Falta el nombre del archivo.")
+    if tamano_total <= 0 or tamano_total > tamano_maximo():
+        raise ErrorSubida(f"El archivo debe pesar entre 1 byte y {tamano_maximo()} bytes.")
+    if sha256 and not SHA256_RE.match(sha256):
+        raise ErrorSubida("sha256 debe ser un hash hexadecimal de 64 caracteres.")
+
+    with transaction.atomic():
+        # El lock del usuario serializa sus iniciar() concurrentes
+        Usuario.objects.select_for_update().filter(pk=usuario.pk).first()
+        abiertas = SubidaFragmentada.objects.filter(usuario=usuario).aggregate(
+            cantidad=Count("pk"), bytes=Sum("tamano_total"),
+        )
+        if abiertas["cantidad"] >= maximo_abiertas():
+            raise ErrorSubida(
+                f"Tienes {abiertas['cantidad']} subidas abiertas; completa o cancela alguna antes de iniciar otra.",
+                status=429,
+            )
+        if (abiertas["bytes"] or 0) + tamano_total > bytes_abiertos():
+            raise ErrorSubida(
+                f"Tus subidas abiertas no pueden sumar más de {bytes_abiertos()} bytes.", status=429,
+            )
+        return SubidaFragmentada.objects.create(
+            usuario=usuario,
+            nombre_archivo=nombre_archivo,
+            tamano_total=tamano_total,
+            tamano_chunk=tamano_chunk(),
+            sha256=sha256,
+        )
+
+
+def guardar_chunk(subida, numero, stream):
+    """
+    Escribe el chunk `numero` leyendo `stream` por bloques. Se escribe a un
+    temporal y se renombra, así un chunk cortado a la mitad nunca cuenta como
+    recibido y el cliente puede reintentarlo.
+    """
+    if subida.completada:
+        raise ErrorSubida("La subida ya fue completada.", status=409)
+    if not 0 <= numero < subida.total_chunks:
+        raise ErrorSubida(f"El chunk debe estar entre 0 y {subida.total_chunks - 1}.")
+
+    esperado = _tamano_esperado(subida, numero)
+    os.makedirs(carpeta(subida), exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=carpeta(subida), suffix=".tmp")
+    escrito = 0
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            while bloque := stream.read(TAMANO_LECTURA):
+                escrito += len(bloque)
+                if escrito > esperado:
+                    break
+                destino.write(bloque)
+        if escrito != esperado:
+            raise ErrorSubida(f"El chunk {numero} debe medir {esperado} bytes.")
+        os.replace(temporal, _ruta_chunk(subida, numero))
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def completar(subida):
+    """Ensambla los chunks, verifica el checksum y guarda el blob. Idempotente."""
+    if subida.completada:
+        return subida
+
+    recibidos = set(chunks_recibidos(subida))
+    faltantes = [n for n in range(subida.total_chunks) if n not in recibidos]
+    if faltantes:
+        raise ErrorSubida("Faltan chunks por subir.", status=409, faltantes=faltantes)
+
+    sha256 = hashlib.sha256()
+    tamano = 0
+    fd, temporal = tempfile.mkstemp(dir=carpeta(subida), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            for numero in range(subida.total_chunks):
+                with open(_ruta_chunk(subida, numero), "rb") as origen:
+                    while bloque := origen.read(TAMANO_LECTURA):
+                        sha256.update(bloque)
+                        destino.write(bloque)
+                        tamano += len(bloque)
+
+        if tamano != subida.tamano_total or (subida.sha256 and sha256.hexdigest() != subida.sha256):
+            # Algún chunk llegó corrupto: se descartan todos y el cliente reinicia
+            descartar_chunks(subida)
+            raise ErrorSubida("El checksum del archivo ensamblado no coincide.", status=422)
+
+        with transaction.atomic():
+            # Otro completar() concurrente pudo ganar mientras se ensamblaba:
+            # con la fila bloqueada, solo uno toma la referencia al blob
+            actual = SubidaFragmentada.objects.select_for_update().filter(pk=subida.pk).first()
+            if actual is None:
+                raise ErrorSubida("La subida fue cancelada.", status=404)
+            if actual.completada:
+                subida.archivo, subida.sha256 = actual.archivo, actual.sha256
+                return subida
+            if hasattr(default_storage, "importar"):
+                nombre = default_storage.importar(temporal, subida.nombre_archivo, sha256.hexdigest(), tamano)
+            else:
+                with open(temporal, "rb") as f:
+                    nombre = default_storage.save(subida.nombre_archivo, File(f))
+            subida.archivo = nombre
+            subida.sha256 = sha256.hexdigest()
+            subida.save(update_fields=["archivo", "sha256"])
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    descartar_chunks(subida)
+    return subida
+
+
+def descartar_chunks(subida):
+    shutil.rmtree(carpeta(subida), ignore_errors=True)
+
+
+def tomar_subida(usuario, subida_id):
+    """
+    Devuelve el nombre en el storage de una subida completada de `usuario` y
+    la da por consumida: la referencia del blob pasa al adjunto que lo guarde.
+    None si el id no es válido, no es del usuario o no está completa.
+
+    Debe llamarse en la misma transacción que guarda el adjunto: si guardarlo
+    falla, la subida vuelve a existir y se puede reintentar.
+    """
+    if not subida_id:
+        return None
+    if not transaction.get_connection().in_atomic_block:
+        raise TransactionManagementError("tomar_subida() debe llamarse dentro de transaction.atomic().")
+    try:
+        subida = SubidaFragmentada.objects.select_for_update().get(pk=subida_id, usuario=usuario)
+    except (SubidaFragmentada.DoesNotExist, ValidationError):
+        return None
+    if not subida.completada:
+        return None
+    nombre = subida.archivo
+    subida.delete()
+    return nombre
+
+
+def limpiar_vencidas(horas=None):
+    """
+    Borra las subidas con más de `horas` (SUBIDAS_EXPIRACION_HORAS): sus
+    chunks y, si alcanzaron a completarse sin que nadie las tomara, la
+    referencia al blob. Devuelve cuántas se borraron.
+    """
+    horas = horas if horas is not None else getattr(settings, "SUBIDAS_EXPIRACION_HORAS", 24)
+    limite = timezone.now() - timedelta(hours=horas)
+    vencidas = SubidaFragmentada.objects.filter(fecha_creacion__lt=limite)
+
+    total = 0
+    for subida in vencidas.iterator():
+        descartar_chunks(subida)
+        if subida.archivo:
+            default_storage.delete(subida.archivo)
+        subida.delete()
+        total += 1
+    return total
@@ -0,0 +1,35 @@
+from django import template
+
+from tickets.descargas import url_adjunto
+from tickets.miniaturas import es_imagen
+
+register = template.Library()
+
+
+@register.filter(name="url_adjunto")
+def url_adjunto_filter(archivo):
+    """URL de descarga con control de acceso."""
+    return url_adjunto(archivo)
+
+
+@register.filter
+def url_original(archivo_original):
+    """URL del original sin comprimir (`archivo_original` de ticket o comentario)."""
+    return url_adjunto(archivo_original) + "?original=1" if archivo_original else ""
+
+
+@register.filter
+def miniatura(archivo):
+    """URL de la miniatura (o del original mientras se genera)."""
+    return url_adjunto(archivo, "miniatura" if es_imagen(archivo.name) else None)
+
+
+@register.filter
+def preview(archivo):
+    """URL del preview mediano (o del original mientras se genera)."""
+    return url_adjunto(archivo, "preview" if es_imagen(archivo.name) else None)
+
+
+@register.filter(name="es_imagen")
+def es_imagen_filter(archivo):
+    return bool(archivo) and es_imagen(archivo.name)
@@ -1,3 +1,1820 @@
-from django.test import TestCase
+import contextlib
+import hashlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import Usuario, Rol, Tecnico
+from config import db_router
+from knowledge_base.models import ArticuloFAQ, ArchivoFAQ, VotoFAQ
+from notifications.models import EventoCritico, Notificacion
+from .models import (
+    Ticket,
+    Categoria,
+    Prioridad,
+    EstadoTicket,
+    AreaAfectada,
+    AsignacionTicket,
+    HistorialTicket,
+    ComentarioTicket,
+    CalificacionTicket,
+    BlobAdjunto,
+    SubidaFragmentada,
+    EventoTicket,
+    AlertaSLA,
+    Feriado,
+    PoliticaSLA,
+    CambioSincronizacion,
+    plazos_sla,
+)
+from . import eventos, sincronizacion
+from .subidas import completar, tomar_subida
+from .storage import AlmacenamientoDeduplicado
+from .miniaturas import TAMANOS, generar_derivados
+from .normalizacion import procesar_adjunto
+from .eliminacion import eliminar_usuario, purgar_ticket, purgar_usuario
+from .transiciones import ErrorTransicion, estados_disponibles, transicionar
+from .concurrencia import ConflictoVersion, guardar_cambios
+from . import asignacion, sla
+from .sla import MonitorSLA, aplicar_politica, recalcular_plazos
+from . import calendario
+from .calendario import CalendarioHabil
+from .serializers import TicketListaSerializer, TicketSerializer
+from .management.commands.benchmark_sla import sumar_hora_a_hora
+
+
+HASHERS_RAPIDOS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+class PresupuestoQueriesMixin:
+    """
+    Datos sembrados para las pruebas de presupuesto de queries.
+
+    `sembrar(n)` agrega n tickets (con asignación, comentario, historial,
+    calificación y notificación), n comentarios/historial sobre `self.ticket`
+    y n artículos FAQ con archivos y votos. Las pruebas miden una vista con
+    pocos datos, siembran más y vuelven a medir: si el número de queries
+    crece con las filas hay un N+1.
+    """
+
+    TAMANO_CHICO = 2
+    TAMANO_GRANDE = 8
+
+    def setUp(self):
+        self.rol_admin = Rol.objects.create(nombre_rol="ADMIN")
+        self.rol_tecnico = Rol.objects.create(nombre_rol="TECNICO")
+        self.rol_usuario = Rol.objects.create(nombre_rol="USUARIO")
+
+        self.admin = Usuario.objects.create_user(
+            email="admin@coyahue.cl", password="clave-segura", rol=self.rol_admin
+        )
+        self.usuario_tecnico = Usuario.objects.create_user(
+            email="tecnico@coyahue.cl", password="clave-segura", rol=self.rol_tecnico
+        )
+        self.tecnico, _ = Tecnico.objects.get_or_create(usuario=self.usuario_tecnico)
+        self.usuario = Usuario.objects.create_user(
+            email="usuario@coyahue.cl", password="clave-segura", rol=self.rol_usuario
+        )
+
+        self.estado_abierto = EstadoTicket.objects.create(nombre_estado="Abierto")
+        self.estado_progreso = EstadoTicket.objects.create(nombre_estado="En Progreso")
+        self.estado_resuelto = EstadoTicket.objects.create(nombre_estado="Resuelto", es_final=True)
+        self.estado_cerrado = EstadoTicket.objects.create(nombre_estado="Cerrado", es_final=True)
+
+        self.prioridad = Prioridad.objects.create(nombre_prioridad="Alta", nivel=3, sla_horas=8)
+        self.prioridad_critica = Prioridad.objects.create(nombre_prioridad="Crítica", nivel=4, sla_horas=4)
+        self.categoria = Categoria.objects.create(nombre_categoria="Hardware")
+        self.area = AreaAfectada.objects.create(nombre_area="TI")
+
+        self.ticket = self._crear_ticket(0)
+        self.articulo = ArticuloFAQ.objects.create(
+            titulo="¿Cómo conecto la VPN?",
+            problema="No conecta",
+            solucion="Reiniciar cliente",
+            categoria=self.categoria,
+            creado_por=self.admin,
+        )
+        self._sembrados = 0
+
+    def _crear_ticket(self, i):
+        cerrado = i % 2 == 1
+        ticket = Ticket.objects.create(
+            titulo=f"Ticket {i}",
+            descripcion="Equipo no enciende",
+            solicitante=self.usuario,
+            categoria=self.categoria,
+            prioridad=self.prioridad_critica if i % 3 == 0 else self.prioridad,
+            area_afectada=self.area,
+            estado=self.estado_cerrado if cerrado else self.estado_abierto,
+            fecha_cierre=timezone.now() if cerrado else None,
+            sla_horas_objetivo=8,
+        )
+        AsignacionTicket.objects.create(ticket=ticket, tecnico_asignado=self.tecnico)
+        HistorialTicket.objects.create(
+            ticket=ticket,
+            usuario=self.usuario,
+            estado_anterior=None,
+            estado_nuevo=ticket.estado,
+            comentario="Ticket creado por el solicitante.",
+        )
+        ComentarioTicket.objects.create(
+            ticket=ticket, usuario=self.usuario_tecnico, texto="Revisando", archivo="comentarios/log.txt"
+        )
+        Notificacion.objects.create(
+            ticket=ticket,
+            usuario_destino=self.admin,
+            tipo_notificacion="creacion",
+            titulo=f"Nuevo ticket #{ticket.id}",
+            mensaje="Nuevo ticket",
+        )
+        if cerrado:
+            CalificacionTicket.objects.create(ticket=ticket, usuario=self.usuario, puntuacion=4, resuelto=True)
+        return ticket
+
+    def sembrar(self, n):
+        for i in range(self._sembrados + 1, self._sembrados + n + 1):
+            self._crear_ticket(i)
+
+            ComentarioTicket.objects.create(
+                ticket=self.ticket, usuario=self.admin, texto=f"Comentario {i}", archivo="comentarios/captura.png"
+            )
+            HistorialTicket.objects.create(
+                ticket=self.ticket,
+                usuario=self.admin,
+                estado_anterior=self.estado_abierto,
+                estado_nuevo=self.estado_progreso,
+            )
+            AsignacionTicket.objects.create(ticket=self.ticket, tecnico_asignado=self.tecnico, activo=False)
+
+            articulo = ArticuloFAQ.objects.create(
+                titulo=f"Artículo {i}",
+                problema="Problema",
+                solucion="Solución",
+                categoria=self.categoria,
+                creado_por=self.admin,
+                destacado=i % 2 == 0,
+            )
+            ArchivoFAQ.objects.create(articulo=articulo, archivo="faq_archivos/paso.png", descripcion="Paso 1")
+            ArchivoFAQ.objects.create(
+                articulo=self.articulo, archivo=f"faq_archivos/paso{i}.pdf", descripcion=f"Paso {i}", orden=i
+            )
+            VotoFAQ.objects.create(usuario=self.admin, articulo=articulo, voto="si")
+        self._sembrados += n
+
+    def contar_queries(self, hacer_request):
+        with CaptureQueriesContext(connection) as ctx:
+            response = hacer_request()
+        self.assertLess(response.status_code, 400, response.content[:500])
+        return len(ctx.captured_queries)
+
+    def assertQueriesConstantes(self, hacer_request):
+        """
+        Siembra dos tamaños de datos y falla si las queries crecen con las filas.
+        """
+        self.sembrar(self.TAMANO_CHICO)
+        chico = self.contar_queries(hacer_request)
+        self.sembrar(self.TAMANO_GRANDE - self.TAMANO_CHICO)
+        grande = self.contar_queries(hacer_request)
+        self.assertEqual(
+            chico, grande,
+            f"Las queries crecen con los datos: {chico} con {self.TAMANO_CHICO} filas, "
+            f"{grande} con {self.TAMANO_GRANDE} filas.",
+        )
+        return grande
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class TicketViewSetQueriesTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+
+    def test_list_admin(self):
+        self.api.force_authenticate(self.admin)
+        self.assertQueriesConstantes(lambda: self.api.get("/api/tickets/"))
+
+    def test_list_usuario(self):
+        self.api.force_authenticate(self.usuario)
+        self.assertQueriesConstantes(lambda: self.api.get("/api/tickets/"))
+
+    def test_retrieve(self):
+        self.api.force_authenticate(self.admin)
+        self.assertQueriesConstantes(lambda: self.api.get(f"/api/tickets/{self.ticket.id}/"))
+
+    def test_asignar(self):
+        self.api.force_authenticate(self.admin)
+        self.assertQueriesConstantes(lambda: self.api.post(
+            f"/api/tickets/{self.ticket.id}/asignar/", {"tecnico_id": self.tecnico.id}, format="json"
+        ))
+
+    def test_cambiar_estado(self):
+        self.api.force_authenticate(self.admin)
+        # Alterna el estado: repetir el mismo no es una transición
+        estados = iter([self.estado_progreso, self.estado_abierto])
+        self.assertQueriesConstantes(lambda: self.api.post(
+            f"/api/tickets/{self.ticket.id}/cambiar_estado/", {"estado_id": next(estados).id}, format="json"
+        ))
+
+
+class AlmacenamientoDeduplicadoTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.storage = AlmacenamientoDeduplicado(location=self.media.name)
+
+    def test_mismo_contenido_se_guarda_una_vez(self):
+        a = self.storage.save("comentarios/2025/12/captura.png", ContentFile(b"png" * 1000))
+        b = self.storage.save("tickets_adjuntos/otra.png", ContentFile(b"png" * 1000))
+
+        self.assertEqual(a, b)
+        self.assertTrue(a.startswith("blobs/") and a.endswith(".png"))
+        self.assertEqual(BlobAdjunto.objects.get(nombre=a).referencias, 2)
+
+    def test_delete_borra_el_archivo_con_la_ultima_referencia(self):
+        nombre = self.storage.save("a.pdf", ContentFile(b"%PDF"))
+        self.storage.save("b.pdf", ContentFile(b"%PDF"))
+
+        # La referencia se libera al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(nombre)
+        self.assertTrue(self.storage.exists(nombre))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(nombre)
+        self.assertFalse(self.storage.exists(nombre))
+        self.assertFalse(BlobAdjunto.objects.filter(nombre=nombre).exists())
+
+    def test_delete_revertido_conserva_la_referencia(self):
+        nombre = self.storage.save("a.pdf", ContentFile(b"%PDF"))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.storage.delete(nombre)
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertTrue(self.storage.exists(nombre))
+        self.assertEqual(BlobAdjunto.objects.get(nombre=nombre).referencias, 1)
+
+    def test_importar_repone_un_blob_borrado(self):
+        nombre = self.storage.save("a.pdf", ContentFile(b"%PDF"))
+        # Estado tras una carrera: la fila sigue, pero el archivo ya no está
+        os.remove(self.storage.path(nombre))
+
+        self.assertEqual(self.storage.save("b.pdf", ContentFile(b"%PDF")), nombre)
+        self.assertTrue(self.storage.exists(nombre))
+        self.assertEqual(BlobAdjunto.objects.get(nombre=nombre).referencias, 2)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class DescargaAdjuntosTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=media.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        rol_usuario = Rol.objects.create(nombre_rol="USUARIO")
+        self.usuario = Usuario.objects.create_user(email="u@coyahue.cl", password="x", rol=rol_usuario)
+        self.otro = Usuario.objects.create_user(email="otro@coyahue.cl", password="x", rol=rol_usuario)
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (2400, 1600), "red").save(buffer, "PNG")
+        self.ticket = Ticket.objects.create(
+            titulo="Pantalla",
+            descripcion="Captura",
+            solicitante=self.usuario,
+            area_afectada=AreaAfectada.objects.create(nombre_area="TI"),
+            estado=EstadoTicket.objects.create(nombre_estado="Abierto"),
+            archivo=ContentFile(buffer.getvalue(), name="captura.png"),
+        )
+        self.url = reverse("adjunto_descargar", kwargs={"tipo": "ticket", "pk": self.ticket.pk})
+        self.tamano = self.ticket.archivo.size
+
+    def test_solo_el_solicitante_ve_el_adjunto(self):
+        self.client.force_login(self.otro)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.force_login(self.usuario)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertTrue(response["Content-Disposition"].startswith("inline"))
+
+    def test_range_y_etag(self):
+        self.client.force_login(self.usuario)
+        etag = self.client.get(self.url)["ETag"]
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{self.tamano}")
+        self.assertEqual(len(b"".join(response.streaming_content)), 10)
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={self.tamano}-")
+        self.assertEqual(response.status_code, 416)
+
+        # If-Range exige comparación fuerte: un ETag débil entrega el archivo completo
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE=f"W/{etag}")
+        self.assertEqual(response.status_code, 200)
+
+    def test_svg_se_descarga_como_adjunto(self):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+        self.ticket.archivo = ContentFile(svg, name="dibujo.svg")
+        self.ticket.save()
+        self.client.force_login(self.usuario)
+
+        response = self.client.get(self.url)
+        self.assertTrue(response["Content-Disposition"].startswith("attachment"))
+        self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+        self.assertEqual(response["Content-Security-Policy"], "sandbox")
+
+    @override_settings(ADJUNTOS_SENDFILE="x-accel")
+    def test_x_accel_redirect(self):
+        self.client.force_login(self.usuario)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], "/media-protegida/" + self.ticket.archivo.name)
+
+    def test_zip_en_streaming_con_todos_los_adjuntos(self):
+        ComentarioTicket.objects.create(
+            ticket=self.ticket, usuario=self.usuario, texto="log",
+            archivo=ContentFile(b"linea de log\n" * 500, name="log.txt"),
+        )
+        self.client.force_login(self.usuario)
+
+        response = self.client.get(reverse("ticket_adjuntos_zip", args=[self.ticket.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as zf:
+            entradas = {i.filename: i for i in zf.infolist()}
+            self.assertIsNone(zf.testzip())
+        png = entradas[f"ticket-{self.ticket.pk}.png"]
+        log = next(i for n, i in entradas.items() if n.startswith("comentarios/"))
+        self.assertEqual(png.compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(log.compress_type, zipfile.ZIP_DEFLATED)
+
+        self.client.force_login(self.otro)
+        response = self.client.get(reverse("ticket_adjuntos_zip", args=[self.ticket.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_derivado_redirige_al_original_hasta_que_existe(self):
+        self.client.force_login(self.usuario)
+
+        with mock.patch("tickets.views.encolar_derivados") as encolar:
+            response = self.client.get(self.url, {"tamano": "preview"})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        encolar.assert_called_once_with(self.ticket.archivo.name)
+
+        generar_derivados(self.ticket.archivo.name)
+        response = self.client.get(self.url, {"tamano": "miniatura"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as miniatura:
+            self.assertEqual(max(miniatura.size), TAMANOS["miniatura"])
+
+
+class SubidaFragmentadaTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=media.name, SUBIDAS_TAMANO_CHUNK=4)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        rol_usuario = Rol.objects.create(nombre_rol="USUARIO")
+        self.usuario = Usuario.objects.create_user(email="u@coyahue.cl", password="x", rol=rol_usuario)
+        self.otro = Usuario.objects.create_user(email="otro@coyahue.cl", password="x", rol=rol_usuario)
+        self.ticket = Ticket.objects.create(
+            titulo="Logs",
+            descripcion="Adjunto los logs",
+            solicitante=self.usuario,
+            area_afectada=AreaAfectada.objects.create(nombre_area="TI"),
+            estado=EstadoTicket.objects.create(nombre_estado="Abierto"),
+        )
+        self.contenido = b"0123456789"
+        self.client.force_login(self.usuario)
+
+    def _iniciar(self, **extra):
+        response = self.client.post(
+            reverse("subida-list"),
+            {"nombre_archivo": "logs.txt", "tamano_total": len(self.contenido), **extra},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def _chunk(self, subida_id, numero, datos):
+        return self.client.put(
+            reverse("subida-chunk", args=[subida_id, numero]),
+            datos,
+            content_type="application/octet-stream",
+        )
+
+    def test_subida_reanudable_y_adjunta_al_comentario(self):
+        subida = self._iniciar(sha256=hashlib.sha256(self.contenido).hexdigest())
+        self.assertEqual(subida["total_chunks"], 3)
+
+        # Chunks fuera de orden; el último es más corto
+        self.assertEqual(self._chunk(subida["id"], 2, b"89").status_code, 200)
+        self.assertEqual(self._chunk(subida["id"], 0, b"0123").status_code, 200)
+        self.assertEqual(self._chunk(subida["id"], 1, b"45").status_code, 400)
+
+        estado = self.client.get(reverse("subida-detail", args=[subida["id"]])).json()
+        self.assertEqual(estado["recibidos"], [0, 2])
+        response = self.client.post(reverse("subida-completar", args=[subida["id"]]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["faltantes"], [1])
+
+        self._chunk(subida["id"], 1, b"4567")
+        response = self.client.post(reverse("subida-completar", args=[subida["id"]]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["completada"])
+
+        self.client.post(
+            reverse("ticket_usuario_detalle", args=[self.ticket.pk]),
+            {"comentario_texto": "Van los logs", "subida_id": subida["id"]},
+        )
+        comentario = ComentarioTicket.objects.get(ticket=self.ticket)
+        self.assertTrue(comentario.archivo.name.startswith("blobs/"))
+        with comentario.archivo.open("rb") as f:
+            self.assertEqual(f.read(), self.contenido)
+        self.assertEqual(BlobAdjunto.objects.get(nombre=comentario.archivo.name).referencias, 1)
+        self.assertFalse(SubidaFragmentada.objects.exists())
+
+    def test_checksum_incorrecto_descarta_los_chunks(self):
+        subida = self._iniciar(sha256="0" * 64)
+        for numero, datos in enumerate([b"0123", b"4567", b"89"]):
+            self._chunk(subida["id"], numero, datos)
+
+        response = self.client.post(reverse("subida-completar", args=[subida["id"]]))
+        self.assertEqual(response.status_code, 422)
+        estado = self.client.get(reverse("subida-detail", args=[subida["id"]])).json()
+        self.assertEqual(estado["recibidos"], [])
+        self.assertFalse(BlobAdjunto.objects.exists())
+
+    def test_subida_de_otro_usuario(self):
+        subida = self._iniciar()
+
+        self.client.force_login(self.otro)
+        self.assertEqual(self._chunk(subida["id"], 0, b"0123").status_code, 404)
+        self.client.post(reverse("ticket_usuario_crear"), {
+            "titulo": "Ajeno",
+            "descripcion": "Usa la subida de otro",
+            "area_afectada": self.ticket.area_afectada_id,
+            "subida_id": subida["id"],
+        })
+        self.assertFalse(Ticket.objects.get(titulo="Ajeno").archivo)
+        self.assertTrue(SubidaFragmentada.objects.filter(pk=subida["id"]).exists())
+
+    def _completa(self):
+        subida = self._iniciar()
+        for numero, datos in enumerate([b"0123", b"4567", b"89"]):
+            self._chunk(subida["id"], numero, datos)
+        return SubidaFragmentada.objects.get(pk=subida["id"])
+
+    def test_completar_concurrente_toma_una_sola_referencia(self):
+        subida = self._completa()
+        otra = SubidaFragmentada.objects.get(pk=subida.pk)
+        # Los dos ensamblan antes de que el primero descarte los chunks
+        with mock.patch("tickets.subidas.descartar_chunks"):
+            completar(subida)
+            completar(otra)
+        self.assertEqual(otra.archivo, subida.archivo)
+        self.assertEqual(BlobAdjunto.objects.get(nombre=subida.archivo).referencias, 1)
+
+    def test_tomar_subida_se_revierte_con_el_adjunto(self):
+        subida = self._completa()
+        completar(subida)
+        try:
+            with transaction.atomic():
+                self.assertEqual(tomar_subida(self.usuario, subida.pk), subida.archivo)
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertTrue(SubidaFragmentada.objects.filter(pk=subida.pk).exists())
+
+    @override_settings(SUBIDAS_MAXIMO_ABIERTAS=2, SUBIDAS_BYTES_ABIERTOS=25)
+    def test_limite_de_subidas_abiertas_por_usuario(self):
+        self._iniciar()
+        self._iniciar()
+        response = self.client.post(
+            reverse("subida-list"), {"nombre_archivo": "c.txt", "tamano_total": 1}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 429)
+
+        SubidaFragmentada.objects.filter(usuario=self.usuario).first().delete()
+        response = self.client.post(
+            reverse("subida-list"), {"nombre_archivo": "c.txt", "tamano_total": 16}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 429)
+        # Las de otro usuario no cuentan
+        self.client.force_login(self.otro)
+        self._iniciar()
+
+
+class NormalizacionImagenesTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=media.name, ADJUNTOS_IMAGEN_MAX_LADO=1024)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        rol_usuario = Rol.objects.create(nombre_rol="USUARIO")
+        self.usuario = Usuario.objects.create_user(email="u@coyahue.cl", password="x", rol=rol_usuario)
+        self.area = AreaAfectada.objects.create(nombre_area="TI")
+        self.estado = EstadoTicket.objects.create(nombre_estado="Abierto")
+
+    def _ticket_con_foto(self, **extra):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientación: rotada 90°
+        exif[0x010F] = "Fabricante"
+        buffer = io.BytesIO()
+        Image.effect_noise((3000, 2000), 64).convert("RGB").save(buffer, "JPEG", quality=98, exif=exif)
+        return Ticket.objects.create(
+            titulo="Foto",
+            descripcion="Foto del equipo",
+            solicitante=self.usuario,
+            area_afectada=self.area,
+            estado=self.estado,
+            archivo=ContentFile(buffer.getvalue(), name="foto.jpg"),
+            **extra,
+        )
+
+    def test_derivados_solo_si_cambia_el_adjunto(self):
+        ticket = Ticket.objects.get(pk=self._ticket_con_foto().pk)
+        comentario = ComentarioTicket.objects.create(
+            ticket=ticket, usuario=self.usuario, texto="x", archivo=ContentFile(b"log", name="log.txt"),
+        )
+        comentario = ComentarioTicket.objects.get(pk=comentario.pk)
+        with mock.patch("tickets.signals.encolar_derivados") as encolar:
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket.titulo = "Otro título"
+                ticket.save()
+                comentario.texto = "y"
+                comentario.save()
+                ticket.save(update_fields=["titulo"])
+            encolar.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                comentario.archivo = ContentFile(b"otro", name="otro.txt")
+                comentario.save()
+                comentario.save()
+            encolar.assert_called_once_with(comentario.archivo.name)
+
+    def test_reduce_y_quita_exif(self):
+        ticket = self._ticket_con_foto()
+        original = ticket.archivo.name
+        tamano_original = ticket.archivo.size
+        abierto = Ticket.objects.get(pk=ticket.pk)  # Formulario abierto antes del reemplazo
+        sincronizados = CambioSincronizacion.objects.filter(objeto_id=ticket.pk).count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            procesar_adjunto("tickets", "Ticket", ticket.pk)
+
+        ticket.refresh_from_db()
+        self.assertNotEqual(ticket.archivo.name, original)
+        # Campo derivado: invalida ETags y se sincroniza, pero no choca con quien editaba
+        self.assertEqual(ticket.version, abierto.version)
+        self.assertGreater(ticket.fecha_actualizacion, abierto.fecha_actualizacion)
+        abierto.titulo = "Editado"
+        guardar_cambios(abierto)
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).archivo.name, ticket.archivo.name)
+        self.assertTrue(EventoTicket.objects.filter(ticket=ticket, cambios__archivo=[original, ticket.archivo.name]).exists())
+        self.assertEqual(CambioSincronizacion.objects.filter(objeto_id=ticket.pk).count(), sincronizados + 1)
+        self.assertLess(ticket.archivo.size, tamano_original / 2)
+        with ticket.archivo.open("rb") as f, Image.open(f) as imagen:
+            # Rotada según EXIF: el lado mayor queda vertical
+            self.assertEqual(imagen.size, (683, 1024))
+            self.assertFalse(imagen.getexif())
+        self.assertFalse(ticket.archivo_original)
+        self.assertFalse(BlobAdjunto.objects.filter(nombre=original).exists())
+
+        # Idempotente: la versión normalizada no se vuelve a procesar
+        normalizado = ticket.archivo.name
+        procesar_adjunto("tickets", "Ticket", ticket.pk)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.archivo.name, normalizado)
+
+    def test_conservar_original(self):
+        ticket = self._ticket_con_foto(conservar_original=True)
+        original = ticket.archivo.name
+
+        procesar_adjunto("tickets", "Ticket", ticket.pk)
+
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.archivo_original.name, original)
+        self.assertEqual(BlobAdjunto.objects.get(nombre=original).referencias, 1)
+
+        self.client.force_login(self.usuario)
+        url = reverse("adjunto_descargar", kwargs={"tipo": "ticket", "pk": ticket.pk})
+        response = self.client.get(url, {"original": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response["Content-Length"]), ticket.archivo_original.size)
+
+
+class GcMediaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=self.media.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        rol_usuario = Rol.objects.create(nombre_rol="USUARIO")
+        usuario = Usuario.objects.create_user(email="u@coyahue.cl", password="x", rol=rol_usuario)
+        self.ticket = Ticket.objects.create(
+            titulo="Con adjunto",
+            descripcion="Vigente",
+            solicitante=usuario,
+            area_afectada=AreaAfectada.objects.create(nombre_area="TI"),
+            estado=EstadoTicket.objects.create(nombre_estado="Abierto"),
+            archivo=ContentFile(b"vigente", name="vigente.png"),
+        )
+        # Adjunto de un comentario borrado en cascada: el blob queda huérfano
+        huerfano = ComentarioTicket.objects.create(
+            ticket=self.ticket, usuario=usuario, texto="x",
+            archivo=ContentFile(b"huerfano", name="huerfano.png"),
+        )
+        self.blob_huerfano = huerfano.archivo.name
+        ComentarioTicket.objects.filter(pk=huerfano.pk).delete()
+
+        self.derivado = self._crear(f"{self.ticket.archivo.name}.miniatura.webp")
+        self.derivado_huerfano = self._crear(f"{self.blob_huerfano}.miniatura.webp")
+        self.antiguo = self._crear("tickets_adjuntos/antiguo.pdf")
+        self.reciente = self._crear("tickets_adjuntos/reciente.pdf", antiguedad=0)
+
+        viejo = time.time() - 48 * 3600
+        for nombre in (self.ticket.archivo.name, self.blob_huerfano):
+            os.utime(os.path.join(self.media.name, nombre), (viejo, viejo))
+
+    def _crear(self, nombre, antiguedad=48 * 3600):
+        ruta = os.path.join(self.media.name, nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, "wb") as f:
+            f.write(b"datos")
+        momento = time.time() - antiguedad
+        os.utime(ruta, (momento, momento))
+        return nombre
+
+    def _existe(self, nombre):
+        return os.path.exists(os.path.join(self.media.name, nombre))
+
+    def test_informa_sin_borrar(self):
+        salida = io.StringIO()
+        call_command("gc_media", stdout=salida)
+        self.assertIn("3 huérfanos encontrados", salida.getvalue())
+        self.assertTrue(self._existe(self.blob_huerfano))
+
+    def test_borra_huerfanos_respetando_gracia(self):
+        call_command("gc_media", "--borrar", stdout=io.StringIO())
+
+        self.assertTrue(self._existe(self.ticket.archivo.name))
+        self.assertTrue(self._existe(self.derivado))
+        self.assertTrue(self._existe(self.reciente))
+        for nombre in (self.blob_huerfano, self.derivado_huerfano, self.antiguo):
+            self.assertFalse(self._existe(nombre), nombre)
+        self.assertFalse(BlobAdjunto.objects.filter(nombre=self.blob_huerfano).exists())
+        self.assertTrue(BlobAdjunto.objects.filter(nombre=self.ticket.archivo.name).exists())
+
+    def test_conserva_adjuntos_de_tickets_en_papelera(self):
+        Ticket.todos.filter(pk=self.ticket.pk).update(eliminado_en=timezone.now())
+        call_command("gc_media", "--borrar", stdout=io.StringIO())
+        self.assertTrue(self._existe(self.ticket.archivo.name))
+        self.assertTrue(self._existe(self.derivado))
+
+    def test_incremental_por_directorio(self):
+        call_command("gc_media", "tickets_adjuntos", "--borrar", stdout=io.StringIO())
+        self.assertFalse(self._existe(self.antiguo))
+        self.assertTrue(self._existe(self.blob_huerfano))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class EliminacionEnSegundoPlanoTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=media.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.sembrar(3)
+
+    def test_eliminar_ticket_marca_y_purga_despues(self):
+        self.client.force_login(self.admin)
+        with mock.patch("tickets.eliminacion._executor") as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse("tickets_eliminar", args=[self.ticket.pk]))
+        self.assertRedirects(response, reverse("tickets_listar"), fetch_redirect_response=False)
+        executor.submit.assert_called_once()
+
+        # Marcado: ya no aparece, pero sus datos siguen hasta la purga
+        self.assertFalse(Ticket.objects.filter(pk=self.ticket.pk).exists())
+        self.assertTrue(Ticket.todos.filter(pk=self.ticket.pk).exists())
+        self.assertTrue(ComentarioTicket.objects.filter(ticket_id=self.ticket.pk).exists())
+
+        purgar_ticket(self.ticket.pk)
+        self.assertFalse(Ticket.todos.filter(pk=self.ticket.pk).exists())
+        for modelo in (ComentarioTicket, HistorialTicket, AsignacionTicket, Notificacion):
+            self.assertFalse(modelo.objects.filter(ticket_id=self.ticket.pk).exists(), modelo)
+        self.assertEqual(Ticket.objects.count(), 3)
+
+    def test_eliminar_usuario_purga_sus_datos_y_conserva_los_ajenos(self):
+        with mock.patch("tickets.eliminacion._executor"):
+            with self.captureOnCommitCallbacks(execute=True):
+                eliminar_usuario(self.admin)
+        self.admin.refresh_from_db()
+        self.assertFalse(self.admin.is_active)
+        self.assertIsNotNone(self.admin.eliminado_en)
+
+        with mock.patch("tickets.eliminacion.LOTE", 2):
+            purgar_usuario(self.admin.pk)
+
+        self.assertFalse(Usuario.objects.filter(pk=self.admin.pk).exists())
+        self.assertTrue(Ticket.objects.filter(pk=self.ticket.pk).exists())
+        self.assertFalse(ComentarioTicket.objects.filter(usuario_id=self.admin.pk).exists())
+        self.assertFalse(VotoFAQ.objects.exists())
+        self.assertFalse(Notificacion.objects.exists())
+        self.assertEqual(HistorialTicket.objects.filter(ticket=self.ticket, usuario__isnull=True).count(), 3)
+        self.assertEqual(ArticuloFAQ.objects.filter(creado_por__isnull=True).count(), 4)
+
+    def test_purgar_eliminados_retoma_lo_pendiente(self):
+        Ticket.objects.filter(pk=self.ticket.pk).update(eliminado_en=timezone.now())
+        call_command("purgar_eliminados", stdout=io.StringIO())
+        self.assertFalse(Ticket.todos.filter(pk=self.ticket.pk).exists())
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class EventosTicketTests(PresupuestoQueriesMixin, TransactionTestCase):
+    """Con commits reales: los eventos se insertan al confirmar."""
+
+    def _crear(self):
+        return Ticket.objects.create(
+            titulo="Impresora", descripcion="No imprime", solicitante=self.usuario,
+            categoria=self.categoria, prioridad=self.prioridad, area_afectada=self.area,
+            estado=self.estado_abierto,
+        )
+
+    def test_creacion_y_cambios_guardan_solo_el_diff(self):
+        ticket = self._crear()
+        creacion = EventoTicket.objects.get(ticket=ticket)
+        self.assertEqual(creacion.tipo, EventoTicket.TIPO_CREACION)
+        self.assertEqual(creacion.cambios["estado"], [None, self.estado_abierto.pk])
+        self.assertNotIn("fecha_creacion", creacion.cambios)
+
+        ticket = Ticket.objects.get(pk=ticket.pk)
+        ticket.estado = self.estado_progreso
+        ticket.titulo = "Impresora piso 2"
+        with transaction.atomic():
+            ticket.save()
+        ticket.save()  # Sin cambios: no agrega eventos
+
+        cambio = EventoTicket.objects.filter(ticket=ticket).last()
+        self.assertEqual(EventoTicket.objects.filter(ticket=ticket).count(), 2)
+        self.assertEqual(cambio.cambios, {
+            "titulo": ["Impresora", "Impresora piso 2"],
+            "estado": [self.estado_abierto.pk, self.estado_progreso.pk],
+        })
+
+    def test_rollback_de_un_savepoint_descarta_sus_eventos(self):
+        ticket = self._crear()
+        with transaction.atomic():
+            ticket.estado = self.estado_progreso
+            ticket.save()
+            try:
+                with transaction.atomic():
+                    ticket.titulo = "Revertido"
+                    ticket.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+        cambios = [e.cambios for e in EventoTicket.objects.filter(ticket=ticket)]
+        self.assertEqual(len(cambios), 2)
+        self.assertEqual(cambios[1], {"estado": [self.estado_abierto.pk, self.estado_progreso.pk]})
+
+    def test_los_lotes_no_quedan_en_la_conexion(self):
+        lotes = eventos._lotes(transaction.get_connection())
+        ticket = self._crear()
+        with transaction.atomic():
+            ticket.estado = self.estado_progreso
+            ticket.save()
+            try:
+                with transaction.atomic():
+                    ticket.titulo = "Revertido"
+                    ticket.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # El del savepoint revertido ya no está
+            self.assertEqual(list(lotes), [()])
+        self.assertEqual(len(lotes), 0)
+
+        try:
+            with transaction.atomic():
+                ticket.titulo = "Revertido"
+                ticket.save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(len(lotes), 0)
+
+    def test_un_solo_insert_al_confirmar(self):
+        ticket = self._crear()
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                for estado in (self.estado_progreso, self.estado_resuelto, self.estado_cerrado):
+                    ticket.estado = estado
+                    ticket.save()
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "tickets_eventoticket"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(EventoTicket.objects.filter(ticket=ticket).count(), 4)
+
+    def test_estado_en_reconstruye_el_pasado(self):
+        t0 = timezone.now() - timezone.timedelta(days=3)
+        with mock.patch("tickets.eventos.timezone.now", return_value=t0):
+            ticket = self._crear()
+        ticket.estado = self.estado_resuelto
+        with mock.patch("tickets.eventos.timezone.now", return_value=t0 + timezone.timedelta(days=1)):
+            with transaction.atomic():
+                ticket.save()
+
+        self.assertIsNone(eventos.estado_en(ticket.pk, t0 - timezone.timedelta(hours=1)))
+        self.assertEqual(eventos.estado_en(ticket.pk, t0 + timezone.timedelta(hours=1))["estado"], self.estado_abierto.pk)
+        self.assertEqual(eventos.estado_en(ticket.pk, timezone.now())["estado"], self.estado_resuelto.pk)
+
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        url = reverse("ticket-estado-en", args=[ticket.pk])
+        momento = (t0 + timezone.timedelta(hours=1)).isoformat()
+        response = api.get(url, {"fecha": momento})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["estado"], self.estado_abierto.pk)
+        self.assertEqual(api.get(url, {"fecha": "ayer"}).status_code, 400)
+
+        response = api.get(reverse("ticket-eventos", args=[ticket.pk]))
+        self.assertEqual([e["tipo"] for e in response.json()], ["creacion", "cambio"])
+
+    def test_asignacion_registra_tecnico_anterior(self):
+        ticket = self._crear()
+        otro = Tecnico.objects.get_or_create(usuario=self.admin)[0]
+        with transaction.atomic():
+            AsignacionTicket.objects.create(ticket=ticket, tecnico_asignado=self.tecnico)
+        with transaction.atomic():
+            AsignacionTicket.objects.create(ticket=ticket, tecnico_asignado=otro)
+
+        asignaciones = EventoTicket.objects.filter(ticket=ticket, tipo=EventoTicket.TIPO_ASIGNACION)
+        self.assertEqual(
+            [e.cambios["tecnico_asignado"] for e in asignaciones],
+            [[None, self.tecnico.pk], [self.tecnico.pk, otro.pk]],
+        )
+        self.assertEqual(eventos.estado_en(ticket.pk, timezone.now())["tecnico_asignado"], otro.pk)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class TransicionesEstadoTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.ticket = Ticket.objects.select_related("estado").get(pk=self.ticket.pk)
+        self.estado_abierto.transiciones.set([self.estado_progreso])
+        self.estado_progreso.transiciones.set([self.estado_resuelto, self.estado_abierto])
+
+    def test_transicion_permitida_en_un_solo_update(self):
+        Notificacion.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(transicionar(self.ticket, self.estado_progreso, self.admin, "Tomado"))
+        sql = [q["sql"] for q in ctx.captured_queries]
+        self.assertEqual(sum(q.startswith('UPDATE "tickets_ticket"') for q in sql), 1)
+        self.assertEqual(sum(q.startswith('INSERT INTO "notifications_notificacion"') for q in sql), 1)
+
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).estado, self.estado_progreso)
+        historial = HistorialTicket.objects.filter(ticket=self.ticket).latest("id")
+        self.assertEqual((historial.estado_anterior, historial.estado_nuevo), (self.estado_abierto, self.estado_progreso))
+        self.assertEqual(
+            set(Notificacion.objects.values_list("usuario_destino_id", flat=True)),
+            {self.usuario.pk, self.usuario_tecnico.pk},
+        )
+
+    def test_transicion_no_permitida(self):
+        with self.assertRaises(ErrorTransicion) as ctx:
+            transicionar(self.ticket, self.estado_cerrado, self.admin)
+        self.assertEqual(ctx.exception.status, 400)
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).estado, self.estado_abierto)
+        self.assertEqual(
+            set(estados_disponibles(self.estado_abierto)), {self.estado_abierto, self.estado_progreso}
+        )
+        # Sin transiciones configuradas, cualquier destino vale
+        self.assertEqual(estados_disponibles(self.estado_cerrado).count(), 4)
+
+    def test_conflicto_con_instancia_desactualizada(self):
+        otra = Ticket.objects.select_related("estado").get(pk=self.ticket.pk)
+        transicionar(otra, self.estado_progreso, self.admin)
+        with self.assertRaises(ErrorTransicion) as ctx:
+            transicionar(self.ticket, self.estado_progreso, self.usuario_tecnico)
+        self.assertEqual(ctx.exception.status, 409)
+
+    def test_fecha_cierre_se_fija_y_se_limpia(self):
+        transicionar(self.ticket, self.estado_progreso, self.admin)
+        transicionar(self.ticket, self.estado_resuelto, self.admin)
+        cierre = Ticket.objects.get(pk=self.ticket.pk).fecha_cierre
+        self.assertIsNotNone(cierre)
+        self.assertEqual(self.ticket.fecha_cierre, cierre)
+
+        self.estado_resuelto.transiciones.set([self.estado_progreso])
+        transicionar(self.ticket, self.estado_progreso, self.admin)
+        self.assertIsNone(Ticket.objects.get(pk=self.ticket.pk).fecha_cierre)
+
+    def test_api_y_vista_html_usan_el_motor(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        url = f"/api/tickets/{self.ticket.id}/cambiar_estado/"
+        self.assertEqual(api.post(url, {"estado_id": self.estado_cerrado.id}, format="json").status_code, 400)
+        response = api.patch(f"/api/tickets/{self.ticket.id}/", {"estado": self.estado_cerrado.id}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            reverse("tickets_detalle", args=[self.ticket.pk]), {"estado": self.estado_cerrado.id}, follow=True
+        )
+        self.assertContains(response, "No se puede pasar")
+        response = self.client.post(
+            reverse("tickets_detalle", args=[self.ticket.pk]), {"estado": self.estado_progreso.id}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).estado, self.estado_progreso)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class ConcurrenciaOptimistaTests(PresupuestoQueriesMixin, TestCase):
+    def test_guarda_solo_columnas_modificadas(self):
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.prioridad = self.prioridad
+        with CaptureQueriesContext(connection) as ctx:
+            guardar_cambios(ticket)
+        update = next(q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE"))
+        self.assertIn('"prioridad_id"', update)
+        self.assertNotIn('"titulo"', update)
+        self.assertEqual(ticket.version, 2)
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).version, 2)
+
+    def test_save_completo_tambien_sube_la_version(self):
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.titulo = "Otro título"
+        ticket.save()
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).version, 2)
+
+    def test_conflicto_con_pista_de_fusion(self):
+        mia = Ticket.objects.get(pk=self.ticket.pk)
+        otra = Ticket.objects.get(pk=self.ticket.pk)
+        otra.prioridad = self.prioridad
+        guardar_cambios(otra)
+
+        mia.titulo = "Mi título"
+        with self.assertRaises(ConflictoVersion) as ctx:
+            guardar_cambios(mia)
+        self.assertIn("Mi título", str(ctx.exception))
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).titulo, "Ticket 0")
+
+    def test_conflicto_libera_el_archivo_subido(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with override_settings(MEDIA_ROOT=media.name):
+            mia = Ticket.objects.get(pk=self.ticket.pk)
+            Ticket.objects.filter(pk=self.ticket.pk).update(version=2)
+
+            mia.archivo = ContentFile(b"%PDF conflicto", name="informe.pdf")
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(ConflictoVersion):
+                    guardar_cambios(mia)
+            self.assertFalse(BlobAdjunto.objects.exists())
+            self.assertFalse(mia.archivo)
+
+    def test_api_responde_409(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        url = f"/api/tickets/{self.ticket.pk}/"
+        response = api.patch(url, {"titulo": "Primero", "version": 1}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 2)
+
+        response = api.patch(url, {"titulo": "Segundo", "version": 1}, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).titulo, "Primero")
+
+    def test_dos_administradores_en_el_formulario(self):
+        self.client.force_login(self.admin)
+        url = reverse("tickets_detalle", args=[self.ticket.pk])
+        datos = {
+            "estado": self.estado_abierto.pk, "categoria": self.categoria.pk,
+            "area_afectada": self.area.pk, "version": 1,
+        }
+        self.client.post(url, {**datos, "prioridad": self.prioridad.pk})
+        response = self.client.post(url, {**datos, "estado": self.estado_progreso.pk}, follow=True)
+
+        self.assertContains(response, "Otro usuario modificó el ticket")
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        self.assertEqual(ticket.estado, self.estado_abierto)
+        self.assertEqual(ticket.prioridad, self.prioridad)
+
+
+class IndiceCargaTests(TestCase):
+    def setUp(self):
+        self.indice = asignacion.IndiceCarga([
+            (1, "Hardware, Redes", 3),
+            (2, "Hardware", 1),
+            (3, "", 0),
+        ])
+
+    def test_menor_carga_prefiere_la_especialidad(self):
+        self.assertEqual(self.indice.elegir("Hardware", "TI"), 2)
+        self.assertEqual(self.indice.carga[2], 2)
+        self.assertEqual(self.indice.elegir("Hardware", "TI"), 2)
+        self.assertEqual(self.indice.elegir("hardware", "TI"), 1)  # Empate 3-3: el que lleva más esperando
+        self.assertEqual(self.indice.elegir("Software", "Finanzas"), 3)  # Sin especialista: todos
+
+        self.indice.ajustar(1, -3)
+        self.assertEqual(self.indice.elegir("Redes", ""), 1)
+
+    def test_round_robin(self):
+        elegidos = [self.indice.elegir("Hardware", "", "round_robin") for _ in range(4)]
+        self.assertEqual(elegidos, [1, 2, 1, 2])
+
+    def test_ponderada(self):
+        # Especialista con 1 ticket: (1+1)/2 = 1, generalista libre: (0+1)/1 = 1 -> empate, gana el más antiguo
+        self.assertEqual(self.indice.elegir("Hardware", "", "ponderada"), 2)
+        # Ahora el especialista vale 1.5 y el generalista 1
+        self.assertEqual(self.indice.elegir("Hardware", "", "ponderada"), 3)
+
+    def test_compacta_entradas_viejas(self):
+        for _ in range(200):
+            self.indice.ajustar(3, +1)
+            self.indice.ajustar(3, -1)
+        self.assertLess(len(self.indice.grupos[asignacion.GENERAL]), 40)
+        self.assertEqual(self.indice.elegir("", ""), 3)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS, ASIGNACION_AUTOMATICA="menor_carga")
+class AsignacionAutomaticaTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        asignacion.invalidar_indice()
+        self.addCleanup(asignacion.invalidar_indice)
+        otro = Usuario.objects.create_user(
+            email="redes@coyahue.cl", password="clave-segura", rol=self.rol_tecnico
+        )
+        self.especialista, _ = Tecnico.objects.get_or_create(usuario=otro)
+        self.especialista.especialidad = "Hardware"
+        self.especialista.save()
+
+    def _carga(self, tecnico):
+        return asignacion._con_indice(lambda indice: indice.carga[tecnico.pk])
+
+    def test_ticket_nuevo_va_al_especialista_y_el_cierre_libera_carga(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = Ticket.objects.create(
+                titulo="Mouse", descripcion="No funciona", solicitante=self.usuario,
+                categoria=self.categoria, area_afectada=self.area, estado=self.estado_abierto,
+            )
+        activa = AsignacionTicket.objects.get(ticket=ticket, activo=True)
+        self.assertEqual(activa.tecnico_asignado, self.especialista)
+        self.assertTrue(Notificacion.objects.filter(ticket=ticket, usuario_destino=self.especialista.usuario).exists())
+        self.assertEqual(self._carga(self.especialista), 1)
+
+        ticket = Ticket.objects.select_related("estado").get(pk=ticket.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            transicionar(ticket, self.estado_resuelto, self.admin)
+        self.assertEqual(self._carga(self.especialista), 0)
+
+    def test_indice_desde_la_base_cuenta_solo_abiertos(self):
+        # setUp: self.ticket abierto asignado a self.tecnico
+        self.sembrar(3)  # Tickets 1 y 3 cerrados, 2 abierto
+        self.assertEqual(self._carga(self.tecnico), 2)
+        self.assertEqual(self._carga(self.especialista), 0)
+
+    def test_reasignar_manual_mueve_la_carga(self):
+        self.assertEqual(self._carga(self.tecnico), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            asignacion.asignar(self.ticket, self.especialista.pk)
+        self.assertIsNone(asignacion.asignar(self.ticket, self.especialista.pk))
+        self.assertEqual((self._carga(self.tecnico), self._carga(self.especialista)), (0, 1))
+        self.assertEqual(AsignacionTicket.objects.filter(ticket=self.ticket, activo=True).count(), 1)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+@override_settings(SLA_HORAS_HABILES=False)
+class SLAPersistidoTests(PresupuestoQueriesMixin, TestCase):
+    def _nuevo(self, **campos):
+        return Ticket.objects.create(
+            titulo="Sin red", descripcion="No hay red", solicitante=self.usuario,
+            area_afectada=self.area, estado=self.estado_abierto, **campos,
+        )
+
+    def _plazo(self, ticket, horas):
+        vence, advertencia = plazos_sla(timezone.now() - timezone.timedelta(hours=horas), 4)
+        Ticket.objects.filter(pk=ticket.pk).update(sla_deadline=vence, sla_warning_at=advertencia)
+
+    def test_al_crear_toma_el_sla_de_la_prioridad(self):
+        ticket = self._nuevo(prioridad=self.prioridad)
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.sla_horas_objetivo, 8)
+        self.assertEqual(ticket.sla_deadline, ticket.fecha_creacion + timezone.timedelta(hours=8))
+        self.assertEqual(ticket.sla_warning_at, ticket.fecha_creacion + timezone.timedelta(hours=6))
+
+        sin_prioridad = self._nuevo()
+        self.assertIsNone(sin_prioridad.sla_deadline)
+        self.assertEqual(sin_prioridad.sla_status, "SIN_SLA")
+
+    def test_cambio_de_prioridad_recalcula(self):
+        ticket = Ticket.objects.get(pk=self._nuevo().pk)
+        ticket.prioridad = self.prioridad_critica
+        guardar_cambios(ticket)
+        ticket = Ticket.objects.get(pk=ticket.pk)
+        self.assertEqual(ticket.sla_horas_objetivo, 4)
+        self.assertEqual(ticket.sla_deadline, ticket.fecha_creacion + timezone.timedelta(hours=4))
+
+        ticket.prioridad = self.prioridad
+        ticket.save(update_fields=["prioridad"])
+        self.assertEqual(
+            Ticket.objects.get(pk=ticket.pk).sla_deadline, ticket.fecha_creacion + timezone.timedelta(hours=8)
+        )
+
+        # Otros cambios no mueven el plazo
+        ticket = Ticket.objects.get(pk=ticket.pk)
+        ticket.titulo = "Sin red en el piso 3"
+        self.assertEqual(list(guardar_cambios(ticket)), ["titulo"])
+
+    def test_filtra_y_ordena_por_riesgo_en_sql(self):
+        en_curso = self._nuevo(prioridad=self.prioridad)
+        vencido, advertencia = self._nuevo(), self._nuevo()
+        self._plazo(vencido, 5)
+        self._plazo(advertencia, 3.5)
+
+        with self.assertNumQueries(1):
+            riesgo = list(Ticket.objects.por_sla("riesgo").order_by("sla_riesgo").values_list("pk", "sla_estado"))
+        self.assertEqual(riesgo, [(vencido.pk, "VENCIDO"), (advertencia.pk, "ADVERTENCIA")])
+        self.assertEqual(
+            list(Ticket.objects.por_sla("EN_CURSO").values_list("pk", flat=True)), [self.ticket.pk, en_curso.pk]
+        )
+        anotado = Ticket.objects.con_sla().get(pk=advertencia.pk)
+        self.assertEqual(anotado.sla_status, Ticket.objects.get(pk=advertencia.pk).sla_status)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("tickets_listar"), {"orden": "sla"})
+        self.assertEqual([t.pk for t in response.context["tickets"]][:2], [vencido.pk, advertencia.pk])
+        response = self.client.get(reverse("tickets_listar"), {"sla": "VENCIDO"})
+        self.assertEqual([t.pk for t in response.context["tickets"]], [vencido.pk])
+
+    def test_api_filtra_por_sla(self):
+        vencido = self._nuevo()
+        self._plazo(vencido, 5)
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        response = api.get("/api/tickets/", {"sla": "riesgo"})
+        self.assertEqual([t["id"] for t in response.json()], [vencido.pk])
+
+
+@override_settings(SLA_HORAS_HABILES=False)
+class MonitorSLATests(PresupuestoQueriesMixin, TransactionTestCase):
+    """Con commits reales, para que los cambios dejen eventos."""
+
+    def _crear_hace(self, horas):
+        creacion = timezone.now() - timezone.timedelta(hours=horas)
+        vence, advertencia = plazos_sla(creacion, 4)  # Prioridad crítica
+        Ticket.objects.filter(pk=self.ticket.pk).update(
+            fecha_creacion=creacion, sla_horas_objetivo=4, sla_deadline=vence, sla_warning_at=advertencia,
+        )
+        return creacion
+
+    def test_advertencia_una_sola_vez(self):
+        self._crear_hace(3.5)  # Prioridad crítica: 4 h, advertencia a las 3 h
+        monitor = MonitorSLA()
+        monitor.cargar()
+        self.assertEqual(monitor.procesar(), 1)
+        self.assertEqual(monitor.procesar(), 0)
+
+        alerta = AlertaSLA.objects.get(ticket=self.ticket)
+        self.assertEqual(alerta.tipo, AlertaSLA.TIPO_ADVERTENCIA)
+        self.assertEqual(
+            list(Notificacion.objects.filter(tipo_notificacion="sla_advertencia").values_list("usuario_destino", flat=True)),
+            [self.usuario_tecnico.pk],
+        )
+
+        # Un monitor reiniciado no repite el aviso
+        otro = MonitorSLA()
+        otro.cargar()
+        self.assertEqual(otro.procesar(), 0)
+
+    def test_vencido_crea_evento_critico(self):
+        self._crear_hace(5)
+        monitor = MonitorSLA()
+        monitor.cargar()
+        self.assertEqual(monitor.procesar(), 1)  # La advertencia ya no se avisa
+        self.assertEqual(AlertaSLA.objects.get(ticket=self.ticket).tipo, AlertaSLA.TIPO_VENCIDO)
+        self.assertTrue(EventoCritico.objects.filter(tipo_evento="SLA vencido").exists())
+        destinos = set(Notificacion.objects.filter(tipo_notificacion="sla_vencido").values_list("usuario_destino", flat=True))
+        self.assertEqual(destinos, {self.usuario_tecnico.pk, self.admin.pk})
+
+    def test_recarga_incremental_desde_eventos(self):
+        creacion = self._crear_hace(1)
+        monitor = MonitorSLA()
+        monitor.cargar()
+        self.assertEqual(monitor.proximo(), creacion + timezone.timedelta(hours=3))
+
+        ticket = Ticket.objects.select_related("estado").get(pk=self.ticket.pk)
+        ticket.prioridad = self.prioridad  # 8 h
+        ticket.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(monitor.refrescar(), 1)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+        self.assertEqual(monitor.proximo(), creacion + timezone.timedelta(hours=6))
+
+        transicionar(ticket, self.estado_resuelto, self.admin)
+        monitor.refrescar()
+        self.assertIsNone(monitor.proximo())
+        self.assertEqual(monitor.procesar(timezone.now() + timezone.timedelta(days=1)), 0)
+
+    def test_toma_los_cambios_de_la_secuencia_de_sincronizacion(self):
+        creacion = self._crear_hace(1)
+        monitor = MonitorSLA()
+        monitor.cargar()
+        # La fila de la secuencia se escribe con el cambio, antes que el evento
+        with transaction.atomic():
+            Ticket.objects.filter(pk=self.ticket.pk).update(
+                sla_warning_at=creacion + timezone.timedelta(hours=2),
+                sla_deadline=creacion + timezone.timedelta(hours=5),
+            )
+            sincronizacion.registrar_tickets([self.ticket.pk])
+        self.assertEqual(monitor.refrescar(), 1)
+        self.assertEqual(monitor.proximo(), creacion + timezone.timedelta(hours=2))
+        self.assertEqual(monitor.refrescar(), 0)
+
+    def test_advierte_si_los_ids_no_siguen_el_orden_de_commit(self):
+        self.assertTrue(sla.orden_de_commit())
+        opciones = {**connection.settings_dict["OPTIONS"], "transaction_mode": "DEFERRED"}
+        with mock.patch.dict(connection.settings_dict, {"OPTIONS": opciones}):
+            with self.assertLogs("tickets.sla", "WARNING"):
+                MonitorSLA().ejecutar(dormir=lambda segundos: None, vueltas=1)
+
+    def test_duerme_hasta_el_proximo_cruce(self):
+        self._crear_hace(3 - 10 / 3600)  # Advertencia en 10 s
+        esperas = []
+        MonitorSLA().ejecutar(intervalo=30, dormir=esperas.append, vueltas=1)
+        self.assertTrue(0 < esperas[0] <= 10, esperas)
+
+
+class CalendarioHabilTests(TestCase):
+    JORNADA = {dia: ("09:00", "18:00") for dia in range(5)}
+
+    def setUp(self):
+        self.zona = timezone.get_current_timezone()
+        # 19-10-2026 es lunes
+        self.cal = CalendarioHabil(self.JORNADA, feriados=[timezone.datetime(2026, 10, 20).date()], zona=self.zona)
+
+    def local(self, dia, hora, minuto=0):
+        return timezone.make_aware(timezone.datetime(2026, 10, dia, hora, minuto), self.zona)
+
+    def test_salta_fin_de_semana_y_feriado(self):
+        viernes = self.local(16, 17)
+        self.assertEqual(self.cal.sumar(viernes, 2 * 3600), self.local(19, 10))
+        self.assertEqual(self.cal.sumar(viernes, 11 * 3600), self.local(21, 10))  # El martes es feriado
+        self.assertEqual(self.cal.transcurrido(viernes, self.local(21, 10)), 11 * 3600)
+
+    def test_fuera_de_jornada_empieza_al_abrir(self):
+        self.assertEqual(self.cal.sumar(self.local(17, 12), 3600), self.local(19, 10))  # Sábado
+        self.assertEqual(self.cal.sumar(self.local(19, 7), 9 * 3600), self.local(19, 18))
+        self.assertEqual(self.cal.transcurrido(self.local(19, 20), self.local(21, 8)), 0)
+
+    def test_coincide_con_el_recorrido_hora_a_hora(self):
+        azar = random.Random(7)
+        inicio = self.local(1, 0)
+        for _ in range(200):
+            desde = inicio + timezone.timedelta(minutes=azar.randrange(60 * 24 * 400))
+            segundos = azar.choice((1, 4, 8, 24, 72)) * 3600 * azar.choice((0.75, 1))
+            self.assertEqual(
+                self.cal.sumar(desde, segundos), sumar_hora_a_hora(self.cal, desde, segundos), (desde, segundos)
+            )
+
+    def test_ampliar_el_rango_no_cambia_una_consulta_en_curso(self):
+        viernes, miercoles = self.local(16, 17), self.local(21, 10)
+        original = CalendarioHabil._segundos_hasta
+
+        def con_otro_hilo(cal, tabla, momento):
+            # Otro hilo amplía la tabla compartida hacia atrás a mitad del cálculo
+            cal._tabla_con(tabla[0] - timezone.timedelta(days=30), tabla[0])
+            return original(cal, tabla, momento)
+
+        with mock.patch.object(CalendarioHabil, "_segundos_hasta", con_otro_hilo):
+            self.assertEqual(self.cal.transcurrido(viernes, miercoles), 11 * 3600)
+            self.assertEqual(self.cal.sumar(viernes, 11 * 3600), miercoles)
+
+    def test_plazo_mas_alla_del_rango_no_reemplaza_la_tabla(self):
+        tabla = self.cal.tabla
+        lejos = self.cal.sumar(self.local(19, 9), 9 * 3600 * 600)
+        self.assertIs(self.cal.tabla, tabla)
+        self.assertEqual(self.cal.transcurrido(self.local(19, 9), lejos), 9 * 3600 * 600)
+
+    @override_settings(SLA_HORAS_HABILES=True, SLA_JORNADA=JORNADA)
+    def test_plazos_de_ticket_con_feriados_del_admin(self):
+        calendario.invalidar_calendario()
+        self.addCleanup(calendario.invalidar_calendario)
+        with self.captureOnCommitCallbacks(execute=True):
+            Feriado.objects.create(fecha=timezone.datetime(2026, 10, 19).date(), nombre="Feriado de prueba")
+        vence, advertencia = plazos_sla(self.local(16, 17), 4)
+        self.assertEqual(vence, self.local(20, 12))
+        self.assertEqual(advertencia, self.local(20, 11))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS, SLA_HORAS_HABILES=False)
+class RecalcularPlazosTests(PresupuestoQueriesMixin, TestCase):
+    def test_actualiza_solo_los_abiertos_que_cambian(self):
+        self.sembrar(3)  # Tickets 1 y 3 cerrados
+        with override_settings(SLA_HORAS_HABILES=True, SLA_JORNADA={dia: ("09:00", "18:00") for dia in range(7)}):
+            calendario.invalidar_calendario()
+            self.addCleanup(calendario.invalidar_calendario)
+            with self.captureOnCommitCallbacks(execute=True):
+                revisados, actualizados = recalcular_plazos(lote=1)
+            self.assertEqual((revisados, actualizados), (2, 2))
+            ticket = Ticket.objects.get(pk=self.ticket.pk)
+            self.assertEqual(ticket.sla_deadline, plazos_sla(ticket.fecha_creacion, 8)[0])
+            self.assertEqual(recalcular_plazos(), (2, 0))
+
+        cerrado = Ticket.objects.get(titulo="Ticket 1")
+        self.assertEqual(cerrado.sla_deadline, cerrado.fecha_creacion + timezone.timedelta(hours=8))
+        self.assertEqual(EventoTicket.objects.filter(tipo=EventoTicket.TIPO_CAMBIO, cambios__has_key="sla_deadline").count(), 2)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS, SLA_HORAS_HABILES=False)
+class PoliticaSLATests(PresupuestoQueriesMixin, TestCase):
+    def _cambiar_sla(self, prioridad, horas):
+        prioridad.sla_horas = horas
+        with mock.patch("tickets.sla._executor") as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                prioridad.save()
+        return executor
+
+    def test_cambio_de_sla_recalcula_los_abiertos_por_lotes(self):
+        self.sembrar(6)  # Prioridad crítica: tickets 0, 3 (cerrado) y 6
+        executor = self._cambiar_sla(self.prioridad_critica, 2)
+        politica = PoliticaSLA.objects.get(prioridad=self.prioridad_critica, version=2)
+        executor.submit.assert_called_once()
+        self.assertIsNone(politica.aplicada_en)
+
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(aplicar_politica(politica.pk), 2)
+        # Un SELECT y un UPDATE por lote, más el de la política y los inserts
+        # del log de eventos y de la secuencia de sincronización: nunca uno por ticket
+        self.assertLessEqual(len(ctx.captured_queries), 11)
+
+        politica.refresh_from_db()
+        self.assertEqual(politica.tickets_actualizados, 2)
+        abierto = Ticket.objects.get(pk=self.ticket.pk)
+        self.assertEqual((abierto.sla_horas_objetivo, abierto.sla_version), (2, 2))
+        self.assertEqual(abierto.sla_deadline, abierto.fecha_creacion + timezone.timedelta(hours=2))
+        cerrado = Ticket.objects.get(titulo="Ticket 3")
+        self.assertEqual((cerrado.sla_horas_objetivo, cerrado.sla_version), (8, None))
+        self.assertEqual(Ticket.objects.get(titulo="Ticket 1").sla_horas_objetivo, 8)  # Otra prioridad
+        self.assertIsNone(aplicar_politica(politica.pk))  # Ya aplicada
+
+    def test_sin_cambio_de_horas_no_hay_politica(self):
+        prioridad = Prioridad.objects.get(pk=self.prioridad.pk)
+        prioridad.descripcion = "Urgente"
+        with self.assertNumQueries(1):  # Solo el UPDATE
+            prioridad.save()
+        self.assertEqual(prioridad.version_sla, 1)
+        self.assertEqual(PoliticaSLA.objects.filter(prioridad=self.prioridad).count(), 1)
+
+    def test_ediciones_concurrentes_no_repiten_version(self):
+        primera = Prioridad.objects.get(pk=self.prioridad_critica.pk)
+        segunda = Prioridad.objects.get(pk=self.prioridad_critica.pk)
+        self._cambiar_sla(primera, 2)
+        self._cambiar_sla(segunda, 6)
+        self.assertEqual((primera.version_sla, segunda.version_sla), (2, 3))
+        self.assertEqual(
+            list(PoliticaSLA.objects.filter(prioridad=self.prioridad_critica).values_list("version", "sla_horas")),
+            [(3, 6), (2, 2), (1, 4)],
+        )
+        # Otra edición con las mismas horas que ya tiene la fila no crea versión
+        self._cambiar_sla(Prioridad.objects.get(pk=self.prioridad_critica.pk), 6)
+        self.assertEqual(PoliticaSLA.objects.filter(prioridad=self.prioridad_critica).count(), 3)
+
+    def test_tickets_nuevos_toman_la_version_vigente(self):
+        self._cambiar_sla(self.prioridad, 12)
+        ticket = Ticket.objects.create(
+            titulo="Nuevo", descripcion="-", solicitante=self.usuario, prioridad=self.prioridad,
+            area_afectada=self.area, estado=self.estado_abierto,
+        )
+        self.assertEqual((ticket.sla_horas_objetivo, ticket.sla_version), (12, 2))
+
+    def test_version_reemplazada_y_comando_retoma_pendientes(self):
+        self._cambiar_sla(self.prioridad_critica, 2)
+        self._cambiar_sla(self.prioridad_critica, 6)
+        salida = io.StringIO()
+        call_command("recalcular_sla", stdout=salida)
+        self.assertIn("v3 (6 h): 1 tickets abiertos actualizados", salida.getvalue())
+        self.assertEqual(
+            dict(PoliticaSLA.objects.filter(prioridad=self.prioridad_critica).values_list("version", "tickets_actualizados")),
+            {1: 0, 2: 0, 3: 1},
+        )
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).sla_horas_objetivo, 6)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS, SLA_HORAS_HABILES=False)
+class OperacionesMasivasTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+        self.sembrar(3)  # Tickets 1 y 3 cerrados
+        self.abiertos = list(Ticket.objects.filter(fecha_cierre__isnull=True).values_list("pk", flat=True))
+        self.cerrados = list(Ticket.objects.filter(fecha_cierre__isnull=False).values_list("pk", flat=True))
+
+    def bulk(self, **datos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post("/api/tickets/bulk/", datos, format="json")
+
+    def test_cambia_estado_con_errores_por_ticket(self):
+        self.estado_cerrado.transiciones.set([self.estado_abierto])
+        ids = [*self.abiertos, *self.cerrados, 9999]
+        response = self.bulk(ids=ids, accion="estado", valor=self.estado_progreso.pk, comentario="Triage")
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos["actualizados"], self.abiertos)
+        self.assertEqual(
+            [(e["id"], e["status"]) for e in datos["errores"]], [*((pk, 400) for pk in self.cerrados), (9999, 404)],
+        )
+        self.assertEqual(Ticket.objects.filter(estado=self.estado_progreso).count(), 2)
+        self.assertEqual(HistorialTicket.objects.filter(comentario="Triage").count(), 2)
+        self.assertEqual(
+            EventoTicket.objects.filter(ticket_id__in=self.abiertos, cambios__has_key="estado").count(), 2,
+        )
+        # Solicitante y técnico asignado de cada ticket
+        self.assertEqual(Notificacion.objects.filter(tipo_notificacion="cambio_estado").count(), 4)
+
+    def test_cerrar_y_prioridad_recalculan_en_conjunto(self):
+        response = self.bulk(ids=self.abiertos, accion="cerrar")
+        self.assertEqual(response.json()["actualizados"], self.abiertos)
+        self.assertFalse(Ticket.objects.filter(pk__in=self.abiertos, fecha_cierre__isnull=True).exists())
+
+        ids = self.abiertos + self.cerrados
+        ya_alta = set(Ticket.objects.filter(prioridad=self.prioridad).values_list("pk", flat=True))
+        response = self.bulk(ids=ids, accion="prioridad", valor=self.prioridad.pk)
+        self.assertEqual(response.json()["sin_cambios"], [pk for pk in ids if pk in ya_alta])
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        self.assertEqual((ticket.prioridad, ticket.sla_horas_objetivo, ticket.version), (self.prioridad, 8, 3))
+        self.assertEqual(ticket.sla_deadline, ticket.fecha_creacion + timezone.timedelta(hours=8))
+
+    def test_asignar_y_versiones(self):
+        otro, _ = Tecnico.objects.get_or_create(usuario=Usuario.objects.create_user(
+            email="otro@coyahue.cl", password="clave-segura", rol=self.rol_tecnico,
+        ))
+        versiones = {str(self.ticket.pk): 99}
+        response = self.bulk(ids=self.abiertos, accion="asignar", valor=otro.pk, versiones=versiones)
+        datos = response.json()
+        self.assertEqual(datos["errores"][0]["status"], 409)
+        self.assertEqual(datos["actualizados"], self.abiertos[1:])
+        self.assertEqual(
+            list(AsignacionTicket.objects.filter(ticket_id=self.abiertos[1], activo=True).values_list("tecnico_asignado", flat=True)),
+            [otro.pk],
+        )
+        evento = EventoTicket.objects.filter(ticket_id=self.abiertos[1], tipo=EventoTicket.TIPO_ASIGNACION).get()
+        self.assertEqual(evento.cambios["tecnico_asignado"], [self.tecnico.pk, otro.pk])
+        self.assertEqual(Notificacion.objects.filter(tipo_notificacion="asignacion", usuario_destino=otro.usuario).count(), 1)
+
+    def test_operacion_invalida_y_permisos(self):
+        self.assertEqual(self.bulk(ids=self.abiertos, accion="borrar").status_code, 400)
+        self.assertEqual(self.bulk(ids=[], accion="cerrar").status_code, 400)
+        self.assertEqual(self.bulk(ids=self.abiertos, accion="prioridad", valor=9999).status_code, 400)
+        response = self.bulk(ids=self.abiertos, accion="cerrar", versiones=[1, 2])
+        self.assertEqual(response.status_code, 400)
+        self.api.force_authenticate(self.usuario)
+        self.assertEqual(self.bulk(ids=self.abiertos, accion="cerrar").status_code, 403)
+
+    def test_queries_no_crecen_con_los_tickets(self):
+        categorias = iter([Categoria.objects.create(nombre_categoria=f"Cat {i}") for i in range(2)])
+        ids = lambda: list(Ticket.objects.values_list("pk", flat=True))
+        self.assertQueriesConstantes(lambda: self.api.post(
+            "/api/tickets/bulk/", {"ids": ids(), "accion": "categoria", "valor": next(categorias).pk}, format="json",
+        ))
+
+    def test_prioridad_en_un_solo_update(self):
+        prioridades = iter([Prioridad.objects.create(nombre_prioridad=f"P{i}", nivel=10 + i, sla_horas=4 + i) for i in range(2)])
+        ids = lambda: list(Ticket.objects.values_list("pk", flat=True))
+        self.assertQueriesConstantes(lambda: self.api.post(
+            "/api/tickets/bulk/", {"ids": ids(), "accion": "prioridad", "valor": next(prioridades).pk}, format="json",
+        ))
+        versiones = {str(pk): 1 for pk in self.abiertos}
+        response = self.bulk(ids=self.abiertos, accion="prioridad", valor=self.prioridad.pk, versiones=versiones)
+        self.assertEqual({e["status"] for e in response.json()["errores"]}, {409})
+
+    def test_accion_masiva_del_panel(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse("tickets_masivo"), {
+            "tickets": self.abiertos, "accion": "cerrar", "filtros": "sla=riesgo",
+        })
+        self.assertRedirects(response, reverse("tickets_listar") + "?sla=riesgo", fetch_redirect_response=False)
+        self.assertFalse(Ticket.objects.filter(fecha_cierre__isnull=True).exists())
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS, SLA_HORAS_HABILES=False)
+class GetCondicionalTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+        self.sembrar(2)
+
+    def test_detalle_304_hasta_que_cambia(self):
+        url = f"/api/tickets/{self.ticket.pk}/"
+        response = self.api.get(url)
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(1):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        self.api.patch(url, {"titulo": "Otro título"}, format="json")
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["titulo"], "Otro título")
+
+    def test_listado_cambia_con_filtros_usuario_y_eliminaciones(self):
+        etag = self.api.get("/api/tickets/")["ETag"]
+        with self.assertNumQueries(1):
+            self.assertEqual(self.api.get("/api/tickets/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.api.get("/api/tickets/", {"sla": "riesgo"})["ETag"], etag)
+
+        self.api.force_authenticate(self.usuario)
+        self.assertEqual(self.api.get("/api/tickets/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.api.force_authenticate(self.admin)
+        self.api.delete(f"/api/tickets/{self.ticket.pk}/")  # La purga queda para después del commit
+        self.assertEqual(self.api.get("/api/tickets/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_recalcular_plazos_invalida_el_etag(self):
+        url = f"/api/tickets/{self.ticket.pk}/"
+        etag = self.api.get(url)["ETag"]
+        recalcular_plazos(politica=PoliticaSLA(sla_horas=2, version=2))
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS, SLA_HORAS_HABILES=False)
+class SincronizacionIncrementalTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        # Sin hilos de adjuntos ni de purga: se ejecutan los on_commit
+        for executor in ("tickets.miniaturas._executor", "tickets.eliminacion._executor"):
+            parche = mock.patch(executor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        with self.confirmar():
+            super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    @contextlib.contextmanager
+    def confirmar(self):
+        # Los eventos se insertan al confirmar; el atomic separa sus lotes
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            yield
+
+    def sembrar(self, n):
+        with self.confirmar():
+            super().sembrar(n)
+
+    def cambios(self, since=None, **extra):
+        response = self.api.get("/api/tickets/changes/", {} if since is None else {"since": since}, **extra)
+        self.assertEqual(response.status_code, 200, response.content[:300])
+        return response.json()
+
+    def test_entrega_solo_lo_cambiado_despues_del_cursor(self):
+        self.assertEqual([t["id"] for t in self.cambios()["tickets"]], [self.ticket.pk])
+        inicio = self.cambios()["cursor"]
+        with self.confirmar():
+            ticket = self._crear_ticket(2)
+        datos = self.cambios(inicio)
+        self.assertEqual([t["id"] for t in datos["tickets"]], [ticket.pk])
+        self.assertEqual([c["ticket"] for c in datos["comentarios"]], [ticket.pk])
+        self.assertEqual([a["ticket"] for a in datos["asignaciones"]], [ticket.pk])
+        self.assertFalse(datos["mas"])
+
+        cursor = datos["cursor"]
+        self.assertEqual(self.cambios(cursor)["tickets"], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.patch(f"/api/tickets/{ticket.pk}/", {"titulo": "Sin red"}, format="json")
+        datos = self.cambios(cursor)
+        self.assertEqual([t["titulo"] for t in datos["tickets"]], ["Sin red"])
+        self.assertEqual((datos["comentarios"], datos["asignaciones"]), ([], []))
+
+        comentario = ticket.comentarios.get().pk
+        with self.confirmar():
+            ComentarioTicket.objects.get(pk=comentario).delete()
+            self.api.delete(f"/api/tickets/{self.ticket.pk}/")
+        datos = self.cambios(datos["cursor"])
+        self.assertEqual(datos["eliminados"], {"tickets": [self.ticket.pk], "comentarios": [comentario]})
+
+    def test_paginado_permisos_y_cursor_invalido(self):
+        self.sembrar(2)
+        with self.confirmar():
+            otro = Usuario.objects.create_user(email="otro@coyahue.cl", password="clave", rol=self.rol_usuario)
+            Ticket.objects.create(
+                titulo="Ajeno", descripcion="-", solicitante=otro, categoria=self.categoria,
+                prioridad=self.prioridad, area_afectada=self.area, estado=self.estado_abierto,
+            )
+        primera = sincronizacion.cambios_desde(None, self.admin, limite=4)
+        self.assertTrue(primera["mas"])
+        resto = sincronizacion.cambios_desde(primera["cursor"], self.admin)
+        self.assertEqual(len(primera["tickets"]) + len(resto["tickets"]), 4)
+
+        self.api.force_authenticate(self.usuario)
+        self.assertNotIn("Ajeno", [t["titulo"] for t in self.cambios()["tickets"]])
+        self.assertEqual(self.api.get("/api/tickets/changes/", {"since": "ayer"}).status_code, 400)
+
+    def test_solicitante_recibe_la_eliminacion_tras_la_purga(self):
+        self.api.force_authenticate(self.usuario)
+        cursor = self.cambios()["cursor"]
+        with self.confirmar():
+            self.api.force_authenticate(self.admin)
+            self.api.delete(f"/api/tickets/{self.ticket.pk}/")
+        purgar_ticket(self.ticket.pk)
+        self.assertFalse(Ticket.todos.filter(pk=self.ticket.pk).exists())
+
+        self.api.force_authenticate(self.usuario)
+        self.assertEqual(self.cambios(cursor)["eliminados"]["tickets"], [self.ticket.pk])
+
+    def test_la_secuencia_se_escribe_en_la_misma_transaccion(self):
+        cursor = self.cambios()["cursor"]
+        try:
+            with transaction.atomic():
+                self._crear_ticket(2)
+                self.assertTrue(CambioSincronizacion.objects.filter(pk__gt=cursor).exists())
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertFalse(CambioSincronizacion.objects.filter(pk__gt=cursor).exists())
+
+    def test_una_fila_por_ticket_y_tipo_en_cada_transaccion(self):
+        cursor = self.cambios()["cursor"]
+        with transaction.atomic():
+            for i in range(3):
+                eventos.registrar(self.ticket.pk, {"titulo": [str(i), str(i + 1)]})
+                eventos.registrar(
+                    self.ticket.pk, {"tecnico_asignado": [None, i]}, tipo=EventoTicket.TIPO_ASIGNACION,
+                )
+        self.assertEqual(
+            sorted(CambioSincronizacion.objects.filter(pk__gt=cursor).values_list("recurso", flat=True)),
+            [CambioSincronizacion.RECURSO_ASIGNACION, CambioSincronizacion.RECURSO_TICKET],
+        )
+
+    def test_queries_no_crecen_con_los_cambios(self):
+        self.assertQueriesConstantes(lambda: self.api.get("/api/tickets/changes/"))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class TicketListaSerializerTests(PresupuestoQueriesMixin, TestCase):
+    def test_mismo_json_que_ticket_serializer(self):
+        self.sembrar(3)
+        Ticket.objects.filter(pk=self.ticket.pk).update(archivo="tickets_adjuntos/captura.png", sla_deadline=None)
+        contexto = {"request": RequestFactory().get("/api/tickets/")}
+        queryset = Ticket.objects.order_by("pk")
+        esperado = TicketSerializer(queryset, many=True, context=contexto).data
+        with self.assertNumQueries(1):
+            rapido = TicketListaSerializer(queryset, contexto).data
+        self.assertEqual(JSONRenderer().render(rapido), JSONRenderer().render(esperado))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class DetalleConIncludeTests(PresupuestoQueriesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+        self.url = f"/api/tickets/{self.ticket.pk}/"
+
+    def test_incluye_las_relaciones_en_un_request(self):
+        self.sembrar(2)
+        CalificacionTicket.objects.create(ticket=self.ticket, usuario=self.usuario, puntuacion=5, resuelto=True)
+        datos = self.api.get(self.url, {"include": "comentarios,historial,calificacion,asignacion"}).json()
+        self.assertEqual(datos["titulo"], self.ticket.titulo)
+        self.assertEqual(len(datos["comentarios"]), self.ticket.comentarios.count())
+        self.assertEqual(len(datos["historial"]), self.ticket.historial.count())
+        self.assertEqual(datos["calificacion"]["puntuacion"], 5)
+        self.assertEqual(datos["asignacion"]["tecnico_asignado"], self.tecnico.pk)
+        self.assertNotIn("comentarios", self.api.get(self.url).json())
+
+        sin_calificar = Ticket.objects.exclude(pk=self.ticket.pk).filter(calificacion__isnull=True).first()
+        datos = self.api.get(f"/api/tickets/{sin_calificar.pk}/", {"include": "calificacion"}).json()
+        self.assertIsNone(datos["calificacion"])
+
+    def test_queries_constantes_e_include_invalido(self):
+        self.assertQueriesConstantes(
+            lambda: self.api.get(self.url, {"include": "comentarios,historial,calificacion,asignacion"})
+        )
+        response = self.api.get(self.url, {"include": "comentarios,eventos"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("eventos", response.json()["include"])
+
+    def test_etag_cambia_con_lo_incluido(self):
+        etag = self.api.get(self.url, {"include": "comentarios"})["ETag"]
+        self.assertEqual(self.api.get(self.url, {"include": "comentarios"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        ComentarioTicket.objects.create(ticket=self.ticket, usuario=self.admin, texto="Nuevo")
+        self.assertEqual(self.api.get(self.url, {"include": "comentarios"}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ReportingTests(TestCase):
+    """Router de lectura a `reporting` con una copia SQLite real, como en producción."""
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.copia = os.path.join(carpeta.name, "reporting.sqlite3")
+        sqlite3.connect(self.copia).close()
+
+        ajustes = {
+            **connections["default"].settings_dict,
+            "NAME": self.copia,
+            "OPTIONS": {"init_command": "PRAGMA query_only=ON;"},
+            "TEST": {"MIRROR": "default"},
+        }
+        for bases in (connections.settings, settings.DATABASES):
+            alias = mock.patch.dict(bases, {db_router.REPORTING: ajustes})
+            alias.start()
+            self.addCleanup(alias.stop)
+        self.addCleanup(self._cerrar_reporting)
+        ajuste = override_settings(REPORTING_MAX_LAG=300)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        # Sin el lag cacheado de otro test
+        lag = mock.patch.object(db_router, "_ultimo_lag", [0.0, None])
+        lag.start()
+        self.addCleanup(lag.stop)
+
+    def _cerrar_reporting(self):
+        connections[db_router.REPORTING].close()
+        del connections[db_router.REPORTING]
+
+    def test_lecturas_a_reporting_hasta_que_se_escribe(self):
+        with db_router.usar_reporting():
+            self.assertEqual(Ticket.objects.all().db, db_router.REPORTING)
+            Rol.objects.create(nombre_rol="AUDITOR")
+            self.assertEqual(Ticket.objects.all().db, "default")
+        self.assertEqual(Ticket.objects.all().db, "default")
+
+    def test_copia_atrasada_vuelve_a_la_primaria(self):
+        vieja = time.time() - 301
+        os.utime(self.copia, (vieja, vieja))
+        with db_router.usar_reporting():
+            self.assertEqual(Ticket.objects.all().db, "default")
+
+    def test_cookie_tras_escribir_fuerza_la_primaria(self):
+        fabrica = RequestFactory()
+        middleware = db_router.PrimariaTrasEscrituraMiddleware(lambda request: HttpResponse())
+        cookie = middleware(fabrica.post("/tickets/crear/")).cookies[db_router.COOKIE_PRIMARIA]
+        self.assertEqual(cookie["max-age"], 300)
+        self.assertNotIn(db_router.COOKIE_PRIMARIA, middleware(fabrica.get("/tickets/")).cookies)
+
+        vista = db_router.lectura_reporting(lambda request: HttpResponse(Ticket.objects.all().db))
+        self.assertEqual(vista(fabrica.get("/reportes/")).content.decode(), db_router.REPORTING)
+        fabrica.cookies[db_router.COOKIE_PRIMARIA] = cookie.value
+        self.assertEqual(vista(fabrica.get("/reportes/")).content.decode(), "default")
+
+    def test_refrescar_reporting_deja_una_copia_legible(self):
+        origen = os.path.join(os.path.dirname(self.copia), "primaria.sqlite3")
+        with sqlite3.connect(origen) as base:
+            base.execute("CREATE TABLE muestra (id INTEGER PRIMARY KEY, nombre TEXT)")
+            base.execute("INSERT INTO muestra (nombre) VALUES ('uno'), ('dos')")
+        base.close()
+
+        with mock.patch.dict(connections["default"].settings_dict, {"NAME": origen}):
+            call_command("refrescar_reporting", stdout=io.StringIO())
+        self.assertFalse(os.path.exists(f"{self.copia}.tmp"))
+        copia = sqlite3.connect(f"file:{self.copia}?mode=ro", uri=True)
+        self.addCleanup(copia.close)
+        self.assertEqual([fila[0] for fila in copia.execute("SELECT nombre FROM muestra ORDER BY id")], ["uno", "dos"])
+        self.assertEqual(copia.execute("PRAGMA journal_mode").fetchone()[0], "delete")
@@ -0,0 +1,151 @@
+"""
+Motor de transiciones de estado de tickets.
+
+Las transiciones permitidas se declaran en `EstadoTicket.transiciones`; un
+estado sin transiciones configuradas puede pasar a cualquier otro.
+`transicionar()` aplica el cambio con un solo UPDATE condicionado al estado
+esperado y a que la transición esté permitida, así dos ediciones simultáneas
+no se pisan. Después escribe el historial y las notificaciones en un
+INSERT cada uno. Lo usan las vistas HTML y la API.
+"""
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from notifications.models import Notificacion
+from . import eventos
+from .asignacion import ajustar_carga
+from .concurrencia import ConflictoVersion
+from .models import AsignacionTicket, EstadoTicket, HistorialTicket, Ticket
+
+Transicion = EstadoTicket.transiciones.through
+
+
+class ErrorTransicion(Exception):
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def _permitida(estado_id):
+    """Condición sobre el ticket: `estado_id` es alcanzable desde su estado actual."""
+    return Q(Exists(Transicion.objects.filter(
+        from_estadoticket_id=OuterRef("estado_id"), to_estadoticket_id=estado_id,
+    ))) | ~Q(Exists(Transicion.objects.filter(from_estadoticket_id=OuterRef("estado_id"))))
+
+
+def estados_disponibles(estado):
+    """El estado actual y los que se pueden alcanzar desde él."""
+    restringido = Transicion.objects.filter(from_estadoticket_id=estado.pk)
+    return EstadoTicket.objects.filter(
+        Q(pk=estado.pk)
+        | Q(pk__in=restringido.values("to_estadoticket_id"))
+        | ~Q(Exists(restringido))
+    )
+
+
+def _asignados(ticket):
+    """[(técnico, usuario del técnico)] de la asignación activa."""
+    return list(
+        AsignacionTicket.objects
+        .filter(ticket_id=ticket.pk, activo=True)
+        .values_list("tecnico_asignado_id", "tecnico_asignado__usuario_id")
+    )
+
+
+def _destinatarios(ticket, usuario, asignados):
+    ids = {ticket.solicitante_id, *(usuario_id for _, usuario_id in asignados)}
+    ids.discard(usuario.pk if usuario else None)
+    return ids
+
+
+def transicionar(ticket, estado_nuevo, usuario, comentario="", notificar=True, version=None):
+    """
+    Pasa `ticket` a `estado_nuevo` si sigue en el estado con que se cargó
+    (y en `version`, si se indica). Actualiza la instancia y devuelve True;
+    False si ya estaba en ese estado. Lanza ErrorTransicion (400 no
+    permitida, 409 conflicto, 404 eliminado) o ConflictoVersion.
+    """
+    estado_anterior = ticket.estado
+    if estado_nuevo.pk == estado_anterior.pk:
+        return False
+
+    ahora = timezone.now()
+    if estado_nuevo.es_final:
+        fecha_cierre = ticket.fecha_cierre or ahora
+        valor_cierre = Coalesce(F("fecha_cierre"), Value(ahora))
+    else:
+        fecha_cierre = valor_cierre = None
+
+    filtro = {"pk": ticket.pk, "estado_id": estado_anterior.pk}
+    if version is not None:
+        filtro["version"] = version
+    with transaction.atomic():
+        actualizados = (
+            Ticket.objects
+            .filter(_permitida(estado_nuevo.pk), **filtro)
+            .update(
+                estado_id=estado_nuevo.pk,
+                fecha_cierre=valor_cierre,
+                fecha_actualizacion=ahora,
+                version=F("version") + 1,
+            )
+        )
+        if not actualizados:
+            raise _diagnosticar(ticket, estado_anterior, estado_nuevo, version)
+
+        HistorialTicket.objects.create(
+            ticket_id=ticket.pk,
+            usuario=usuario,
+            estado_anterior=estado_anterior,
+            estado_nuevo=estado_nuevo,
+            comentario=comentario or "Cambio de estado",
+        )
+        asignados = _asignados(ticket)
+        if estado_anterior.es_final != estado_nuevo.es_final:
+            # Cerrar libera al técnico en el índice de carga; reabrir lo vuelve a sumar
+            ajustar_carga([t for t, _ in asignados], -1 if estado_nuevo.es_final else +1)
+        if notificar:
+            Notificacion.objects.bulk_create([
+                Notificacion(
+                    ticket_id=ticket.pk,
+                    usuario_destino_id=destino,
+                    tipo_notificacion="cambio_estado",
+                    titulo=f"Ticket #{ticket.pk} actualizado",
+                    mensaje=f"El estado actual es: {estado_nuevo.nombre_estado}",
+                    canal_notificacion="portal",
+                )
+                for destino in _destinatarios(ticket, usuario, asignados)
+            ])
+
+        cambios = {"estado": [estado_anterior.pk, estado_nuevo.pk]}
+        if fecha_cierre != ticket.fecha_cierre:
+            cambios["fecha_cierre"] = [ticket.fecha_cierre, fecha_cierre]
+        eventos.registrar(ticket.pk, cambios, usuario_id=usuario.pk if usuario else None)
+
+    ticket.estado = estado_nuevo
+    ticket.fecha_cierre = fecha_cierre
+    ticket.fecha_actualizacion = ahora
+    ticket.version = (ticket.version if version is None else version) + 1
+    guardados = getattr(ticket, "_valores_guardados", None)
+    if guardados is not None:
+        guardados.update(estado_id=estado_nuevo.pk, fecha_cierre=fecha_cierre)
+    return True
+
+
+def _diagnosticar(ticket, estado_anterior, estado_nuevo, version):
+    fila = Ticket.objects.filter(pk=ticket.pk).values_list("estado_id", "version").first()
+    if fila is None:
+        return ErrorTransicion("El ticket ya no existe.", status=404)
+    actual, version_actual = fila
+    if version is not None and version_actual != version:
+        return ConflictoVersion(ticket, {"estado": [estado_anterior.pk, estado_nuevo.pk]})
+    if actual != estado_anterior.pk:
+        return ErrorTransicion(
+            "El ticket cambió de estado mientras lo editabas. Recarga e inténtalo de nuevo.",
+            status=409,
+        )
+    return ErrorTransicion(
+        f"No se puede pasar de «{estado_anterior.nombre_estado}» a «{estado_nuevo.nombre_estado}».",
+    )
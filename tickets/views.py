@@ -1,17 +1,64 @@
-from django.shortcuts import render
+import io
+import os
+
+from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch, Sum
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import add_never_cache_headers
 
 # Create your views here.
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-from .models import Ticket, Categoria, Prioridad, EstadoTicket, AsignacionTicket, HistorialTicket
+from .models import (
+    Ticket, Categoria, Prioridad, EstadoTicket, AsignacionTicket, HistorialTicket,
+    ComentarioTicket, SubidaFragmentada,
+)
 from .serializers import (
     TicketSerializer, CategoriaSerializer, PrioridadSerializer,
-    EstadoTicketSerializer, AsignacionTicketSerializer, HistorialTicketSerializer
+    EstadoTicketSerializer, AsignacionTicketSerializer, HistorialTicketSerializer,
+    SubidaFragmentadaSerializer, EventoTicketSerializer, TicketListaSerializer,
+    ComentarioTicketSerializer, CalificacionTicketSerializer,
 )
 from .permissions import EsAdministrador, EsTecnico
+from .miniaturas import TAMANOS, es_imagen, nombre_derivado, encolar_derivados
+from .descargas import servir_archivo, zip_en_streaming
+from .eliminacion import eliminar_ticket
+from . import eventos
+from .transiciones import ErrorTransicion, transicionar
+from .asignacion import asignar
+from .concurrencia import ConflictoVersion, guardar_cambios, version_esperada
+from . import masivo, sincronizacion
+from .condicional import etag, respuesta_condicional
+from .subidas import ErrorSubida, iniciar, guardar_chunk, completar, descartar_chunks
+from accounts.models import Tecnico
+from knowledge_base.models import ArchivoFAQ
+
+# Los derivados dependen de un nombre único (hash o carpeta por fecha) y no cambian
+CACHE_DERIVADOS = "private, max-age=31536000, immutable"
+
+
+# ?include= del detalle de un ticket: nombre → relación a precargar
+INCLUIBLES = {
+    "comentarios": Prefetch(
+        "comentarios", queryset=ComentarioTicket.objects.select_related("usuario").order_by("fecha_creacion", "pk"),
+    ),
+    "historial": Prefetch("historial", queryset=HistorialTicket.objects.order_by("fecha_accion", "pk")),
+    "calificacion": "calificacion",
+    "asignacion": Prefetch(
+        "asignaciones", queryset=AsignacionTicket.objects.filter(activo=True), to_attr="asignaciones_activas",
+    ),
+}
 
 
 class TicketViewSet(viewsets.ModelViewSet):
@@ -24,35 +71,128 @@ class TicketViewSet(viewsets.ModelViewSet):
         HistorialTicket.objects.create(
             ticket=ticket,
             usuario=self.request.user,
-            accion="creado",
-            descripcion_cambio="Creación de ticket",
-            datos_nuevos=serializer.data,
+            estado_anterior=None,
+            estado_nuevo=ticket.estado,
+            comentario="Creación de ticket",
         )
 
+    def perform_update(self, serializer):
+        """
+        Solo escribe los campos modificados y exige que el ticket siga en la
+        `version` enviada (si se envía); si no, responde 409. El estado pasa
+        por el motor de transiciones.
+        """
+        ticket = serializer.instance
+        datos = dict(serializer.validated_data)
+        estado = datos.pop("estado", None)
+        version = version_esperada(ticket, self.request.data.get("version"))
+        for campo, valor in datos.items():
+            setattr(ticket, campo, valor)
+        try:
+            with transaction.atomic():
+                if guardar_cambios(ticket, version):
+                    version += 1
+                if estado is not None:
+                    transicionar(ticket, estado, self.request.user, version=version)
+        except (ErrorTransicion, ConflictoVersion) as error:
+            excepcion = APIException(str(error))
+            excepcion.status_code = error.status
+            raise excepcion
+
+    def perform_destroy(self, instance):
+        eliminar_ticket(instance)
+
+    def _incluir(self):
+        nombres = [n.strip() for n in self.request.query_params.get("include", "").split(",") if n.strip()]
+        invalidos = sorted(set(nombres) - INCLUIBLES.keys())
+        if invalidos:
+            raise ValidationError({"include": f"No se puede incluir: {', '.join(invalidos)}. "
+                                              f"Opciones: {', '.join(INCLUIBLES)}."})
+        return list(dict.fromkeys(nombres))
+
     def get_queryset(self):
         user = self.request.user
+        queryset = super().get_queryset()
+        if self.action == "list" and self.request.query_params.get("sla"):
+            queryset = queryset.por_sla(self.request.query_params["sla"])
+        if self.action == "retrieve":
+            incluir = self._incluir()
+            if "calificacion" in incluir:
+                queryset = queryset.select_related("calificacion")
+            queryset = queryset.prefetch_related(*(INCLUIBLES[n] for n in incluir if n != "calificacion"))
         if user.rol.nombre_rol in ("ADMIN", "TECNICO"):
-            return super().get_queryset()
-        return super().get_queryset().filter(solicitante=user)
+            return queryset
+        return queryset.filter(solicitante=user)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Con `?include=comentarios,historial,calificacion,asignacion` agrega
+        esas relaciones a la respuesta, precargadas con una query cada una:
+        el detalle completo en un solo request.
+        """
+        ticket = self.get_object()
+        partes = ["ticket", request.accepted_renderer.format, ticket.pk, ticket.version, ticket.fecha_actualizacion]
+        incluir = self._incluir()
+        if not incluir:
+            return respuesta_condicional(
+                request, etag(*partes), lambda: Response(self.get_serializer(ticket).data),
+                ticket.fecha_actualizacion,
+            )
+
+        datos = self.get_serializer(ticket).data
+        for nombre in incluir:
+            datos[nombre] = self._incluido(ticket, nombre)
+        # Lo incluido cambia sin tocar el ticket: el ETag se calcula sobre los datos
+        return respuesta_condicional(
+            request, etag(*partes, incluir, repr(datos)), lambda: Response(datos), ticket.fecha_actualizacion,
+            validar_fecha=False,
+        )
+
+    def _incluido(self, ticket, nombre):
+        contexto = self.get_serializer_context()
+        if nombre == "comentarios":
+            return ComentarioTicketSerializer(ticket.comentarios.all(), many=True, context=contexto).data
+        if nombre == "historial":
+            return HistorialTicketSerializer(ticket.historial.all(), many=True, context=contexto).data
+        if nombre == "calificacion":
+            calificacion = getattr(ticket, "calificacion", None)  # Sin calificar: RelatedObjectDoesNotExist
+            return CalificacionTicketSerializer(calificacion, context=contexto).data if calificacion else None
+        activas = ticket.asignaciones_activas
+        return AsignacionTicketSerializer(activas[-1], context=contexto).data if activas else None
+
+    def list(self, request, *args, **kwargs):
+        """
+        El ETag sale de un agregado del listado filtrado (cantidad, suma de
+        PK y última actualización), así un polling sin cambios no serializa.
+        Las filas se serializan desde `values_list()` (TicketListaSerializer).
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        resumen = queryset.order_by().aggregate(
+            total=Count("pk"), suma=Sum("pk"), ultima=Max("fecha_actualizacion"),
+        )
+        valor = etag(
+            "tickets", request.accepted_renderer.format, request.user.pk, request.user.rol.nombre_rol,
+            sorted(request.query_params.lists()), resumen["total"], resumen["suma"], resumen["ultima"],
+        )
+        return respuesta_condicional(
+            request, valor, lambda: Response(TicketListaSerializer(queryset, self.get_serializer_context()).data),
+            resumen["ultima"], validar_fecha=False,
+        )
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated, EsAdministrador])
     def asignar(self, request, pk=None):
         ticket = self.get_object()
-        tecnico_id = request.data.get("tecnico_id")
+        tecnico_id = get_object_or_404(Tecnico, id=request.data.get("tecnico_id")).id
 
-        asignacion = AsignacionTicket.objects.create(
-            ticket=ticket,
-            usuario=request.user,
-            tecnico_asignado_id=tecnico_id,
-            comentario_asignacion=request.data.get("comentario", ""),
-        )
+        # Solo una asignación activa por ticket
+        asignacion = asignar(ticket, tecnico_id) or ticket.asignaciones.get(activo=True)
 
         HistorialTicket.objects.create(
             ticket=ticket,
             usuario=request.user,
-            accion="asignado",
-            descripcion_cambio=f"Asignado al técnico {tecnico_id}",
-            datos_nuevos={"tecnico_id": tecnico_id},
+            estado_anterior=ticket.estado,
+            estado_nuevo=ticket.estado,
+            comentario=request.data.get("comentario") or f"Asignado al técnico {tecnico_id}",
         )
 
         return Response(AsignacionTicketSerializer(asignacion).data, status=status.HTTP_201_CREATED)
@@ -60,19 +200,261 @@ class TicketViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated])
     def cambiar_estado(self, request, pk=None):
         ticket = self.get_object()
-        estado_id = request.data.get("estado_id")
-        estado_anterior = ticket.estado_id
+        estado = get_object_or_404(EstadoTicket, id=request.data.get("estado_id"))
+        version = request.data.get("version")
+        try:
+            transicionar(
+                ticket, estado, request.user, request.data.get("comentario") or "Cambio de estado",
+                version=version_esperada(ticket, version) if version is not None else None,
+            )
+        except (ErrorTransicion, ConflictoVersion) as error:
+            return Response({"detail": str(error)}, status=error.status)
+        return Response(self.get_serializer(ticket).data)
 
-        ticket.estado_id = estado_id
-        ticket.save()
+    @action(detail=False, methods=["post"], url_path="bulk", permission_classes=[IsAuthenticated, EsAdministrador])
+    def bulk(self, request):
+        """
+        Aplica una acción a varios tickets en una transacción:
+        {"ids": [...], "accion": "asignar|estado|prioridad|categoria|cerrar",
+        "valor": id, "comentario": "...", "versiones": {"id": versión}}.
+        Responde los tickets actualizados, los que ya estaban así y los
+        errores por ticket.
+        """
+        try:
+            resultado = masivo.aplicar(
+                request.data.get("ids"),
+                request.data.get("accion"),
+                request.data.get("valor"),
+                request.user,
+                request.data.get("comentario") or "",
+                request.data.get("versiones"),
+            )
+        except masivo.ErrorMasivo as error:
+            return Response({"detail": str(error)}, status=error.status)
+        return Response(resultado)
 
-        HistorialTicket.objects.create(
-            ticket=ticket,
-            usuario=request.user,
-            accion="cambio_estado",
-            descripcion_cambio="Cambio de estado",
-            datos_anteriores={"estado_id": estado_anterior},
-            datos_nuevos={"estado_id": estado_id},
+    @action(detail=False, methods=["get"], url_path="changes")
+    def changes(self, request):
+        """
+        Cambios posteriores a `?since=<cursor>`: tickets, comentarios,
+        asignaciones e ids eliminados, más el cursor siguiente. Con
+        `"mas": true` hay que volver a pedir con ese cursor.
+        """
+        try:
+            return Response(sincronizacion.cambios_desde(request.query_params.get("since"), request.user))
+        except sincronizacion.CursorInvalido as error:
+            return Response({"detail": str(error)}, status=error.status)
+
+    @action(detail=True, methods=["get"], url_path="eventos")
+    def eventos(self, request, pk=None):
+        ticket = self.get_object()
+        return Response(EventoTicketSerializer(ticket.eventos.all(), many=True).data)
+
+    @action(detail=True, methods=["get"], url_path="estado-en")
+    def estado_en(self, request, pk=None):
+        """Estado del ticket en `?fecha=<ISO 8601>`, reconstruido desde el log."""
+        ticket = self.get_object()
+        momento = parse_datetime(request.query_params.get("fecha") or "")
+        if momento is None:
+            return Response({"detail": "fecha debe ser ISO 8601."}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento)
+
+        estado = eventos.estado_en(ticket.pk, momento)
+        if estado is None:
+            return Response({"detail": "El ticket no existía en esa fecha."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(estado)
+
+
+class SubidaFragmentadaViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Subidas reanudables de adjuntos grandes:
+
+    - POST   /api/subidas/                      {nombre_archivo, tamano_total, sha256?}
+    - PUT    /api/subidas/<id>/chunks/<n>/      cuerpo = bytes del chunk n
+    - GET    /api/subidas/<id>/                 chunks ya recibidos (para reanudar)
+    - POST   /api/subidas/<id>/completar/       ensambla y verifica el checksum
+
+    El id devuelto se envía como `subida_id` en los formularios de ticket,
+    comentario o FAQ. Acepta la sesión además de JWT porque lo usan los
+    formularios HTML del panel.
+    """
+    serializer_class = SubidaFragmentadaSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+
+    def get_queryset(self):
+        return SubidaFragmentada.objects.filter(usuario=self.request.user)
+
+    def _error(self, error):
+        return Response({"detail": str(error), **error.extra}, status=error.status)
+
+    def create(self, request, *args, **kwargs):
+        try:
+            tamano_total = int(request.data.get("tamano_total"))
+        except (TypeError, ValueError):
+            return Response({"detail": "tamano_total debe ser un entero."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            subida = iniciar(
+                request.user,
+                request.data.get("nombre_archivo"),
+                tamano_total,
+                request.data.get("sha256"),
+            )
+        except ErrorSubida as error:
+            return self._error(error)
+        return Response(self.get_serializer(subida).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["put"], url_path=r"chunks/(?P<numero>\d+)")
+    def chunk(self, request, pk=None, numero=None):
+        subida = self.get_object()
+        try:
+            # Se lee el cuerpo crudo por bloques: no pasa por los parsers
+            guardar_chunk(subida, int(numero), request.stream or io.BytesIO())
+        except ErrorSubida as error:
+            return self._error(error)
+        return Response({"numero": int(numero)})
+
+    @action(detail=True, methods=["post"])
+    def completar(self, request, pk=None):
+        subida = self.get_object()
+        try:
+            completar(subida)
+        except ErrorSubida as error:
+            return self._error(error)
+        return Response(self.get_serializer(subida).data)
+
+    def perform_destroy(self, subida):
+        descartar_chunks(subida)
+        if subida.archivo:
+            default_storage.delete(subida.archivo)
+        subida.delete()
+
+
+# -------------------------------------------------------------------
+# Adjuntos: descarga con control de acceso, miniaturas / previews
+# -------------------------------------------------------------------
+
+def _ve_todos_los_tickets(user):
+    rol = getattr(user.rol, "nombre_rol", "").upper() if user.rol_id else ""
+    return rol in ("ADMIN", "TECNICO")
+
+
+def _adjunto_visible(user, tipo, pk, campo="archivo"):
+    """
+    Devuelve el FieldFile del adjunto si el usuario puede verlo, con una
+    sola query por PK (+ FK indexada del solicitante para usuarios).
+    `campo="archivo_original"` entrega la imagen sin comprimir conservada.
+    """
+    ve_todo = _ve_todos_los_tickets(user)
+
+    if tipo == "ticket":
+        qs = Ticket.objects.filter(pk=pk)
+        if not ve_todo:
+            qs = qs.filter(solicitante=user)
+    elif tipo == "comentario":
+        qs = ComentarioTicket.objects.filter(pk=pk)
+        if not ve_todo:
+            qs = qs.filter(ticket__solicitante=user)
+    elif tipo == "faq" and campo == "archivo":
+        qs = ArchivoFAQ.objects.filter(pk=pk)
+        if not ve_todo:
+            qs = qs.filter(articulo__publicado=True)
+    else:
+        raise Http404
+
+    objeto = qs.only("pk", campo).first()
+    if objeto is None or not getattr(objeto, campo):
+        raise Http404
+    return getattr(objeto, campo)
+
+
+@login_required
+def adjunto_descargar(request, tipo, pk):
+    """
+    Descarga de un adjunto de ticket, comentario o FAQ.
+    Con `?tamano=miniatura|preview` sirve el derivado WebP si ya existe; si
+    no, lo encola y redirige al original (sin cachear la redirección).
+    Con `?original=1` sirve la imagen sin comprimir, si se conservó.
+    """
+    if request.GET.get("original"):
+        archivo = _adjunto_visible(request.user, tipo, pk, campo="archivo_original")
+        if not default_storage.exists(archivo.name):
+            raise Http404
+        return servir_archivo(
+            request, archivo.name, nombre_descarga=f"{tipo}-{pk}-original{_extension(archivo.name)}"
         )
 
-        return Response(self.get_serializer(ticket).data)
+    archivo = _adjunto_visible(request.user, tipo, pk)
+    nombre = archivo.name
+
+    tamano = request.GET.get("tamano")
+    if tamano:
+        if tamano not in TAMANOS or not es_imagen(nombre):
+            raise Http404
+        derivado = nombre_derivado(nombre, tamano)
+        if default_storage.exists(derivado):
+            return servir_archivo(request, derivado, cache_control=CACHE_DERIVADOS)
+        encolar_derivados(nombre)
+        response = redirect("adjunto_descargar", tipo=tipo, pk=pk)
+        add_never_cache_headers(response)
+        return response
+
+    if not default_storage.exists(nombre):
+        raise Http404
+    return servir_archivo(request, nombre, nombre_descarga=f"{tipo}-{pk}{_extension(nombre)}")
+
+
+@login_required
+def ticket_adjuntos_zip(request, ticket_id):
+    """
+    ZIP con el adjunto del ticket y los de todos sus comentarios, generado
+    al vuelo. Con `?faq=1` agrega los archivos de los artículos FAQ
+    publicados de la misma categoría.
+    """
+    tickets = Ticket.objects.filter(pk=ticket_id)
+    if not _ve_todos_los_tickets(request.user):
+        tickets = tickets.filter(solicitante=request.user)
+    ticket = tickets.only("pk", "archivo", "categoria_id").first()
+    if ticket is None:
+        raise Http404
+
+    entradas = []
+    if ticket.archivo:
+        entradas.append((f"ticket-{ticket.pk}{_extension(ticket.archivo.name)}", ticket.archivo.name))
+
+    comentarios = (
+        ComentarioTicket.objects
+        .filter(ticket_id=ticket.pk)
+        .exclude(archivo="")
+        .exclude(archivo__isnull=True)
+        .order_by("fecha_creacion")
+        .values_list("pk", "archivo")
+    )
+    for n, (pk, nombre) in enumerate(comentarios, start=1):
+        entradas.append((f"comentarios/{n:03d}-comentario-{pk}{_extension(nombre)}", nombre))
+
+    if request.GET.get("faq") and ticket.categoria_id:
+        archivos_faq = (
+            ArchivoFAQ.objects
+            .filter(articulo__categoria_id=ticket.categoria_id, articulo__publicado=True)
+            .order_by("articulo_id", "orden")
+            .values_list("articulo_id", "pk", "archivo")
+        )
+        for articulo_id, pk, nombre in archivos_faq:
+            entradas.append((f"faq/articulo-{articulo_id}/{pk}{_extension(nombre)}", nombre))
+
+    response = StreamingHttpResponse(zip_en_streaming(entradas), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="ticket-{ticket.pk}-adjuntos.zip"'
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def _extension(nombre):
+    return os.path.splitext(nombre)[1].lower()